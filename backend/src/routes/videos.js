@@ -79,7 +79,7 @@ router.post('/download', authenticateToken, requireApproved, async (req, res) =>
  */
 router.post('/parse', authenticateToken, requireApproved, async (req, res) => {
   try {
-    const { videoId, languages, spreadsheetId } = req.body;
+    const { videoId, languages, spreadsheetId, asrBackend } = req.body;
     
     if (!videoId) {
       return res.status(400).json({ 
@@ -92,6 +92,7 @@ router.post('/parse', authenticateToken, requireApproved, async (req, res) => {
     const job = await videoDownloadService.addParseJob(videoId, {
       languages: languages || ['en', 'ru'],
       spreadsheetId,
+      asrBackend,
       userId: req.user.id,
     });
 
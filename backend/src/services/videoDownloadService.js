@@ -139,7 +139,7 @@ class VideoDownloadService {
 
     // Обработка парсинга
     this.parseQueue.process(async (job) => {
-  const { videoId, languages, spreadsheetId, translateTo, sheetName, userId } = job.data;
+  const { videoId, languages, spreadsheetId, translateTo, sheetName, userId, asrBackend } = job.data;
 
       try {
         await job.progress(10);
@@ -158,6 +158,9 @@ class VideoDownloadService {
         if (sheetName) {
           args.push('--sheet-name', sheetName);
         }
+        if (asrBackend) {
+          args.push('--asr-backend', asrBackend);
+        }
 
         const credentialsPath = path.join(this.workersDir, 'google-credentials.json');
         if (await this._fileExists(credentialsPath)) {
@@ -490,7 +493,7 @@ class VideoDownloadService {
    * Добавить видео в очередь парсинга
    */
   async addParseJob(videoId, options = {}) {
-    const { languages = ['en', 'ru', 'uk', 'de', 'fr', 'es'], spreadsheetId = null, userId = null, translateTo = 'ru' } = options;
+    const { languages = ['en', 'ru', 'uk', 'de', 'fr', 'es'], spreadsheetId = null, userId = null, translateTo = 'ru', asrBackend = null } = options;
 
     let resolvedUserId = userId;
     if (!resolvedUserId) {
@@ -521,6 +524,7 @@ class VideoDownloadService {
         if (languages) args.push('--languages', ...languages);
         if (translateTo) args.push('--translate-to', translateTo);
         if (sheetName) args.push('--sheet-name', sheetName);
+        if (asrBackend) args.push('--asr-backend', asrBackend);
         const credentialsPath = path.join(this.workersDir, 'google-credentials.json');
         try { if (await this._fileExists(credentialsPath)) args.push('--credentials', credentialsPath); } catch {}
         
@@ -553,6 +557,7 @@ class VideoDownloadService {
           languages,
           spreadsheetId,
           translateTo,
+          asrBackend,
           userId: resolvedUserId,
           sheetName,
           createdAt: new Date(),
@@ -805,6 +810,10 @@ class VideoDownloadService {
       health.hasCookies = !!result?.has_cookies;
       health.pythonExecutable = result?.python_executable || null;
       health.ytDlpPath = result?.yt_dlp_file || null;
+      // Успешность и задержка player_client yt-dlp (в порядке, в котором они сейчас пробуются)
+      health.playerClients = result?.player_clients || null;
+      // Подобранная параллельность фрагментов DASH/HLS по хостам CDN
+      health.fragmentTuner = result?.fragment_tuner || null;
     } catch {}
 
     // cookies.txt existence
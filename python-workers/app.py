@@ -2,34 +2,303 @@
 # TODO: Установите зависимости командой: pip install -r requirements.txt
 
 """
-Этот модуль будет использоваться для:
-- Скачивания видео через yt-dlp
-- Распознавания речи через Whisper
-- Генерации голоса через gTTS
-- Обработки видео через MoviePy
-- Перевода через deep-translator
-
-Пока что это заглушка. Функционал будет добавлен позже.
+Долгоживущий воркер: парсинг, транскрипты, форматы, прямые ссылки и скачивание.
+
+Процесс держит загруженными yt_dlp, youtube_transcript_api, клиент Google Sheets
+и модели Whisper (WHISPER_PRELOAD_MODEL, через запятую), поэтому задачи не платят за старт
+интерпретатора и импорты, как при запуске video_parser.py / video_downloader.py.
+
+Задачи ставятся через POST /jobs/<type> и выполняются в пуле потоков
+(WORKER_JOB_CONCURRENCY). Статус — GET /jobs/<job_id>.
+
+Типы задач: parse, transcript, formats, direct-url, best-av-urls, download, audio.
 """
 
 try:
     from flask import Flask, request, jsonify
     from flask_cors import CORS
     import os
+    import time
+    import uuid
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from typing import Any, Callable, Dict, Optional
     from dotenv import load_dotenv
 
     load_dotenv()
 
+    from video_parser import VideoParser, save_parsed_json
+    from video_downloader import VideoDownloader
+    from compact_transcript import compact, to_jsonable
+    from whisper_models import get_model_cache, preload_from_env
+    from asr_backends import available_backends
+    from asr_scheduler import get_scheduler
+    from download_queue import get_download_queue
+
+    WORKERS_DIR = os.path.dirname(os.path.abspath(__file__))
+
     app = Flask(__name__)
     CORS(app)
 
+    class JobRegistry:
+        """Реестр задач в памяти процесса: статус, прогресс, результат."""
+
+        def __init__(self, max_workers: int, ttl_seconds: int):
+            self._jobs: Dict[str, Dict[str, Any]] = {}
+            self._lock = threading.Lock()
+            self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='job')
+            self.ttl_seconds = ttl_seconds
+
+        def submit(self, job_type: str, params: Dict[str, Any], fn: Callable[[Dict[str, Any]], Any]) -> Dict[str, Any]:
+            job_id = f"{job_type}_{uuid.uuid4().hex[:12]}"
+            job = {
+                'id': job_id,
+                'type': job_type,
+                'status': 'queued',
+                'progress': 0,
+                'step': None,
+                'params': params,
+                'result': None,
+                'error': None,
+                'created_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+            }
+            with self._lock:
+                self._prune()
+                self._jobs[job_id] = job
+            self._pool.submit(self._run, job, fn)
+            return self.snapshot(job_id) or {}
+
+        def _run(self, job: Dict[str, Any], fn: Callable[[Dict[str, Any]], Any]) -> None:
+            self.update(job['id'], status='running', started_at=time.time())
+            try:
+                result = fn(job)
+                ok = not (isinstance(result, dict) and result.get('success') is False)
+                self.update(
+                    job['id'],
+                    status='completed' if ok else 'failed',
+                    progress=100 if ok else job['progress'],
+                    result=result,
+                    error=None if ok else (result or {}).get('error'),
+                    finished_at=time.time(),
+                )
+            except Exception as e:
+                print(f"[ERR] Задача {job['id']} упала: {e}")
+                self.update(job['id'], status='failed', error=str(e), finished_at=time.time())
+
+        def update(self, job_id: str, **fields: Any) -> None:
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job:
+                    job.update(fields)
+
+        def snapshot(self, job_id: str, with_result: bool = True) -> Optional[Dict[str, Any]]:
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if not job:
+                    return None
+                snap = dict(job)
+            if not with_result:
+                snap.pop('result', None)
+            elif snap.get('result') is not None:
+                # Транскрипты в результатах хранятся компактно, наружу — прежний JSON
+                snap['result'] = to_jsonable(snap['result'])
+            return snap
+
+        def list(self):
+            with self._lock:
+                ids = list(self._jobs.keys())
+            return [self.snapshot(job_id, with_result=False) for job_id in ids]
+
+        def stats(self) -> Dict[str, int]:
+            with self._lock:
+                counts: Dict[str, int] = {}
+                for job in self._jobs.values():
+                    counts[job['status']] = counts.get(job['status'], 0) + 1
+                return counts
+
+        def _prune(self) -> None:
+            """Удалить завершённые задачи старше ttl_seconds (вызывается под lock)."""
+            cutoff = time.time() - self.ttl_seconds
+            stale = [
+                job_id for job_id, job in self._jobs.items()
+                if job['finished_at'] and job['finished_at'] < cutoff
+            ]
+            for job_id in stale:
+                del self._jobs[job_id]
+
+    jobs = JobRegistry(
+        max_workers=int(os.getenv('WORKER_JOB_CONCURRENCY', 4)),
+        ttl_seconds=int(os.getenv('WORKER_JOB_TTL', 3600)),
+    )
+
+    # Тёплые экземпляры: создаются один раз на процесс
+    _parser: Optional[VideoParser] = None
+    _downloader: Optional[VideoDownloader] = None
+    _instances_lock = threading.Lock()
+
+    def get_parser() -> VideoParser:
+        global _parser
+        with _instances_lock:
+            if _parser is None:
+                _parser = VideoParser(os.getenv('GOOGLE_CREDENTIALS_PATH'))
+            return _parser
+
+    def get_downloader() -> VideoDownloader:
+        # Каталог задаёт только окружение (DOWNLOAD_PATH): воркер слушает 0.0.0.0 без авторизации,
+        # и путь из тела задачи позволил бы писать куда угодно
+        global _downloader
+        with _instances_lock:
+            if _downloader is None:
+                _downloader = VideoDownloader(download_dir=os.getenv('DOWNLOAD_PATH') or os.path.join(WORKERS_DIR, 'downloads'))
+            return _downloader
+
+    def warmup() -> None:
+        """Прогреть тяжёлые зависимости, чтобы первая задача не платила за импорт."""
+        started = time.monotonic()
+        # Скрипты импортируют эти модули лениво; воркеру выгоднее заплатить один раз при старте
+        import yt_dlp  # noqa: F401
+        import youtube_transcript_api  # noqa: F401
+        import requests  # noqa: F401
+        parser = get_parser()
+        parser.sheets_service
+        get_downloader()
+        preload_from_env()
+        print(f"[OK] Воркер прогрет за {time.monotonic() - started:.2f} с")
+
+    def _languages(data: Dict[str, Any]):
+        langs = data.get('languages') or ['en', 'ru', 'uk', 'de', 'fr', 'es']
+        return [langs] if isinstance(langs, str) else list(langs)
+
+    # --- Обработчики задач: принимают job (dict), возвращают результат ---
+
+    def run_parse(job: Dict[str, Any]) -> Dict[str, Any]:
+        p = job['params']
+        parser = get_parser()
+
+        def progress(step, pct):
+            fields: Dict[str, Any] = {}
+            if step:
+                fields['step'] = step
+            if pct is not None:
+                fields['progress'] = pct
+            jobs.update(job['id'], **fields)
+
+        data = parser.parse_video(p['videoId'], _languages(p), translate_to=p.get('translateTo', 'ru'),
+                                  progress_callback=progress, compact=True, asr_backend=p.get('asrBackend'),
+                                  asr_priority=p.get('priority') or 'interactive', asr_budget=p.get('asrBudget'))
+        if not data:
+            return {'success': False, 'video_id': p['videoId'], 'error': 'Не удалось распарсить видео'}
+        output_file = save_parsed_json(data, p['videoId'], output_dir=WORKERS_DIR)
+        saved_to_sheets = False
+        if p.get('spreadsheetId') and parser.sheets_service:
+            progress('sheets', None)
+            saved_to_sheets = parser.save_to_google_sheets(p['spreadsheetId'], data, sheet_name=p.get('sheetName', 'Videos'))
+        return {'success': True, 'video_id': p['videoId'], 'output_file': output_file,
+                'saved_to_sheets': saved_to_sheets, 'data': data}
+
+    def run_transcript(job: Dict[str, Any]) -> Dict[str, Any]:
+        p = job['params']
+        parser = get_parser()
+        transcript = parser.get_transcript(p['videoId'], _languages(p), translate_to=p.get('translateTo'))
+        if not transcript:
+            return {'success': False, 'video_id': p['videoId'], 'error': 'Транскрипт не найден'}
+        return {'success': True, 'video_id': p['videoId'], 'transcript': compact(transcript),
+                'full_text': parser.get_full_text(transcript)}
+
+    def run_formats(job: Dict[str, Any]) -> Dict[str, Any]:
+        return get_downloader().get_formats_debug(job['params']['videoId'])
+
+    def run_direct_url(job: Dict[str, Any]) -> Dict[str, Any]:
+        p = job['params']
+        return get_downloader().get_direct_progressive_url(p['videoId'], str(p.get('quality', 'highest')))
+
+    def run_best_av_urls(job: Dict[str, Any]) -> Dict[str, Any]:
+        p = job['params']
+        return get_downloader().get_best_av_urls(p['videoId'], str(p.get('quality', 'highest')))
+
+    def _download_hook(job: Dict[str, Any]):
+        def hook(d: Dict[str, Any]) -> None:
+            if d.get('status') == 'downloading':
+                total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+                done = d.get('downloaded_bytes') or 0
+                fields: Dict[str, Any] = {'step': 'downloading', 'speed': d.get('speed'), 'eta': d.get('eta')}
+                if total:
+                    fields['progress'] = max(1, min(99, int(done * 100 / total)))
+                jobs.update(job['id'], **fields)
+            elif d.get('status') == 'finished':
+                jobs.update(job['id'], step='processing')
+        return hook
+
+    def _download_slot(job: Dict[str, Any]):
+        """Слот общей очереди скачиваний (лимит параллельности и полосы на процесс)."""
+        return get_download_queue().slot(job['params'].get('priority') or 'interactive',
+                                         on_wait=lambda depth: jobs.update(job['id'], step='queued'))
+
+    def run_download(job: Dict[str, Any]) -> Dict[str, Any]:
+        p = job['params']
+        downloader = get_downloader()
+        with _download_slot(job) as slot:
+            result = downloader.download_video(p['videoId'], str(p.get('quality', 'highest')),
+                                               slot.wrap(_download_hook(job)))
+            result['queue'] = slot.info
+        return result
+
+    def run_audio(job: Dict[str, Any]) -> Dict[str, Any]:
+        p = job['params']
+        downloader = get_downloader()
+        with _download_slot(job) as slot:
+            result = downloader.download_audio_only(p['videoId'], slot.wrap(_download_hook(job)))
+            result['queue'] = slot.info
+        return result
+
+    JOB_HANDLERS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+        'parse': run_parse,
+        'transcript': run_transcript,
+        'formats': run_formats,
+        'direct-url': run_direct_url,
+        'best-av-urls': run_best_av_urls,
+        'download': run_download,
+        'audio': run_audio,
+    }
+
     @app.route('/health', methods=['GET'])
     def health():
         return jsonify({
             'status': 'OK',
-            'service': 'Python Video Worker'
+            'service': 'Python Video Worker',
+            'jobs': jobs.stats(),
+            'whisper_models': get_model_cache().stats(),
+            'asr_backends': available_backends(),
+            'asr_scheduler': get_scheduler().stats(),
+            'download_queue': get_download_queue().stats(),
         })
 
+    @app.route('/jobs/<job_type>', methods=['POST'])
+    def create_job(job_type):
+        handler = JOB_HANDLERS.get(job_type)
+        if not handler:
+            return jsonify({'success': False, 'error': f'Unknown job type: {job_type}',
+                            'types': sorted(JOB_HANDLERS)}), 404
+        data = request.get_json(silent=True) or {}
+        if not str(data.get('videoId') or '').strip():
+            return jsonify({'success': False, 'error': 'videoId is required'}), 400
+        data['videoId'] = str(data['videoId']).strip()
+        job = jobs.submit(job_type, data, handler)
+        return jsonify({'success': True, 'jobId': job['id'], 'job': job}), 202
+
+    @app.route('/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        job = jobs.snapshot(job_id, with_result=request.args.get('result', '1') not in ('0', 'false', 'no'))
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        return jsonify({'success': True, 'job': job})
+
+    @app.route('/jobs', methods=['GET'])
+    def list_jobs():
+        return jsonify({'success': True, 'jobs': jobs.list()})
+
     @app.route('/generate', methods=['POST'])
     def generate_video():
         """
@@ -40,7 +309,7 @@ try:
         data = request.get_json(silent=True) or {}
         video_id = str(data.get('videoId') or '')
         target_languages = data.get('targetLanguages') or []
-        
+
         return jsonify({
             'success': True,
             'message': 'В разработке',
@@ -56,12 +325,14 @@ try:
             str(os.getenv('PYTHON_WORKER_DEBUG', '0')).lower() in ('1', 'true', 'yes') or
             str(os.getenv('FLASK_ENV', '')).lower().startswith('dev')
         )
-        app.run(host='0.0.0.0', port=port, debug=is_debug)
-        
+        warmup()
+        # use_reloader=False: reloader запускает второй процесс и теряет тёплое состояние/реестр задач
+        app.run(host='0.0.0.0', port=port, debug=is_debug, use_reloader=False, threaded=True)
+
 except ImportError as e:
-    print("⚠️  Python зависимости не установлены")
+    # Воркер — рабочий процесс скачиваний и парсинга: без зависимостей он должен падать, а не «успешно» завершаться
+    import sys
+    print("[ERR] Python зависимости воркера не установлены")
     print("📦 Установите их командой: pip install -r requirements.txt")
     print(f"Ошибка: {e}")
-    print("\nПока что Python workers не требуются для работы приложения.")
-    print("Основной функционал работает на Node.js + React")
-
+    sys.exit(1)
@@ -0,0 +1,340 @@
+"""
+Реестр движков распознавания речи (ASR)
+
+Каждый движок получает локальный аудиофайл и возвращает сегменты в нашем
+формате ({start, duration, text}); скачивание, кэш результатов, VAD и
+перенос таймкодов делает VideoParser.transcribe_audio одинаково для всех.
+
+    openai          — OpenAI Whisper API по кускам (asr_openai.py), нужен OPENAI_API_KEY
+    whisper         — локальный openai-whisper (PyTorch), пул процессов при WHISPER_WORKERS > 1
+    faster_whisper  — CTranslate2 (pip install faster-whisper), на CPU квантованный int8:
+                      в разы быстрее и легче openai-whisper при той же модели
+
+Движок выбирается на задачу (asrBackend в app.py, --asr-backend в CLI) или
+через ASR_BACKEND; auto — openai при наличии ключа, иначе faster_whisper, если
+установлен, иначе whisper. Свой движок добавляется через register_backend().
+"""
+
+import os
+import time
+import importlib.util
+from typing import Any, Dict, List, Optional, Tuple
+
+from audio_normalize import upload_ext
+from whisper_models import WhisperModelCache, get_model_cache
+from worker_common import env_int
+
+# Синонимы имён движков
+_ALIASES = {'api': 'openai', 'openai_api': 'openai', 'local': 'whisper', 'openai_whisper': 'whisper',
+            'ct2': 'faster_whisper', 'ctranslate2': 'faster_whisper', 'int8': 'faster_whisper'}
+
+
+def _installed(module: str) -> bool:
+    try:
+        return importlib.util.find_spec(module) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class AsrBackend:
+    """Базовый класс движка ASR."""
+
+    name = ''
+    # Значения полей type/source транскрипта
+    transcript_type = ''
+    default_model = ''
+    # Формат, в котором движок получает аудио (после нормализации и VAD)
+    speech_ext = 'wav'
+
+    def unavailable_reason(self) -> Optional[str]:
+        """None — движок можно использовать, иначе причина (для логов и /health)."""
+        return None
+
+    def resolve_model(self, model: Optional[str]) -> str:
+        return model or self.default_model
+
+    def cache_model(self, model: str) -> str:
+        """Модель для ключа кэша результатов (всё, что влияет на результат)."""
+        return model
+
+    def source(self, model: str) -> str:
+        return f'{self.name}_{model}'
+
+    def smaller_model(self, model: str, steps: int = 1) -> Optional[str]:
+        """Модель на steps ступеней меньше (для разгрузки очереди) или None, если меньше некуда."""
+        return None
+
+    def budget_models(self, ceiling: str) -> List[str]:
+        """Модели для выбора под бюджет времени, от ceiling к меньшим (пусто — модель не выбирается)."""
+        return []
+
+    def rtf_key(self, model: str) -> str:
+        """Ключ замеров скорости (asr_budget.py): всё, что влияет на время распознавания."""
+        return self.cache_model(model)
+
+    def model_loaded(self, model: str) -> bool:
+        return False
+
+    def detect_language(self, path: str, model: str, start: float, length: float) -> Optional[Tuple[str, float]]:
+        """(язык, вероятность) по куску аудио [start, start + length) или None, если движок не умеет."""
+        return None
+
+    def transcribe(self, path: str, model: str, language: Optional[str] = None, duration: Optional[float] = None,
+                   ext: str = 'mp3') -> Optional[Dict[str, Any]]:
+        """
+        Распознать файл
+
+        Returns:
+            dict: {segments: [{start, duration, text}], language, ...метаданные движка} или None
+        """
+        raise NotImplementedError
+
+
+class OpenAIBackend(AsrBackend):
+    name = 'openai'
+    transcript_type = 'asr_openai'
+
+    @property
+    def speech_ext(self) -> str:  # type: ignore[override]
+        # В API уходит сжатый файл: Opus/MP3 16 кГц моно (audio_normalize.py)
+        return upload_ext()
+
+    @property
+    def default_model(self) -> str:  # type: ignore[override]
+        return os.environ.get('ASR_MODEL', 'whisper-1')
+
+    def unavailable_reason(self) -> Optional[str]:
+        if not _installed('openai'):
+            return 'openai не установлен (pip install openai)'
+        if not os.environ.get('OPENAI_API_KEY'):
+            return 'OPENAI_API_KEY не задан'
+        return None
+
+    def source(self, model: str) -> str:
+        return 'openai_whisper'
+
+    def transcribe(self, path, model, language=None, duration=None, ext='mp3'):
+        from asr_openai import openai_chunk_transcriber, transcribe_file
+
+        result = transcribe_file(path, openai_chunk_transcriber(os.environ.get('OPENAI_API_KEY', ''), language, model),
+                                 ext=ext, duration=duration)
+        if not result:
+            return None
+        return {'segments': result['segments'], 'language': result.get('language') or language or 'auto',
+                'asr': result['asr']}
+
+
+# Размеры моделей Whisper от меньшей к большей (у openai-whisper и faster-whisper общие)
+_WHISPER_SIZES = ('tiny', 'base', 'small', 'medium', 'large')
+
+
+def _smaller_whisper(model: str, steps: int) -> Optional[str]:
+    name, suffix = (model[:-3], '.en') if model.endswith('.en') else (model, '')
+    size = 'large' if name.startswith('large') else name
+    if size not in _WHISPER_SIZES or steps <= 0:
+        return None
+    index = _WHISPER_SIZES.index(size)
+    if index == 0:
+        return None
+    smaller = _WHISPER_SIZES[max(0, index - steps)]
+    return smaller + suffix
+
+
+class LocalWhisperBackend(AsrBackend):
+    """Общее для локальных движков с моделями Whisper."""
+
+    default_model = 'base'
+
+    def smaller_model(self, model: str, steps: int = 1) -> Optional[str]:
+        return _smaller_whisper(model, steps)
+
+    def budget_models(self, ceiling: str) -> List[str]:
+        models = [ceiling]
+        while True:
+            smaller = _smaller_whisper(models[-1], 1)
+            if not smaller:
+                return models
+            models.append(smaller)
+
+    @staticmethod
+    def _window(path: str, start: float, length: float) -> Any:
+        from asr_openai import find_ffmpeg
+        from whisper_pool import load_window
+
+        ffmpeg = find_ffmpeg()
+        if not ffmpeg:
+            raise RuntimeError('ffmpeg не найден')
+        return load_window(ffmpeg, path, start, length)
+
+
+class WhisperBackend(LocalWhisperBackend):
+    name = 'whisper'
+    transcript_type = 'whisper_local'
+
+    def unavailable_reason(self) -> Optional[str]:
+        if not _installed('whisper'):
+            return 'openai-whisper не установлен (pip install openai-whisper; нужны ffmpeg и PyTorch)'
+        return None
+
+    def source(self, model: str) -> str:
+        return f'whisper_local_{model}'
+
+    def rtf_key(self, model: str) -> str:
+        from whisper_pool import whisper_workers
+
+        # Пул процессов меняет скорость в разы — замеры раздельные
+        workers = whisper_workers()
+        return f'{model}x{workers}' if workers > 1 else model
+
+    def model_loaded(self, model: str) -> bool:
+        return get_model_cache().loaded(model)
+
+    def detect_language(self, path, model, start, length):
+        from whisper_pool import detect_language
+
+        return detect_language(get_model_cache().get(model)[0], self._window(path, start, length))
+
+    def transcribe(self, path, model, language=None, duration=None, ext='mp3'):
+        from whisper_pool import transcribe_parallel, whisper_workers
+
+        # WHISPER_WORKERS > 1 — окна аудио распознаются в пуле процессов (whisper_pool.py)
+        if whisper_workers() > 1:
+            started = time.perf_counter()
+            pooled = transcribe_parallel(path, model, language, duration=duration)
+            if pooled:
+                timing = {'model': model, 'pool': pooled['pool'],
+                          'transcribe_ms': round((time.perf_counter() - started) * 1000, 1)}
+                return {'segments': pooled['segments'], 'language': pooled['language'] or language or 'auto',
+                        'timing': timing}
+
+        # Загрузка модели и распознавание меряем отдельно: при тёплом кэше load = 0
+        model_obj, timing = get_model_cache().get(model)
+        options = {'language': language} if language else {}
+        print("[INFO] Транскрибируем аудио...")
+        started = time.perf_counter()
+        result = model_obj.transcribe(path, **options)
+        timing['transcribe_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+        if 'segments' in result:
+            segments = [{'start': seg.get('start', 0),
+                         'duration': seg.get('end', 0) - seg.get('start', 0),
+                         'text': seg.get('text', '').strip()} for seg in result['segments']]
+        else:
+            segments = [{'start': 0, 'duration': 0, 'text': result.get('text', '')}]
+        return {'segments': segments, 'language': result.get('language', language or 'auto'), 'timing': timing}
+
+
+def _ct2_compute_type() -> str:
+    return os.environ.get('ASR_CT2_COMPUTE_TYPE', 'int8')
+
+
+def _load_ct2_model(name: str) -> Any:
+    from faster_whisper import WhisperModel
+
+    device = os.environ.get('ASR_CT2_DEVICE', 'cpu')
+    threads = env_int('ASR_CT2_THREADS', 0)
+    return WhisperModel(name, device=device, compute_type=_ct2_compute_type(), cpu_threads=threads)
+
+
+class FasterWhisperBackend(LocalWhisperBackend):
+    name = 'faster_whisper'
+    transcript_type = 'whisper_ct2'
+
+    def __init__(self):
+        # Отдельный LRU-кэш: модели CTranslate2 не torch, их размер берётся по таблице (с запасом для int8)
+        self._models: Optional[WhisperModelCache] = None
+
+    def unavailable_reason(self) -> Optional[str]:
+        if not _installed('faster_whisper'):
+            return 'faster-whisper не установлен (pip install faster-whisper)'
+        return None
+
+    def cache_model(self, model: str) -> str:
+        return f'{model}:{_ct2_compute_type()}'
+
+    def source(self, model: str) -> str:
+        return f'faster_whisper_{model}_{_ct2_compute_type()}'
+
+    def models(self) -> WhisperModelCache:
+        if self._models is None:
+            self._models = WhisperModelCache(loader=_load_ct2_model)
+        return self._models
+
+    def model_loaded(self, model: str) -> bool:
+        return self._models is not None and self._models.loaded(model)
+
+    def detect_language(self, path, model, start, length):
+        model_obj = self.models().get(model)[0]
+        # Язык определяется внутри transcribe() до первого сегмента — генератор не читаем
+        _, info = model_obj.transcribe(self._window(path, start, length), beam_size=1)
+        language = getattr(info, 'language', None)
+        return (language, float(getattr(info, 'language_probability', 0.0) or 0.0)) if language else None
+
+    def transcribe(self, path, model, language=None, duration=None, ext='mp3'):
+        model_obj, timing = self.models().get(model)
+        timing['compute_type'] = _ct2_compute_type()
+        started = time.perf_counter()
+        # transcribe() возвращает генератор: распознавание идёт по мере чтения сегментов
+        segs, info = model_obj.transcribe(path, language=language, beam_size=env_int('ASR_CT2_BEAM_SIZE', 5))
+        segments = [{'start': s.start, 'duration': s.end - s.start, 'text': (s.text or '').strip()} for s in segs]
+        timing['transcribe_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return {'segments': segments, 'language': getattr(info, 'language', None) or language or 'auto',
+                'timing': timing}
+
+
+_REGISTRY: Dict[str, AsrBackend] = {}
+
+
+def register_backend(backend: AsrBackend) -> AsrBackend:
+    """Добавить (или заменить) движок в реестре."""
+    _REGISTRY[backend.name] = backend
+    return backend
+
+
+for _backend in (OpenAIBackend(), WhisperBackend(), FasterWhisperBackend()):
+    register_backend(_backend)
+
+
+def get_backend(name: str) -> Optional[AsrBackend]:
+    name = (name or '').strip().lower()
+    return _REGISTRY.get(_ALIASES.get(name, name))
+
+
+def backend_names() -> List[str]:
+    return list(_REGISTRY)
+
+
+def available_backends() -> List[Dict[str, Any]]:
+    """Все движки с признаком доступности (без импорта тяжёлых библиотек)."""
+    out = []
+    for backend in _REGISTRY.values():
+        reason = backend.unavailable_reason()
+        out.append({'name': backend.name, 'available': reason is None, 'reason': reason,
+                    'default_model': backend.default_model})
+    return out
+
+
+def resolve_backend(name: Optional[str] = None) -> Optional[AsrBackend]:
+    """
+    Движок по имени (или ASR_BACKEND); 'auto' — первый доступный: openai, faster_whisper, whisper
+
+    Returns:
+        AsrBackend или None, если названный движок неизвестен/недоступен или доступных нет
+    """
+    name = (name or os.environ.get('ASR_BACKEND') or 'auto').strip().lower()
+    if name != 'auto':
+        backend = get_backend(name)
+        if backend is None:
+            print(f"[WARN] Неизвестный ASR движок: {name} (есть: {', '.join(_REGISTRY)})")
+            return None
+        reason = backend.unavailable_reason()
+        if reason:
+            print(f"[WARN] ASR движок {backend.name} недоступен: {reason}")
+            return None
+        return backend
+    for candidate in ('openai', 'faster_whisper', 'whisper'):
+        backend = _REGISTRY.get(candidate)
+        if backend and backend.unavailable_reason() is None:
+            return backend
+    print("[WARN] Нет доступных ASR движков (нужен OPENAI_API_KEY, faster-whisper или openai-whisper)")
+    return None
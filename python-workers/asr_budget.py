@@ -0,0 +1,353 @@
+"""
+Выбор модели Whisper под бюджет времени
+
+Раньше локальный Whisper всегда брал одну модель (base): 2-минутный ролик
+распознавался бы и medium за секунды, а 4-часовой стрим на CPU не укладывался
+и в base. С бюджетом (ASR_TIME_BUDGET секунд на задачу, asrBudget / --asr-budget)
+модель подбирается по длительности видео (из info-bundle) и real-time factor
+движка на этом хосте:
+
+    оценка = подготовка (скачивание, нормализация, VAD) + RTF(модель) * длительность * доля речи
+             + загрузка модели (если ещё не в памяти)
+
+Берётся самая крупная модель до ASR_BUDGET_MAX_MODEL (medium), чья оценка
+укладывается в бюджет; если не укладывается ни одна — самая маленькая.
+RTF каждой модели измеряется после каждого распознавания и сглаживается
+(EWMA, ASR_RTF_ALPHA) в python-workers/.cache/asr_rtf.sqlite3. Для ещё не
+замеренных моделей берутся типичные значения для CPU, умноженные на то, во
+сколько раз этот хост отличается от них на уже замеренных.
+
+RTF замеряется на секунду распознанного аудио, а с VAD (WHISPER_VAD) движку
+достаётся только речь — поэтому рядом сглаживается и доля речи в роликах
+(пока не замерена — 1.0), и оценка с VAD умножает RTF на ту же длину.
+
+Язык: при ASR_DETECT_LANGUAGE=1 и неизвестном языке он определяется заранее
+моделью ASR_DETECT_MODEL (tiny) по 30 с аудио, и основная модель сразу
+распознаёт на нём — без автоопределения большой моделью (и одинаково во всех
+окнах пула WHISPER_WORKERS).
+
+CLI:
+    python asr_budget.py --stats
+    python asr_budget.py --plan 3600 --budget 900 [--backend faster_whisper]
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from worker_common import cache_path, env_float, open_sqlite, process_singleton, write_transaction
+
+DEFAULT_RTF_PATH = cache_path('asr_rtf.sqlite3')
+
+# Типичный RTF на CPU (секунд распознавания на секунду аудио), пока нет своих замеров
+_PRIOR_RTF = {
+    'whisper': {'tiny': 0.08, 'base': 0.15, 'small': 0.45, 'medium': 1.3, 'large': 2.6},
+    'faster_whisper': {'tiny': 0.03, 'base': 0.06, 'small': 0.18, 'medium': 0.5, 'large': 1.0},
+}
+# Типичная загрузка модели с диска, с
+_PRIOR_LOAD_S = {'tiny': 1.0, 'base': 2.0, 'small': 5.0, 'medium': 15.0, 'large': 30.0}
+# Подготовка аудио (скачивание + ffmpeg + VAD) на секунду аудио
+_PRIOR_PREP_RTF = 0.02
+# Доля речи после VAD, пока нет замеров: считаем речью всё аудио
+_PRIOR_SPEECH_FRACTION = 1.0
+
+DETECT_SECONDS = 30.0
+
+
+def budget_seconds() -> float:
+    """Бюджет по умолчанию (ASR_TIME_BUDGET, сек; 0 — модель не подбирается)."""
+    return max(0.0, env_float('ASR_TIME_BUDGET', 0.0))
+
+
+def detect_language_enabled() -> bool:
+    return (os.environ.get('ASR_DETECT_LANGUAGE') or '0').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _size(model: str) -> str:
+    name = model[:-3] if model.endswith('.en') else model
+    return 'large' if name.startswith('large') else name
+
+
+class RtfStore:
+    """Сглаженные замеры RTF и загрузки моделей (SQLite, общий для процессов)."""
+
+    def __init__(self, path: Optional[str] = None, alpha: Optional[float] = None):
+        """
+        Args:
+            path: Путь к SQLite файлу (ASR_RTF_PATH или python-workers/.cache/asr_rtf.sqlite3)
+            alpha: Вес нового замера (ASR_RTF_ALPHA, 0.3)
+        """
+        self.path = path or os.environ.get('ASR_RTF_PATH') or DEFAULT_RTF_PATH
+        self.alpha = alpha if alpha is not None else min(1.0, max(0.01, env_float('ASR_RTF_ALPHA', 0.3)))
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = open_sqlite(self.path)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rtf (
+                    key TEXT PRIMARY KEY,
+                    rtf REAL NOT NULL,
+                    load_s REAL,
+                    samples INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[Tuple[float, Optional[float], int]]:
+        """(rtf, load_s, samples) или None."""
+        try:
+            with self._lock:
+                row = self._db().execute('SELECT rtf, load_s, samples FROM rtf WHERE key = ?', (key,)).fetchone()
+            return (row[0], row[1], row[2]) if row else None
+        except Exception as e:
+            print(f"[WARN] ASR RTF read failed: {e}")
+            return None
+
+    def record(self, key: str, rtf: float, load_s: Optional[float] = None) -> None:
+        """Учесть замер: EWMA для RTF и загрузки (load_s=None — модель была в памяти)."""
+        try:
+            with self._lock:
+                db = self._db()
+                with write_transaction(db):
+                    row = db.execute('SELECT rtf, load_s, samples FROM rtf WHERE key = ?', (key,)).fetchone()
+                    if row:
+                        rtf = row[0] + self.alpha * (rtf - row[0])
+                        if load_s is not None and row[1] is not None:
+                            load_s = row[1] + self.alpha * (load_s - row[1])
+                        elif load_s is None:
+                            load_s = row[1]
+                    db.execute('INSERT OR REPLACE INTO rtf (key, rtf, load_s, samples, updated_at) VALUES (?, ?, ?, ?, ?)',
+                               (key, rtf, load_s, (row[2] if row else 0) + 1, time.time()))
+        except Exception as e:
+            print(f"[WARN] ASR RTF write failed: {e}")
+
+    def rows(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db().execute('SELECT key, rtf, load_s, samples, updated_at FROM rtf ORDER BY key').fetchall()
+        return [{'key': k, 'rtf': round(r, 4), 'load_s': round(l, 2) if l is not None else None, 'samples': n,
+                 'updated_at': int(t)} for k, r, l, n, t in rows]
+
+
+@process_singleton
+def get_rtf_store() -> RtfStore:
+    """Общие для процесса замеры (база — общая для всех процессов)."""
+    return RtfStore()
+
+
+def _prep_key(engine: Any) -> str:
+    return f'{engine.name}:prep'
+
+
+def _model_key(engine: Any, model: str) -> str:
+    return f'{engine.name}:{engine.rtf_key(model)}'
+
+
+def _speech_key(engine: Any) -> str:
+    return f'{engine.name}:speech'
+
+
+def speech_fraction(engine: Any) -> float:
+    """Сглаженная доля речи после VAD (сколько аудио движок распознаёт на секунду ролика)."""
+    measured = get_rtf_store().get(_speech_key(engine))
+    return min(1.0, max(0.0, measured[0])) if measured else _PRIOR_SPEECH_FRACTION
+
+
+def host_factor(engine: Any) -> Optional[float]:
+    """Во сколько раз этот хост быстрее/медленнее типичного: медиана замер/табличный RTF по моделям движка."""
+    store = get_rtf_store()
+    ratios = []
+    for size, prior in _PRIOR_RTF.get(engine.name, {}).items():
+        measured = store.get(_model_key(engine, size))
+        if measured and prior:
+            ratios.append(measured[0] / prior)
+    if not ratios:
+        return None
+    ratios.sort()
+    return ratios[len(ratios) // 2]
+
+
+def estimate(engine: Any, model: str, duration: float, factor: Optional[float] = None,
+             speech: float = 1.0) -> Optional[Dict[str, Any]]:
+    """
+    Оценка времени распознавания duration секунд аудио моделью model
+
+    Args:
+        factor: host_factor(engine) — масштаб табличного RTF для ещё не замеренных моделей
+        speech: Доля аудио, которую получит движок (после VAD), — RTF замерен на ней же
+
+    Returns:
+        dict: {model, estimate_s, rtf, load_s, source: measured | scaled | prior} или None (нечем оценить)
+    """
+    store = get_rtf_store()
+    measured = store.get(_model_key(engine, model))
+    prior_rtf = _PRIOR_RTF.get(engine.name, {}).get(_size(model))
+    if measured:
+        rtf, load_s, source = measured[0], measured[1], 'measured'
+    elif prior_rtf is not None and factor:
+        rtf, load_s, source = prior_rtf * factor, None, 'scaled'
+    elif prior_rtf is not None:
+        rtf, load_s, source = prior_rtf, None, 'prior'
+    else:
+        return None
+    if load_s is None:
+        load_s = _PRIOR_LOAD_S.get(_size(model), 0.0)
+    if engine.model_loaded(model):
+        load_s = 0.0
+    prep = store.get(_prep_key(engine))
+    prep_s = (prep[0] if prep else _PRIOR_PREP_RTF) * duration
+    total = prep_s + rtf * duration * speech + load_s
+    return {'model': model, 'estimate_s': round(total, 1), 'rtf': round(rtf, 4), 'load_s': round(load_s, 1),
+            'source': source}
+
+
+def pick_model(engine: Any, duration: Optional[float], budget_s: float,
+               ceiling: Optional[str] = None, detect: bool = False, vad: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Самая крупная модель движка, укладывающаяся в бюджет
+
+    Args:
+        engine: AsrBackend (budget_models, rtf_key, model_loaded)
+        duration: Длительность аудио, сек
+        budget_s: Бюджет на распознавание задачи, сек
+        ceiling: Максимальная модель (по умолчанию ASR_BUDGET_MAX_MODEL, medium)
+        detect: Учесть предварительное определение языка
+        vad: Движок распознаёт только речь — оценка по замеренной доле речи
+
+    Returns:
+        dict: {budget_s, duration, model, estimate_s, source, over_budget, candidates[, speech]} или None —
+              движок не поддерживает выбор модели или длительность неизвестна
+    """
+    if not duration or budget_s <= 0:
+        return None
+    candidates = engine.budget_models(ceiling or os.environ.get('ASR_BUDGET_MAX_MODEL') or 'medium')
+    if not candidates:
+        return None
+    factor = host_factor(engine)
+    speech = speech_fraction(engine) if vad else 1.0
+    reserve = 0.0
+    if detect:
+        detect_est = estimate(engine, detect_model(), min(duration, DETECT_SECONDS), factor)
+        reserve = detect_est['estimate_s'] if detect_est else 0.0
+    estimates = [e for e in (estimate(engine, m, duration, factor, speech) for m in candidates) if e]
+    if not estimates:
+        return None
+    # candidates — от крупной к мелкой
+    chosen = next((e for e in estimates if e['estimate_s'] + reserve <= budget_s), estimates[-1])
+    plan = {
+        'budget_s': budget_s,
+        'duration': round(duration, 1),
+        'model': chosen['model'],
+        'estimate_s': round(chosen['estimate_s'] + reserve, 1),
+        'source': chosen['source'],
+        'over_budget': chosen['estimate_s'] + reserve > budget_s,
+        'candidates': {e['model']: e['estimate_s'] for e in estimates},
+    }
+    if vad:
+        plan['speech'] = round(speech, 3)
+    if plan['over_budget']:
+        print(f"[WARN] ASR: ни одна модель не укладывается в {budget_s:.0f} с "
+              f"({duration / 60:.0f} мин аудио) — берём {chosen['model']} (~{plan['estimate_s']:.0f} с)")
+    else:
+        print(f"[INFO] ASR: модель {chosen['model']} под бюджет {budget_s:.0f} с "
+              f"({duration / 60:.0f} мин аудио, оценка ~{plan['estimate_s']:.0f} с, RTF {chosen['source']})")
+    return plan
+
+
+def record_run(engine: Any, model: str, audio_seconds: Optional[float], transcribe_s: float,
+               load_s: Optional[float] = None, prep_s: Optional[float] = None,
+               prep_seconds: Optional[float] = None, vad: bool = False) -> None:
+    """
+    Сохранить замер распознавания
+
+    Args:
+        audio_seconds: Сколько аудио распознано (после VAD — только речь)
+        transcribe_s: Время распознавания без загрузки модели
+        load_s: Время загрузки модели (None — модель была в памяти)
+        prep_s: Время подготовки аудио (скачивание, ffmpeg, VAD) без ожидания слота
+        prep_seconds: Длительность исходного аудио для prep_s
+        vad: Распознавалась только речь — учесть долю audio_seconds / prep_seconds
+    """
+    if not audio_seconds or audio_seconds <= 0:
+        return
+    store = get_rtf_store()
+    store.record(_model_key(engine, model), max(0.0, transcribe_s) / audio_seconds, load_s)
+    if prep_s is not None and prep_seconds:
+        store.record(_prep_key(engine), prep_s / prep_seconds)
+        if vad:
+            store.record(_speech_key(engine), min(1.0, audio_seconds / prep_seconds))
+
+
+def detect_model() -> str:
+    return os.environ.get('ASR_DETECT_MODEL') or 'tiny'
+
+
+def detect_language(engine: Any, path: str, duration: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Определить язык по DETECT_SECONDS аудио маленькой моделью
+
+    Берётся кусок после первой минуты (во вступлении часто музыка); для
+    аудио после VAD и коротких записей — с начала.
+
+    Returns:
+        dict: {language, probability, model, ms} или None (движок не умеет / язык не уверен)
+    """
+    model = detect_model()
+    start = 60.0 if duration and duration >= 60.0 + 2 * DETECT_SECONDS else 0.0
+    started = time.perf_counter()
+    try:
+        detected = engine.detect_language(path, model, start, DETECT_SECONDS)
+    except Exception as e:
+        print(f"[WARN] ASR: не удалось определить язык заранее: {e}")
+        return None
+    if not detected:
+        return None
+    language, probability = detected
+    info = {'language': language, 'probability': round(probability, 3), 'model': model,
+            'ms': int((time.perf_counter() - started) * 1000)}
+    if probability < env_float('ASR_DETECT_MIN_PROB', 0.5):
+        print(f"[INFO] ASR: язык {language} не уверен ({probability:.2f}) — автоопределение основной моделью")
+        info['language'] = None
+    else:
+        print(f"[INFO] ASR: язык {language} ({probability:.2f}, {model}, {info['ms']} мс)")
+    return info
+
+
+def main() -> int:
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description='ASR model selection under a time budget')
+    parser.add_argument('--stats', action='store_true', help='Measured RTF and model load times on this host')
+    parser.add_argument('--plan', type=float, metavar='SECONDS', help='Pick a model for audio of this duration')
+    parser.add_argument('--budget', type=float, help='Time budget, seconds (default: ASR_TIME_BUDGET)')
+    parser.add_argument('--backend', default=None, help='ASR engine (default: ASR_BACKEND / auto)')
+    parser.add_argument('--max-model', default=None, help='Largest model to consider (ASR_BUDGET_MAX_MODEL)')
+    parser.add_argument('--vad', action=argparse.BooleanOptionalAction, help='Estimate over speech only (default: WHISPER_VAD)')
+    args = parser.parse_args()
+
+    if args.plan:
+        from asr_backends import get_backend, resolve_backend
+
+        # Оценка не требует установленного движка — можно прикинуть до pip install
+        engine = get_backend(args.backend) if args.backend else resolve_backend(None)
+        if engine is None:
+            print(f"[ERR] Неизвестный ASR движок: {args.backend}")
+            return 1
+        from vad import vad_enabled
+
+        plan = pick_model(engine, args.plan, args.budget or budget_seconds(), args.max_model,
+                          detect=detect_language_enabled(), vad=vad_enabled() if args.vad is None else args.vad)
+        print(json.dumps(plan, ensure_ascii=False, indent=2))
+        return 0 if plan else 1
+    print(json.dumps(get_rtf_store().rows(), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
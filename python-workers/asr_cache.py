@@ -0,0 +1,245 @@
+"""
+Кэш результатов распознавания речи (SQLite, адресация по содержимому)
+
+Повторный parse_video видео без субтитров раньше заново платил за OpenAI
+Whisper или минуты CPU локального Whisper. Результат ASR хранится по ключу
+sha256(video_id, backend, model, language, audio_hash), где audio_hash —
+отпечаток конкретного аудиопотока. Искать в кэше нужно до скачивания, поэтому
+отпечаток берётся не из байтов, а из параметров ссылки googlevideo, которые
+однозначно задают содержимое: itag (формат), clen (размер) и lmt (время
+последнего изменения потока). Перекодированный YouTube поток получает новый
+lmt — и новый ключ. Для ссылок без этих параметров кэш не используется.
+
+Записи не устаревают (тот же поток — тот же результат); размер ограничен
+ASR_CACHE_MAX_MB, сверх лимита удаляются давно не использованные. ASR_CACHE=0
+отключает кэш.
+
+CLI:
+    python asr_cache.py --stats
+    python asr_cache.py --list [--video-id ID]
+    python asr_cache.py --show KEY
+    python asr_cache.py --purge [--video-id ID] [--older-than-days N]
+"""
+
+import os
+import json
+import time
+import zlib
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from worker_common import NullCache, cache_path, env_int, open_sqlite, process_singleton
+
+DEFAULT_CACHE_PATH = cache_path('asr_results.sqlite3')
+
+
+def audio_fingerprint(url: Optional[str]) -> Optional[str]:
+    """Отпечаток аудиопотока по itag/clen/lmt из ссылки googlevideo (None — если их нет)."""
+    if not url:
+        return None
+    query = parse_qs(urlparse(url).query)
+    parts = [(query.get(name) or [''])[0] for name in ('itag', 'clen', 'lmt')]
+    if not all(parts):
+        return None
+    return hashlib.sha256('|'.join(parts).encode('ascii', 'replace')).hexdigest()[:32]
+
+
+def cache_key(video_id: str, backend: str, model: str, language: Optional[str], audio_hash: str) -> str:
+    raw = '\0'.join((video_id, backend, model, language or 'auto', audio_hash))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class AsrCache:
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None):
+        """
+        Args:
+            path: Путь к SQLite файлу (ASR_CACHE_PATH или python-workers/.cache/asr_results.sqlite3)
+            max_bytes: Лимит размера данных (ASR_CACHE_MAX_MB, по умолчанию 256 МБ)
+        """
+        self.path = path or os.environ.get('ASR_CACHE_PATH') or DEFAULT_CACHE_PATH
+        self.max_bytes = max_bytes if max_bytes is not None else env_int('ASR_CACHE_MAX_MB', 256) * 1024 * 1024
+        self.counters: Dict[str, int] = {'hits': 0, 'misses': 0, 'puts': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = open_sqlite(self.path)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS asr_cache (
+                    key TEXT PRIMARY KEY,
+                    video_id TEXT NOT NULL,
+                    backend TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    audio_hash TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    segments INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_asr_cache_access ON asr_cache(last_access)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_asr_cache_video ON asr_cache(video_id)')
+            conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            self._conn = conn
+        return self._conn
+
+    def _count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+        self._db().execute(
+            'INSERT INTO counters(name, value) VALUES(?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+            (name, n),
+        )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Транскрипт по ключу или None (учитывает hit/miss)."""
+        try:
+            now = time.time()
+            with self._lock:
+                db = self._db()
+                row = db.execute('SELECT data, created_at FROM asr_cache WHERE key = ?', (key,)).fetchone()
+                if not row:
+                    self._count('misses')
+                    return None
+                db.execute('UPDATE asr_cache SET last_access = ?, hits = hits + 1 WHERE key = ?', (now, key))
+                self._count('hits')
+            transcript = json.loads(zlib.decompress(row[0]).decode('utf-8'))
+            transcript['cache'] = {'hit': True, 'key': key[:16], 'created_at': int(row[1])}
+            return transcript
+        except Exception as e:
+            print(f"[WARN] ASR cache read failed: {e}")
+            return None
+
+    def put(self, key: str, video_id: str, backend: str, model: str, language: Optional[str],
+            audio_hash: str, transcript: Dict[str, Any]) -> None:
+        """Сохранить транскрипт (dict с segments) под ключом cache_key(...)."""
+        try:
+            now = time.time()
+            payload = {k: v for k, v in transcript.items() if k != 'cache'}
+            data = zlib.compress(json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8'), 6)
+            with self._lock:
+                db = self._db()
+                db.execute(
+                    'INSERT OR REPLACE INTO asr_cache '
+                    '(key, video_id, backend, model, language, audio_hash, data, size, segments, created_at, last_access) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (key, video_id, backend, model, language or 'auto', audio_hash, data, len(data),
+                     len(transcript.get('segments') or []), now, now),
+                )
+                self._count('puts')
+                self._evict(db)
+        except Exception as e:
+            print(f"[WARN] ASR cache write failed: {e}")
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        """Удалить самые давно использованные записи сверх лимита размера."""
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM asr_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in db.execute('SELECT key, size FROM asr_cache ORDER BY last_access ASC').fetchall():
+            if total <= self.max_bytes:
+                break
+            db.execute('DELETE FROM asr_cache WHERE key = ?', (key,))
+            total -= size
+            evicted += 1
+        if evicted:
+            self._count('evictions', evicted)
+
+    def entries(self, video_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Записи без данных (для --list), недавно использованные первыми."""
+        query = ('SELECT key, video_id, backend, model, language, size, segments, created_at, last_access, hits '
+                 'FROM asr_cache')
+        params: tuple = ()
+        if video_id:
+            query += ' WHERE video_id = ?'
+            params = (video_id,)
+        with self._lock:
+            rows = self._db().execute(query + ' ORDER BY last_access DESC', params).fetchall()
+        names = ('key', 'video_id', 'backend', 'model', 'language', 'size', 'segments', 'created_at', 'last_access', 'hits')
+        return [dict(zip(names, row)) for row in rows]
+
+    def show(self, key_prefix: str) -> Optional[Dict[str, Any]]:
+        """Транскрипт по ключу или его префиксу (без учёта в счётчиках)."""
+        with self._lock:
+            row = self._db().execute('SELECT data FROM asr_cache WHERE key LIKE ? LIMIT 1',
+                                     (key_prefix + '%',)).fetchone()
+        return json.loads(zlib.decompress(row[0]).decode('utf-8')) if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики процесса и общие счётчики/размер базы."""
+        try:
+            with self._lock:
+                db = self._db()
+                entries, total = db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM asr_cache').fetchone()
+                shared = dict(db.execute('SELECT name, value FROM counters').fetchall())
+                by_backend = dict(db.execute('SELECT backend, COUNT(*) FROM asr_cache GROUP BY backend').fetchall())
+            return {
+                'path': self.path,
+                'entries': entries,
+                'bytes': total,
+                'max_bytes': self.max_bytes,
+                'by_backend': by_backend,
+                'process': dict(self.counters),
+                'total': shared,
+            }
+        except Exception as e:
+            return {'path': self.path, 'error': str(e)}
+
+    def purge(self, video_id: Optional[str] = None, older_than: Optional[float] = None) -> int:
+        """Удалить записи (все, для video_id и/или не использованные дольше older_than сек). Возвращает число удалённых."""
+        where, params = [], []
+        if video_id:
+            where.append('video_id = ?')
+            params.append(video_id)
+        if older_than:
+            where.append('last_access < ?')
+            params.append(time.time() - older_than)
+        query = 'DELETE FROM asr_cache' + (' WHERE ' + ' AND '.join(where) if where else '')
+        with self._lock:
+            return self._db().execute(query, params).rowcount or 0
+
+
+@process_singleton
+def get_asr_cache() -> Any:
+    """Общий для процесса экземпляр кэша (или заглушка, если кэш отключён)."""
+    if str(os.environ.get('ASR_CACHE', '1')).lower() in ('0', 'false', 'no'):
+        return NullCache()
+    return AsrCache()
+
+
+def main():
+    """Просмотр и очистка кэша"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='ASR result cache')
+    parser.add_argument('--stats', action='store_true', help='Print cache stats JSON (default)')
+    parser.add_argument('--list', action='store_true', help='List entries (most recently used first)')
+    parser.add_argument('--show', metavar='KEY', help='Print the cached transcript for a key (or key prefix)')
+    parser.add_argument('--purge', action='store_true', help='Delete entries (all, or filtered below)')
+    parser.add_argument('--video-id', help='Limit --list/--purge to one video')
+    parser.add_argument('--older-than-days', type=float, help='Limit --purge to entries unused for N days')
+    args = parser.parse_args()
+
+    cache = AsrCache()
+    if args.purge:
+        older = args.older_than_days * 86400 if args.older_than_days else None
+        print(json.dumps({'success': True, 'deleted': cache.purge(args.video_id, older)}))
+    elif args.list:
+        print(json.dumps(cache.entries(args.video_id), ensure_ascii=False))
+    elif args.show:
+        found = cache.show(args.show)
+        print(json.dumps(found if found is not None else {'success': False, 'error': 'not found'}, ensure_ascii=False))
+    else:
+        print(json.dumps(cache.stats(), ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
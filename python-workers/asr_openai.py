@@ -0,0 +1,280 @@
+"""
+Распознавание речи через OpenAI Whisper API по кускам
+
+API принимает файл до 25 МБ. Вместо обрезки аудио по ASR_MAX_BYTES файл
+режется по времени (ffmpeg, без перекодирования) на куски, которые
+гарантированно помещаются в лимит, куски отправляются параллельно
+(ASR_PARALLELISM), а таймкоды сегментов сдвигаются на начало куска.
+
+Соседние куски перекрываются на ASR_CHUNK_OVERLAP секунд, чтобы слово на
+границе не потерялось; при склейке каждый кусок отвечает за свою половину
+перекрытия (сегмент относится к куску, в чью зону попадает его середина).
+
+Адрес API берётся из ASR_API_BASE / OPENAI_BASE_URL, поэтому путь можно
+проверить против локального HTTP-сервера-заглушки (см. benchmarks.py asr-upload).
+"""
+
+import os
+import re
+import time
+import shutil
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from worker_common import env_float, env_int
+
+# Лимит API — 25 МБ; оставляем запас на multipart и заголовки контейнера
+DEFAULT_MAX_BYTES = 24 * 1024 * 1024
+
+# Кодек -> контейнер, в который ffmpeg может скопировать поток без перекодирования
+_CODEC_EXT = {'aac': 'm4a', 'opus': 'ogg', 'vorbis': 'ogg', 'mp3': 'mp3', 'flac': 'flac'}
+
+_DURATION_RE = re.compile(r'Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)')
+_AUDIO_CODEC_RE = re.compile(r'Audio:\s*([A-Za-z0-9_]+)')
+
+# (path, filename) -> (сегменты [{start, end, text}], язык)
+TranscribeChunkFn = Callable[[str, str], Tuple[List[Dict[str, Any]], Optional[str]]]
+
+
+def find_ffmpeg() -> Optional[str]:
+    return os.environ.get('FFMPEG_PATH') or shutil.which('ffmpeg') or shutil.which('ffmpeg.exe')
+
+
+def probe_audio(path: str, ffmpeg: str) -> Tuple[Optional[float], Optional[str]]:
+    """(длительность в секундах, кодек аудио) по выводу `ffmpeg -i` (ffprobe не нужен)."""
+    proc = subprocess.run([ffmpeg, '-hide_banner', '-i', path], capture_output=True, text=True, timeout=60)
+    out = proc.stderr or ''
+    duration = None
+    m = _DURATION_RE.search(out)
+    if m:
+        duration = int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3))
+    c = _AUDIO_CODEC_RE.search(out)
+    return duration, (c.group(1).lower() if c else None)
+
+
+def guess_audio_ext(url: str) -> str:
+    """Расширение по mime= в ссылке googlevideo (audio/webm, audio/mp4), по умолчанию mp3."""
+    m = re.search(r'[?&]mime=audio(?:%2F|/)([a-z0-9]+)', url or '', re.I)
+    if m:
+        return {'mp4': 'm4a', 'webm': 'webm', 'mpeg': 'mp3', 'ogg': 'ogg'}.get(m.group(1).lower(), 'mp3')
+    return 'mp3'
+
+
+def plan_chunks(duration: float, total_bytes: int, max_bytes: int, max_seconds: float,
+                overlap: float) -> List[Tuple[float, float]]:
+    """
+    Окна (start, length) в секундах, каждое меньше max_bytes при среднем битрейте файла
+
+    Returns:
+        list: Окна с перекрытием overlap; одно окно, если файл и так помещается
+    """
+    if duration <= 0:
+        return [(0.0, 0.0)]
+    if total_bytes <= max_bytes and duration <= max_seconds:
+        return [(0.0, duration)]
+    # 10% запаса на неравномерный битрейт и заголовки контейнера
+    fit = duration * (max_bytes * 0.9) / total_bytes if total_bytes else duration
+    step = max(30.0, min(fit, max_seconds) - overlap)
+    windows = []
+    start = 0.0
+    while start < duration:
+        length = min(step + overlap, duration - start)
+        windows.append((round(start, 3), round(length, 3)))
+        start += step
+    return windows
+
+
+def cut_chunk(ffmpeg: str, src: str, start: float, length: float, dst: str, copy: bool = True) -> None:
+    """Вырезать [start, start+length) без перекодирования (или в mp3, если copy=False)."""
+    codec = ['-c:a', 'copy'] if copy else ['-c:a', 'libmp3lame', '-b:a', '64k']
+    cmd = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', '-ss', f'{start:.3f}', '-t', f'{length:.3f}',
+           '-i', src, '-vn', '-map', '0:a:0', *codec, dst]
+    subprocess.run(cmd, check=True, capture_output=True, timeout=600)
+
+
+def _field(seg: Any, key: str, default: Any = None) -> Any:
+    """Поле сегмента из dict или объекта (openai>=1 отдаёт pydantic-модели)."""
+    if isinstance(seg, dict):
+        return seg.get(key, default)
+    return getattr(seg, key, default)
+
+
+def _clip_words(words: List[Any], offset: float, lo: float, hi: float) -> Optional[Dict[str, Any]]:
+    """Сегмент из слов, чья середина (в абсолютном времени) попадает в [lo, hi)."""
+    kept = []
+    for w in words:
+        w_start = float(_field(w, 'start', 0.0) or 0.0)
+        w_end = float(_field(w, 'end', w_start) or w_start)
+        if lo <= offset + (w_start + w_end) / 2 < hi:
+            kept.append((w_start, w_end, _field(w, 'word', '') or ''))
+    if not kept:
+        return None
+    # Whisper хранит слова с ведущим пробелом — склеиваем как есть
+    return {'start': kept[0][0], 'end': kept[-1][1], 'text': ''.join(k[2] for k in kept)}
+
+
+def stitch(results: List[Optional[List[Dict[str, Any]]]], windows: List[Tuple[float, float]],
+           overlap: float) -> List[Dict[str, Any]]:
+    """
+    Склеить сегменты кусков: сдвиг на начало окна, каждое перекрытие делится пополам
+
+    Сегмент берётся из того куска, в чью половину попадает его середина: у начала
+    куска сегмент может начаться до точки раздела, но только он содержит речь
+    после конца предыдущего куска. Если у сегмента есть пословные метки
+    (words, локальный Whisper с word_timestamps), то же правило применяется к
+    словам, и сегмент на стыке обрезается по точке раздела без повтора слов.
+
+    Args:
+        results: Сегменты каждого куска ({start, end, text}, время относительно куска) или None
+        windows: Окна (start, length) тех же кусков
+    """
+    segments: List[Dict[str, Any]] = []
+    for i, segs in enumerate(results):
+        if not segs:
+            continue
+        offset = windows[i][0]
+        lo = offset + overlap / 2 if i > 0 else float('-inf')
+        hi = windows[i + 1][0] + overlap / 2 if i + 1 < len(windows) else float('inf')
+        for seg in segs:
+            words = _field(seg, 'words')
+            if words:
+                # Слова уже отобраны по своим серединам — сегмент целиком не проверяем
+                seg = _clip_words(words, offset, lo, hi)
+                if seg is None:
+                    continue
+            start = float(_field(seg, 'start', 0.0) or 0.0)
+            end = float(_field(seg, 'end', start) or start)
+            text = (_field(seg, 'text', '') or '').strip()
+            abs_start = offset + start
+            mid = abs_start + max(0.0, end - start) / 2
+            if not text or not (words or lo <= mid < hi):
+                continue
+            segments.append({'start': round(abs_start, 3), 'duration': round(max(0.0, end - start), 3), 'text': text})
+    return segments
+
+
+def openai_chunk_transcriber(api_key: str, language: Optional[str] = None,
+                             model: Optional[str] = None) -> TranscribeChunkFn:
+    """Функция распознавания одного куска через OpenAI-совместимый API."""
+    from openai import OpenAI
+
+    base_url = os.environ.get('ASR_API_BASE') or os.environ.get('OPENAI_BASE_URL') or None
+    client = OpenAI(api_key=api_key, base_url=base_url,
+                    timeout=env_float('ASR_REQUEST_TIMEOUT', 600.0), max_retries=0)
+    model = model or os.environ.get('ASR_MODEL', 'whisper-1')
+
+    def transcribe(path: str, filename: str):
+        with open(path, 'rb') as fh:
+            params: Dict[str, Any] = {'model': model, 'file': (filename, fh), 'response_format': 'verbose_json'}
+            if language:
+                params['language'] = language
+            resp = client.audio.transcriptions.create(**params)
+        segs = list(_field(resp, 'segments') or [])
+        if not segs and _field(resp, 'text'):
+            segs = [{'start': 0.0, 'end': 0.0, 'text': _field(resp, 'text')}]
+        return segs, _field(resp, 'language')
+
+    return transcribe
+
+
+def transcribe_file(
+    path: str,
+    transcribe_chunk: TranscribeChunkFn,
+    ext: str = 'mp3',
+    duration: Optional[float] = None,
+    parallelism: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    max_seconds: Optional[float] = None,
+    overlap: Optional[float] = None,
+    retries: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Распознать аудиофайл любого размера кусками
+
+    Args:
+        path: Путь к аудио
+        transcribe_chunk: Функция (path, filename) -> (segments, language)
+        ext: Расширение исходного файла (для имени при отправке целиком)
+        duration: Длительность, если известна (иначе — из ffmpeg)
+        parallelism: Одновременных запросов (ASR_PARALLELISM, 4)
+        max_bytes: Лимит размера куска (ASR_CHUNK_MAX_BYTES, 24 МБ)
+        max_seconds: Максимальная длина куска (ASR_CHUNK_SECONDS, 600)
+        overlap: Перекрытие кусков в секундах (ASR_CHUNK_OVERLAP, 2)
+        retries: Повторов на кусок (ASR_CHUNK_RETRIES, 2)
+
+    Returns:
+        dict: {segments, language, asr: {chunks, parallelism, ...}} или None, если не распознан ни один кусок
+    """
+    parallelism = max(1, parallelism or env_int('ASR_PARALLELISM', 4))
+    max_bytes = max_bytes or env_int('ASR_CHUNK_MAX_BYTES', DEFAULT_MAX_BYTES)
+    max_seconds = max_seconds or env_float('ASR_CHUNK_SECONDS', 600.0)
+    overlap = env_float('ASR_CHUNK_OVERLAP', 2.0) if overlap is None else overlap
+    retries = env_int('ASR_CHUNK_RETRIES', 2) if retries is None else retries
+    started = time.perf_counter()
+    total_bytes = os.path.getsize(path)
+
+    ffmpeg = find_ffmpeg()
+    codec = None
+    if ffmpeg:
+        probed, codec = probe_audio(path, ffmpeg)
+        duration = duration or probed
+    if total_bytes <= max_bytes and (not duration or duration <= max_seconds or not ffmpeg):
+        # Помещается в лимит — отправляем как есть (длинные файлы с ffmpeg режем ради параллельности)
+        windows = [(0.0, float(duration or 0.0))]
+    elif not ffmpeg or not duration:
+        # Без ffmpeg разрезать по времени нельзя — явно сообщаем, а не обрезаем молча
+        print(f"[ERR] Аудио {total_bytes / 1024 / 1024:.1f} МБ больше лимита API, а ffmpeg "
+              f"{'не найден' if not ffmpeg else 'не определил длительность'} — разбить на куски нельзя")
+        return None
+    else:
+        windows = plan_chunks(duration, total_bytes, max_bytes, max_seconds, overlap)
+
+    def run_chunk(i: int, tmpdir: str) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str], int, Optional[str]]:
+        start, length = windows[i]
+        if len(windows) == 1:
+            chunk_path, chunk_ext = path, ext
+        else:
+            chunk_ext = _CODEC_EXT.get(codec or '', 'mp3')
+            chunk_path = os.path.join(tmpdir, f'chunk_{i:04d}.{chunk_ext}')
+            cut_chunk(ffmpeg, path, start, length, chunk_path, copy=(codec in _CODEC_EXT))  # type: ignore[arg-type]
+        size = os.path.getsize(chunk_path)
+        last_error = None
+        for attempt in range(retries + 1):
+            try:
+                segs, lang = transcribe_chunk(chunk_path, f'chunk_{i:04d}.{chunk_ext}')
+                return segs, lang, size, None
+            except Exception as e:
+                last_error = str(e)
+                print(f"[WARN] ASR кусок {i + 1}/{len(windows)} попытка {attempt + 1}: {e}")
+                if attempt < retries:
+                    time.sleep(min(2 ** attempt, 10))
+        return None, None, size, last_error
+
+    with tempfile.TemporaryDirectory(prefix='asr_chunks_') as tmpdir:
+        print(f"[INFO] ASR: кусков {len(windows)}, параллельно до {parallelism}")
+        with ThreadPoolExecutor(max_workers=min(parallelism, len(windows)), thread_name_prefix='asr') as pool:
+            outcomes = list(pool.map(lambda i: run_chunk(i, tmpdir), range(len(windows))))
+
+    failed = [i for i, o in enumerate(outcomes) if o[0] is None]
+    if len(failed) == len(windows):
+        print(f"[ERR] ASR: ни один кусок не распознан ({outcomes[0][3]})")
+        return None
+    if failed:
+        print(f"[WARN] ASR: не распознаны куски {failed} — транскрипт неполный")
+    languages = [o[1] for o in outcomes if o[1]]
+    return {
+        'segments': stitch([o[0] for o in outcomes], windows, overlap),
+        'language': languages[0] if languages else None,
+        'asr': {
+            'chunks': len(windows),
+            'parallelism': parallelism,
+            'chunk_seconds': round(windows[0][1], 1),
+            'overlap': overlap,
+            'audio_bytes': total_bytes,
+            'upload_bytes': sum(o[2] for o in outcomes),
+            'failed_chunks': failed,
+            'elapsed_ms': int((time.perf_counter() - started) * 1000),
+        },
+    }
@@ -0,0 +1,134 @@
+"""
+Планировщик распознавания речи: лимит параллельности на движок и очередь с приоритетами
+
+Когда в воркер (app.py) или пакетный режим приходит много видео без субтитров,
+каждое раньше сразу запускало свой Whisper: локальные модели делили одни и те же
+ядра, API упирался в rate limit. Теперь распознавание (сам вызов движка —
+скачивание, нормализация и VAD идут вне очереди) занимает слот своего движка:
+
+    ASR_CONCURRENCY_OPENAI=4, ASR_CONCURRENCY_WHISPER=1, ASR_CONCURRENCY_FASTER_WHISPER=1
+
+Свободный слот получает первый в очереди: interactive (пользователь ждёт) раньше
+bulk (пакеты), внутри приоритета — по времени прихода (priority_slots.py).
+
+Переполнение очереди (ожидающих этого движка на момент прихода):
+    >= ASR_QUEUE_DEGRADE_AT (4)  — локальный движок берёт модель на ступень меньше
+                                   за каждые DEGRADE_AT ожидающих (large -> medium -> ... -> tiny)
+    >= ASR_QUEUE_REJECT_AT (32)  — задача bulk отклоняется (AsrRejected); interactive ждёт
+0 отключает порог. Очередь общая для процесса; задачи, которые должны делить лимит,
+должны идти через один воркер (app.py /jobs) или один пакетный запуск (--batch).
+"""
+
+import threading
+from typing import Any, Dict, Optional
+
+from priority_slots import PRIORITIES, PrioritySlots
+from worker_common import env_int, process_singleton
+
+_DEFAULT_LIMITS = {'openai': 4}
+
+
+class AsrRejected(Exception):
+    """Очередь движка переполнена — задача bulk не принята."""
+
+
+class Slot:
+    """Выданный слот: модель (возможно, уменьшенная) и метрики ожидания."""
+
+    def __init__(self, scheduler: 'AsrScheduler', backend: str, model: str, info: Dict[str, Any]):
+        self.scheduler = scheduler
+        self.backend = backend
+        self.model = model
+        self.info = info
+
+    def __enter__(self) -> 'Slot':
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.scheduler.release(self.backend)
+
+
+class AsrScheduler:
+    def __init__(self, limits: Optional[Dict[str, int]] = None, degrade_at: Optional[int] = None,
+                 reject_at: Optional[int] = None):
+        """
+        Args:
+            limits: Слотов на движок (по умолчанию ASR_CONCURRENCY_<ДВИЖОК>; openai 4, остальные 1)
+            degrade_at: Порог очереди для уменьшения модели (ASR_QUEUE_DEGRADE_AT, 4; 0 — никогда)
+            reject_at: Порог очереди для отказа задачам bulk (ASR_QUEUE_REJECT_AT, 32; 0 — никогда)
+        """
+        self._limits = dict(limits or {})
+        self.degrade_at = env_int('ASR_QUEUE_DEGRADE_AT', 4) if degrade_at is None else degrade_at
+        self.reject_at = env_int('ASR_QUEUE_REJECT_AT', 32) if reject_at is None else reject_at
+        # Слоты и очередь на движок
+        self._lanes: Dict[str, PrioritySlots] = {}
+        self._lock = threading.Lock()
+
+    def _lane(self, backend: str) -> PrioritySlots:
+        with self._lock:
+            lane = self._lanes.get(backend)
+            if lane is None:
+                limit = self._limits.get(backend) or env_int(f'ASR_CONCURRENCY_{backend.upper()}',
+                                                             _DEFAULT_LIMITS.get(backend, 1))
+                lane = self._lanes[backend] = PrioritySlots(limit)
+                lane.counters.update({'degraded': 0, 'rejected': 0})
+            return lane
+
+    def acquire(self, engine: Any, model: str, priority: str = 'interactive') -> Slot:
+        """
+        Дождаться слота движка
+
+        Args:
+            engine: AsrBackend (name и smaller_model для уменьшения модели)
+            model: Запрошенная модель
+            priority: 'interactive' или 'bulk'
+
+        Returns:
+            Slot — контекстный менеджер; slot.model — модель, которой распознавать
+
+        Raises:
+            AsrRejected: очередь переполнена, а задача bulk
+        """
+        rank = PRIORITIES.get(priority, PRIORITIES['interactive'])
+        lane = self._lane(engine.name)
+        with lane.cond:
+            depth = lane.depth()
+            if self.reject_at and depth >= self.reject_at and rank > 0:
+                lane.counters['rejected'] += 1
+                raise AsrRejected(f'очередь {engine.name} переполнена ({depth} в ожидании)')
+            granted_model, degraded_from = model, None
+            if self.degrade_at and depth >= self.degrade_at:
+                smaller = engine.smaller_model(model, depth // self.degrade_at)
+                if smaller:
+                    granted_model, degraded_from = smaller, model
+                    lane.counters['degraded'] += 1
+            wait_ms = lane.acquire(rank)
+        info: Dict[str, Any] = {'priority': priority, 'wait_ms': round(wait_ms, 1), 'queue_depth': depth}
+        if degraded_from:
+            info['degraded_from'] = degraded_from
+            print(f"[WARN] ASR: очередь {engine.name} — {depth} в ожидании, модель {degraded_from} -> {granted_model}")
+        if wait_ms >= 1000:
+            print(f"[INFO] ASR: ожидание слота {engine.name} {wait_ms / 1000:.1f} с ({priority})")
+        return Slot(self, engine.name, granted_model, info)
+
+    def release(self, backend: str) -> None:
+        self._lane(backend).release()
+
+    def stats(self) -> Dict[str, Any]:
+        """По движкам: лимит, занято, ожидающие по приоритетам, время ожидания (среднее, p95), счётчики."""
+        out: Dict[str, Any] = {'degrade_at': self.degrade_at, 'reject_at': self.reject_at, 'backends': {}}
+        with self._lock:
+            lanes = dict(self._lanes)
+        for name, lane in lanes.items():
+            with lane.cond:
+                out['backends'][name] = {
+                    'waiting': {p: lane.depth(rank) for p, rank in PRIORITIES.items()},
+                    **lane.stats(),
+                }
+        return out
+
+
+@process_singleton
+def get_scheduler() -> AsrScheduler:
+    """Общий для процесса планировщик."""
+    return AsrScheduler()
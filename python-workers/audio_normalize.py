@@ -0,0 +1,210 @@
+"""
+Нормализация аудио перед ASR: 16 кГц моно прямо из потока скачивания
+
+Раньше в модель или API уходил исходный bestaudio (m4a/webm 128–160 кбит/с,
+иногда под именем .mp3): лишние мегабайты загрузки и лишнее декодирование.
+Whisper всё равно работает на 16 кГц моно, поэтому поток сразу перекодируется:
+
+    range_fetch (Range-куски в любом порядке) -> _OrderedPipe -> ffmpeg stdin -> файл 16 кГц моно
+
+Полноразмерный исходник на диск не пишется. Формат результата:
+    wav  — PCM s16le для локальных движков (декодирование почти бесплатно)
+    mp3  — MP3 ASR_NORMALIZE_BITRATE (32k) для загрузки в API; ASR_NORMALIZE_CODEC=opus — Opus 24k
+           в ogg (на ~25% меньше, но кодируется в разы дольше — на слабом CPU это дороже загрузки)
+
+ASR_NORMALIZE=0 отключает этап (качается исходный поток, как раньше).
+"""
+
+import os
+import time
+import tempfile
+import threading
+import subprocess
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+from asr_openai import find_ffmpeg, probe_audio
+from range_fetch import fetch_into
+from worker_common import env_int
+
+SAMPLE_RATE = 16000
+
+# Кодек загрузки -> (расширение, аргументы кодировщика, битрейт по умолчанию)
+_UPLOAD_CODECS = {
+    'opus': ('ogg', ['-c:a', 'libopus', '-application', 'voip'], '24k'),
+    'mp3': ('mp3', ['-c:a', 'libmp3lame'], '32k'),
+}
+
+
+def normalize_enabled() -> bool:
+    return (os.environ.get('ASR_NORMALIZE') or '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def _upload_codec() -> Tuple[str, List[str], str]:
+    codec = (os.environ.get('ASR_NORMALIZE_CODEC') or 'mp3').strip().lower()
+    return _UPLOAD_CODECS.get(codec, _UPLOAD_CODECS['mp3'])
+
+
+def upload_ext() -> str:
+    """Расширение файла для загрузки в API (mp3 или ogg)."""
+    return _upload_codec()[0]
+
+
+def encoder_args(ext: str) -> List[str]:
+    """Аргументы ffmpeg для записи 16 кГц моно в формате ext."""
+    if ext == 'wav':
+        return ['-c:a', 'pcm_s16le']
+    for codec_ext, args, bitrate in _UPLOAD_CODECS.values():
+        if codec_ext == ext:
+            return [*args, '-b:a', os.environ.get('ASR_NORMALIZE_BITRATE') or bitrate]
+    return ['-c:a', 'libmp3lame', '-b:a', '48k']
+
+
+class PipeAborted(Exception):
+    """Запись в ffmpeg прервана; повтор куска не поможет."""
+
+    fatal = True
+
+
+class _OrderedPipe:
+    """
+    write_at(offset, data) из нескольких потоков -> последовательная запись в sink
+
+    Куски, пришедшие раньше своей очереди, ждут в памяти (не больше max_pending
+    байт: сверх лимита писатель блокируется, пока не догонит голова потока).
+    Голову пишет тот поток, чей кусок на ней, поэтому он никогда не ждёт.
+    """
+
+    def __init__(self, sink: BinaryIO, max_pending: int):
+        self.sink = sink
+        self.max_pending = max_pending
+        self.pos = 0
+        self.pending: Dict[int, bytes] = {}
+        self.pending_bytes = 0
+        self.peak_pending = 0
+        self.error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+
+    def _write(self, data: bytes) -> None:
+        try:
+            self.sink.write(data)
+        except (BrokenPipeError, OSError, ValueError) as e:
+            self.error = PipeAborted(f'ffmpeg перестал принимать данные: {e}')
+            self._cond.notify_all()
+            raise self.error
+
+    def write_at(self, offset: int, data: bytes) -> None:
+        with self._cond:
+            # Пока ждём, голова может дойти до нашего смещения — тогда пишем сами
+            while self.error is None and offset != self.pos and self.pending_bytes + len(data) > self.max_pending:
+                self._cond.wait()
+            if self.error is not None:
+                raise PipeAborted(str(self.error))
+            if offset != self.pos:
+                self.pending[offset] = data
+                self.pending_bytes += len(data)
+                self.peak_pending = max(self.peak_pending, self.pending_bytes)
+                return
+            self._write(data)
+            self.pos += len(data)
+            while self.pos in self.pending:
+                chunk = self.pending.pop(self.pos)
+                self.pending_bytes -= len(chunk)
+                self._write(chunk)
+                self.pos += len(chunk)
+            self._cond.notify_all()
+
+    def abort(self, error: BaseException) -> None:
+        with self._cond:
+            if self.error is None:
+                self.error = error
+            self._cond.notify_all()
+
+
+def _ffmpeg_cmd(ffmpeg: str, src: str, dst: str, ext: str) -> List[str]:
+    return [ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', '-i', src, '-vn', '-map', '0:a:0',
+            '-ac', '1', '-ar', str(SAMPLE_RATE), *encoder_args(ext), dst]
+
+
+def normalize_url(url: str, dst: str, ext: str = 'wav', duration: Optional[float] = None,
+                  **fetch_kwargs: Any) -> Dict[str, Any]:
+    """
+    Скачать поток и перекодировать его в dst (16 кГц моно) на лету
+
+    Args:
+        url: Ссылка на аудиопоток
+        dst: Путь результата
+        ext: 'wav' (PCM для локальных движков) или upload_ext() (для API)
+        duration: Ожидаемая длительность (сек) — проверка, что ffmpeg прочитал поток целиком
+        **fetch_kwargs: Параметры range_fetch.fetch_into (connections, range_bytes, ...)
+
+    Returns:
+        dict: {format, sample_rate, audio_seconds, source_bytes, output_bytes, ratio, elapsed_ms,
+               peak_buffer_mb, download}
+
+    Raises:
+        RuntimeError: нет ffmpeg или он не смог разобрать поток (вызывающий качает исходник как раньше)
+    """
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        raise RuntimeError('ffmpeg не найден')
+    connections = fetch_kwargs.get('connections') or env_int('FETCH_CONNECTIONS', 4)
+    range_bytes = fetch_kwargs.get('range_bytes') or env_int('FETCH_RANGE_MB', 4) * 1024 * 1024
+    started = time.perf_counter()
+    # stderr ffmpeg — во временный файл: канал мог бы заполниться и остановить кодировщик
+    with tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(_ffmpeg_cmd(ffmpeg, 'pipe:0', dst, ext), stdin=subprocess.PIPE,
+                                stdout=subprocess.DEVNULL, stderr=err)
+        pipe = _OrderedPipe(proc.stdin, max(2, connections) * range_bytes)  # type: ignore[arg-type]
+        download: Optional[Dict[str, Any]] = None
+        fetch_error: Optional[Exception] = None
+        try:
+            download = fetch_into(url, pipe.write_at, on_error=pipe.abort, **fetch_kwargs)
+        except Exception as e:
+            fetch_error = e
+        finally:
+            try:
+                proc.stdin.close()  # type: ignore[union-attr]
+            except OSError:
+                pass
+            code = proc.wait()
+        # Ошибка сети важнее: ffmpeg на оборванном потоке мог завершиться как угодно
+        if fetch_error is not None and not isinstance(fetch_error.__cause__ or fetch_error, PipeAborted):
+            raise fetch_error
+        if code != 0 or download is None:
+            err.seek(0)
+            tail = err.read().decode('utf-8', 'replace').strip().splitlines()[-1:] or [f'exit {code}']
+            raise RuntimeError(f'ffmpeg: {tail[0]}')
+    # MP4 с moov в конце из канала не читается: ffmpeg выходит с кодом 0 и почти пустым файлом
+    got = probe_audio(dst, ffmpeg)[0] or 0.0
+    if got <= 0 or (duration and got < duration * 0.9):
+        raise RuntimeError(f'ffmpeg прочитал {got:.0f} с из {duration or 0:.0f} с (поток не читается из канала)')
+    elapsed = time.perf_counter() - started
+    source_bytes = download['bytes']
+    output_bytes = os.path.getsize(dst)
+    stats = {
+        'format': ext,
+        'sample_rate': SAMPLE_RATE,
+        'audio_seconds': round(got, 1),
+        'source_bytes': source_bytes,
+        'output_bytes': output_bytes,
+        'ratio': round(output_bytes / source_bytes, 3) if source_bytes else None,
+        'elapsed_ms': int(elapsed * 1000),
+        'peak_buffer_mb': round(pipe.peak_pending / 1024 / 1024, 1),
+        'download': download,
+    }
+    print(f"[INFO] Аудио нормализовано в {ext} 16 кГц моно: {source_bytes / 1024 / 1024:.1f} -> "
+          f"{output_bytes / 1024 / 1024:.1f} МБ за {elapsed:.1f} с (скачивание и ffmpeg одновременно)")
+    return stats
+
+
+def normalize_file(src: str, dst: str, ext: str = 'wav') -> Dict[str, Any]:
+    """То же для уже скачанного файла (бенчмарк, локальные файлы)."""
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        raise RuntimeError('ffmpeg не найден')
+    started = time.perf_counter()
+    subprocess.run(_ffmpeg_cmd(ffmpeg, src, dst, ext), check=True, capture_output=True, timeout=3600)
+    source_bytes, output_bytes = os.path.getsize(src), os.path.getsize(dst)
+    return {'format': ext, 'sample_rate': SAMPLE_RATE, 'source_bytes': source_bytes, 'output_bytes': output_bytes,
+            'ratio': round(output_bytes / source_bytes, 3) if source_bytes else None,
+            'elapsed_ms': int((time.perf_counter() - started) * 1000)}
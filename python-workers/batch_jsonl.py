@@ -0,0 +1,109 @@
+"""
+Пакетный режим CLI (video_parser.py, video_downloader.py): задания и JSONL на stdout
+
+В пакетном режиме stdout — только JSONL-события, по строке на событие; все
+print() уходят в stderr. Задания берутся из аргументов и файла ('-' — stdin):
+строка — ID (разделители — пробелы, запятые) или JSON {"video_id", ...};
+'#' — комментарий. Последняя строка — итог {"event": "summary", ...}.
+"""
+
+import re
+import sys
+import json
+import time
+import threading
+from typing import Any, Callable, Dict, List, NoReturn, Optional, TextIO
+
+Emit = Callable[[Dict[str, Any]], None]
+
+
+def batch_stdout(batch_mode: bool) -> TextIO:
+    """Исходный stdout для JSONL; в пакетном режиме print() дальше пишет в stderr."""
+    out = sys.stdout
+    if batch_mode:
+        # Все print() уходят в stderr, чтобы stdout оставался чистым JSONL
+        sys.stdout = sys.stderr
+    return out
+
+
+def read_batch_jobs(positional: List[str], ids_file: Optional[str],
+                    defaults: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Задания пакетного режима из аргументов и файла ('-' — stdin)
+
+    Args:
+        positional: ID из командной строки
+        ids_file: Файл с ID или JSON-заданиями
+        defaults: Поля, которых нет в JSON-задании (например, quality из флагов)
+
+    Returns:
+        list: {video_id, **defaults, ...} без повторов video_id, в порядке ввода
+    """
+    lines: List[str] = list(positional or [])
+    if ids_file:
+        if ids_file == '-':
+            lines += sys.stdin.read().splitlines()
+        else:
+            with open(ids_file, 'r', encoding='utf-8') as f:
+                lines += f.read().splitlines()
+    jobs: List[Dict[str, Any]] = []
+    seen = set()
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('{'):
+            try:
+                items = [json.loads(line)]
+            except ValueError:
+                print(f"[WARN] Пропущена строка задания: {line[:80]}")
+                continue
+        else:
+            items = [{'video_id': v} for v in re.split(r'[\s,]+', line) if v and not v.startswith('#')]
+        for item in items:
+            job = {**(defaults or {}), **item}
+            if job.get('video_id') and job['video_id'] not in seen:
+                seen.add(job['video_id'])
+                jobs.append(job)
+    return jobs
+
+
+def exit_no_jobs() -> NoReturn:
+    print("[ERR] No video IDs given for batch mode")
+    sys.exit(2)
+
+
+def run_jsonl_batch(out: TextIO, run: Callable[[Emit], List[Dict[str, Any]]],
+                    summary: Callable[[], Dict[str, Any]], default: Optional[Callable[[Any], Any]] = None) -> int:
+    """
+    Выполнить пакет и записать итог
+
+    Args:
+        out: Исходный stdout (batch_stdout)
+        run: Функция (emit) -> результаты {success, ...}; emit пишет событие строкой JSONL (потокобезопасно)
+        summary: Дополнительные поля итоговой строки (статистика очередей)
+        default: json.dumps default для значений, которые JSON не знает
+
+    Returns:
+        int: Код выхода — 0, если все задания успешны, иначе 1
+    """
+    out_lock = threading.Lock()
+
+    def emit(obj: Dict[str, Any]) -> None:
+        line = json.dumps(obj, ensure_ascii=False, default=default)
+        with out_lock:
+            out.write(line + '\n')
+            out.flush()
+
+    started = time.monotonic()
+    results = run(emit)
+    succeeded = sum(1 for r in results if r.get('success'))
+    emit({
+        'event': 'summary',
+        'total': len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'elapsed_ms': int((time.monotonic() - started) * 1000),
+        **summary(),
+    })
+    return 0 if succeeded == len(results) else 1
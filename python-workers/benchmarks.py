@@ -0,0 +1,1107 @@
+"""
+Бенчмарки python-workers
+
+Запуск:
+    python benchmarks.py startup [--repeat 5] [--budget-ms 800] [--save startup.json] [--compare startup.json]
+    python benchmarks.py vtt [--file subs.vtt] [--hours 10] [--crlf]
+    python benchmarks.py dedup [--scale 1 10 100] [--repeat 5]
+    python benchmarks.py transcript-mem [--hours 3 10]
+    python benchmarks.py parsed-format [--hours 10]
+    python benchmarks.py asr-upload [--audio file.m4a] [--minutes 60] [--parallelism 1 2 4]
+    python benchmarks.py whisper-pool [--model fake|tiny|base] [--audio file.m4a] [--minutes 20] [--workers 1 2 4]
+    python benchmarks.py range-fetch [--mb 64] [--per-conn-mbps 2] [--connections 1 2 4 8] [--fail-rate 0.05]
+    python benchmarks.py asr-backends [--audio speech.m4a] [--backends openai whisper faster_whisper] [--model base]
+    python benchmarks.py normalize [--audio file.m4a] [--minutes 30] [--per-conn-mbps 2] [--fail-rate 0.05]
+    python benchmarks.py av-hedge [--scale 0.25] [--repeat 5] [--delay 0.5]
+
+startup — время (wall) и RSS от запуска интерпретатора до точки входа каждого
+режима CLI video_parser.py / video_downloader.py (см. startup_probe.py).
+Сетевых запросов не делается.
+
+vtt — старый парсер WebVTT (вся строка в памяти) против потокового webvtt.py
+(куски по 64 КБ): время и пик памяти (tracemalloc). Без --file строится
+длинный VTT с «бегущими» автосубтитрами из фикстуры _Fjcou9w1ko_parsed.json.
+
+dedup — склейка сегментов в full_text: старая эвристика против caption_dedup.py
+на фикстурах *_parsed.json (сегменты в секунду, доля повторных 6-грамм в
+результате). --scale повторяет трек N раз, чтобы проверить линейность.
+
+transcript-mem — память транскрипта на N часов: список dict (как после json.load)
+против CompactTranscript (удерживаемый объём и пик при построении, tracemalloc).
+
+parsed-format — файл результата: JSON indent=2 против ytc (parsed_store.py):
+размер, запись, полное чтение и чтение только заголовка.
+
+asr-upload — распознавание по кускам (asr_openai.py) против локального
+OpenAI-совместимого сервера-заглушки: время при разной параллельности, число
+кусков и покрытие таймкодов. Нужны openai и ffmpeg; без --audio генерируется
+синтетическое аудио.
+
+whisper-pool — локальный Whisper в пуле процессов (whisper_pool.py): время
+«холодного» (запуск процессов + загрузка модели) и «тёплого» прогона, RTF и
+ускорение в зависимости от числа процессов. --model fake (по умолчанию)
+не требует torch: модель-заглушка тратит --cost секунд CPU на минуту аудио и
+«слышит» слова, закодированные в синтетическом сигнале, поэтому проверяется и
+склейка окон — ни одно слово не должно повториться или пропасть.
+
+range-fetch — скачивание потока аудио (range_fetch.py) против локального
+сервера с ограничением скорости на соединение (как googlevideo) и случайными
+обрывами: МБ/с, число повторов и совпадение sha256 при разном числе соединений.
+
+asr-backends — каждый движок из asr_backends.py на одном и том же аудио, каждый
+в отдельном процессе: холодный прогон (с загрузкой модели), тёплый, RTF тёплого
+прогона и пиковый RSS процесса. Недоступные движки выводятся с причиной. Без
+OPENAI_API_KEY OpenAI API меряется против локальной заглушки. Синтетический тон
+годится для RTF и памяти; качество распознавания — только на --audio с речью.
+
+normalize — исходный bestaudio против потоковой нормализации (audio_normalize.py)
+в Opus (для API) и WAV 16 кГц моно (для локальных движков) через сервер с
+ограничением скорости: размер, время скачивания с перекодированием, время
+декодирования в PCM (как перед моделью) и загрузки в заглушку API.
+
+av-hedge — get_best_av_urls против заглушки извлечения (без сети и yt-dlp):
+у каждого player_client своя задержка и исход (ошибка, info без раздельных
+A/V, успех) в нескольких сценариях. Последовательный перебор (AV_HEDGE_MAX=1)
+против хеджа с задержкой --delay и запуска всех сразу: время до ответа
+(медиана и максимум по --repeat с разбросом задержек ±20%), победитель и
+число запущенных извлечений.
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+
+WORKERS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (метка, скрипт, аргументы)
+STARTUP_MODES: List[Tuple[str, Optional[str], List[str]]] = [
+    ('python:empty', None, []),
+    ('parser:parse', 'video_parser.py', ['dQw4w9WgXcQ']),
+    ('parser:batch', 'video_parser.py', ['dQw4w9WgXcQ', 'jNQXAC9IVRw']),
+    ('parser:init-template', 'video_parser.py', ['--init-template', '--spreadsheet', 'SPREADSHEET_ID']),
+    ('downloader:download', 'video_downloader.py', ['dQw4w9WgXcQ']),
+    ('downloader:audio-only', 'video_downloader.py', ['dQw4w9WgXcQ', '--audio-only']),
+    ('downloader:direct-url', 'video_downloader.py', ['dQw4w9WgXcQ', '--direct-url']),
+    ('downloader:best-av-urls', 'video_downloader.py', ['dQw4w9WgXcQ', '--best-av-urls']),
+    ('downloader:formats-json', 'video_downloader.py', ['dQw4w9WgXcQ', '--formats-json']),
+    ('downloader:list-formats', 'video_downloader.py', ['dQw4w9WgXcQ', '--list-formats']),
+    ('downloader:env-dump', 'video_downloader.py', ['dummy', '--env-dump']),
+    ('downloader:yt-dlp-version', 'video_downloader.py', ['dummy', '--yt-dlp-version']),
+]
+
+
+def _run_probe(python: str, script: Optional[str], args: List[str], env: Dict[str, str], cwd: str) -> Dict[str, Any]:
+    if script is None:
+        cmd = [python, '-c', 'from startup_probe import probe_startup; probe_startup("empty")']
+    else:
+        cmd = [python, os.path.join(WORKERS_DIR, script), *args]
+    started = time.perf_counter()
+    proc = subprocess.run(cmd, env=env, cwd=cwd, capture_output=True, text=True, timeout=120)
+    wall_ms = (time.perf_counter() - started) * 1000
+    probe: Dict[str, Any] = {}
+    # В пакетном режиме парсера весь вывод, кроме JSONL, уходит в stderr
+    for line in reversed((proc.stdout + '\n' + proc.stderr).splitlines()):
+        if line.startswith('{"startup_probe"'):
+            probe = json.loads(line)
+            break
+    if not probe:
+        tail = (proc.stderr or proc.stdout).strip().splitlines()[-1:] or ['']
+        return {'wall_ms': wall_ms, 'error': f'no probe output (exit {proc.returncode}): {tail[0]}'}
+    return {'wall_ms': wall_ms, **probe}
+
+
+def bench_startup(repeat: int, python: str) -> Dict[str, Dict[str, Any]]:
+    """Прогнать все режимы repeat раз, вернуть медиану/минимум wall time и RSS."""
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory(prefix='startup_bench_') as tmp:
+        env = dict(os.environ)
+        env.update({
+            'WORKER_STARTUP_PROBE': '1',
+            'PYTHONPATH': WORKERS_DIR + os.pathsep + env.get('PYTHONPATH', ''),
+            'YTDLP_CACHE_PATH': os.path.join(tmp, 'cache.sqlite3'),
+        })
+        for label, script, args in STARTUP_MODES:
+            extra = ['--output-dir', os.path.join(tmp, 'downloads')] if script == 'video_downloader.py' else []
+            # Первый прогон прогревает кэш байткода и файловой системы — не учитываем
+            _run_probe(python, script, args + extra, env, tmp)
+            runs = [_run_probe(python, script, args + extra, env, tmp) for _ in range(repeat)]
+            ok = [r for r in runs if 'error' not in r]
+            if not ok:
+                results[label] = {'error': runs[-1].get('error')}
+                continue
+            walls = [r['wall_ms'] for r in ok]
+            rss = [r['rss_kb'] for r in ok if r.get('rss_kb') is not None]
+            results[label] = {
+                'wall_ms_median': round(statistics.median(walls), 1),
+                'wall_ms_min': round(min(walls), 1),
+                'rss_kb': int(statistics.median(rss)) if rss else None,
+                'modules': ok[-1].get('modules'),
+                'heavy_loaded': ok[-1].get('heavy_loaded'),
+            }
+    return results
+
+
+def _print_startup(results: Dict[str, Dict[str, Any]]) -> None:
+    print(f"{'mode':28} {'median ms':>10} {'min ms':>8} {'RSS MB':>8} {'modules':>8}  heavy")
+    for label, r in results.items():
+        if 'error' in r:
+            print(f"{label:28} ERROR: {r['error']}")
+            continue
+        rss = f"{r['rss_kb'] / 1024:.1f}" if r.get('rss_kb') else '-'
+        heavy = ','.join(r.get('heavy_loaded') or []) or '-'
+        print(f"{label:28} {r['wall_ms_median']:>10} {r['wall_ms_min']:>8} {rss:>8} {r.get('modules') or '-':>8}  {heavy}")
+
+
+def cmd_startup(args) -> int:
+    results = bench_startup(args.repeat, args.python)
+    _print_startup(results)
+    failed = False
+
+    if args.budget_ms:
+        over = [k for k, r in results.items() if r.get('wall_ms_median', 0) > args.budget_ms]
+        for k in over:
+            print(f"[BUDGET] {k}: {results[k]['wall_ms_median']} ms > {args.budget_ms} ms")
+        failed = failed or bool(over)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        for k, r in results.items():
+            b = baseline.get(k) or {}
+            if 'wall_ms_median' in r and b.get('wall_ms_median'):
+                ratio = r['wall_ms_median'] / b['wall_ms_median']
+                if ratio > 1 + args.tolerance:
+                    print(f"[REGRESSION] {k}: {b['wall_ms_median']} -> {r['wall_ms_median']} ms (x{ratio:.2f})")
+                    failed = True
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"[SAVE] {args.save}")
+    return 1 if failed else 0
+
+
+def legacy_parse_vtt(vtt_text: str) -> List[Dict[str, Any]]:
+    """Прежний VideoParser._parse_vtt — эталон для сравнения."""
+    def parse_ts(ts: str) -> float:
+        parts = ts.replace(',', '.').split(':')
+        if len(parts) == 3:
+            h, m, s = parts
+            return int(h) * 3600 + int(m) * 60 + float(s)
+        if len(parts) == 2:
+            m, s = parts
+            return int(m) * 60 + float(s)
+        try:
+            return float(parts[0])
+        except Exception:
+            return 0.0
+
+    segments: List[Dict[str, Any]] = []
+    for block in vtt_text.split('\n\n'):
+        lines = [ln.strip('\ufeff').strip() for ln in block.splitlines() if ln.strip()]
+        if len(lines) < 2:
+            continue
+        time_line = None
+        for i in range(min(2, len(lines))):
+            if '-->' in lines[i]:
+                time_line = lines[i]
+                text_lines = lines[i+1:]
+                break
+        if not time_line:
+            continue
+        try:
+            start_s, end_s = [s.strip() for s in time_line.split('-->')[:2]]
+            start = parse_ts(start_s)
+            end = parse_ts(end_s)
+            text = ' '.join(text_lines).strip()
+            if text:
+                segments.append({'start': start, 'duration': max(0.0, end - start), 'text': text})
+        except Exception:
+            continue
+    return segments
+
+
+def _fmt_vtt_ts(t: float) -> str:
+    h, rem = divmod(t, 3600)
+    m, s = divmod(rem, 60)
+    return f"{int(h):02d}:{int(m):02d}:{s:06.3f}"
+
+
+def synth_vtt(hours: float, crlf: bool = False) -> str:
+    """Длинный VTT в формате автосубтитров YouTube (настройки кью, инлайн-теги)."""
+    with open(os.path.join(WORKERS_DIR, '_Fjcou9w1ko_parsed.json'), 'r', encoding='utf-8') as f:
+        segs = json.load(f)['transcript']['segments']
+    span = (segs[-1]['start'] + 5.0) or 1.0
+    parts = ['WEBVTT\nKind: captions\nLanguage: ru\n']
+    offset = 0.0
+    while offset < hours * 3600:
+        for i, seg in enumerate(segs):
+            start = offset + seg['start']
+            end = offset + (segs[i + 1]['start'] if i + 1 < len(segs) else span)
+            parts.append(f"{_fmt_vtt_ts(start)} --> {_fmt_vtt_ts(end)} align:start position:0%\n{seg['text']}\n")
+        offset += span
+    text = '\n'.join(parts)
+    return text.replace('\n', '\r\n') if crlf else text
+
+
+def _measure(fn) -> Tuple[Any, float, int]:
+    """(результат, время в мс, пик памяти в байтах); tracemalloc замедляет код, поэтому отдельный прогон."""
+    started = time.perf_counter()
+    result = fn()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed_ms, peak
+
+
+def cmd_vtt(args) -> int:
+    from webvtt import iter_vtt_segments
+
+    if args.file:
+        with open(args.file, 'rb') as f:
+            raw = f.read()
+    else:
+        raw = synth_vtt(args.hours, args.crlf).encode('utf-8')
+    chunk = args.chunk_kb * 1024
+    print(f"[INFO] VTT: {len(raw) / 1024 / 1024:.1f} MB")
+
+    def legacy():
+        # Как раньше: resp.text целиком, затем разбор строки
+        return legacy_parse_vtt(raw.decode('utf-8', errors='replace'))
+
+    def streaming():
+        # Как resp.iter_content(): bytes-куски, сегменты собираются в список
+        return list(iter_vtt_segments(raw[i:i + chunk] for i in range(0, len(raw), chunk)))
+
+    def streaming_count():
+        # Потребитель, не удерживающий сегменты, — пик памяти самого парсера
+        return sum(1 for _ in iter_vtt_segments(raw[i:i + chunk] for i in range(0, len(raw), chunk)))
+
+    print(f"{'parser':20} {'ms':>10} {'peak MB':>9} {'segments':>9} {'zero dur':>9}")
+    for label, fn in (('legacy', legacy), ('streaming', streaming), ('streaming (count)', streaming_count)):
+        result, ms, peak = _measure(fn)
+        if isinstance(result, list):
+            count = len(result)
+            zero = sum(1 for s in result if not s['duration'])
+        else:
+            count, zero = result, '-'
+        print(f"{label:20} {ms:>10.1f} {peak / 1024 / 1024:>9.1f} {count:>9} {zero:>9}")
+    return 0
+
+
+def legacy_full_text(segments: List[Dict[str, Any]]) -> str:
+    """Прежний VideoParser.get_full_text — эталон для сравнения."""
+    clean_segments = [seg['text'].strip() for seg in segments if seg.get('text') and '<' not in seg['text']]
+    if not clean_segments:
+        for seg in segments:
+            clean_text = re.sub(r'<[^>]+>', '', seg.get('text') or '').strip()
+            if clean_text:
+                clean_segments.append(clean_text)
+    return ' '.join(clean_segments)
+
+
+def repeated_ngram_ratio(text: str, n: int = 6) -> float:
+    """Доля повторных n-грамм слов (0 — повторов нет)."""
+    words = text.split()
+    grams = [tuple(words[i:i + n]) for i in range(len(words) - n + 1)]
+    return 1 - len(set(grams)) / len(grams) if grams else 0.0
+
+
+def cmd_dedup(args) -> int:
+    from caption_dedup import merge_segments
+
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(WORKERS_DIR, '*_parsed.json'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            segments = ((json.load(f).get('transcript') or {}).get('segments')) or []
+        if segments:
+            fixtures.append((os.path.basename(path).replace('_parsed.json', ''), segments))
+    if not fixtures:
+        print('[ERR] Нет фикстур *_parsed.json с сегментами')
+        return 1
+
+    print(f"{'fixture':14} {'scale':>5} {'engine':7} {'segments':>9} {'ms':>9} {'seg/s':>10} {'chars':>9} {'rep6':>7}")
+    for name, segments in fixtures:
+        for scale in args.scale:
+            segs = segments * scale
+            for label, fn in (('legacy', legacy_full_text), ('merge', merge_segments)):
+                times = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    text = fn(segs)
+                    times.append(time.perf_counter() - started)
+                best = min(times)
+                rate = len(segs) / best if best else float('inf')
+                # Размноженный трек повторяет сам себя — доля повторов имеет смысл только для scale=1
+                rep = f"{repeated_ngram_ratio(text):.3f}" if scale == 1 else '-'
+                print(f"{name:14} {scale:>5} {label:7} {len(segs):>9} {best * 1000:>9.2f} {rate:>10.0f} "
+                      f"{len(text):>9} {rep:>7}")
+    return 0
+
+
+def synth_segments(hours: float) -> List[Dict[str, Any]]:
+    """Сегменты на hours часов из фикстуры _Fjcou9w1ko_parsed.json (со сдвигом времени)."""
+    with open(os.path.join(WORKERS_DIR, '_Fjcou9w1ko_parsed.json'), 'r', encoding='utf-8') as f:
+        base = json.load(f)['transcript']['segments']
+    span = base[-1]['start'] + 5.0
+    out: List[Dict[str, Any]] = []
+    offset = 0.0
+    while offset < hours * 3600:
+        out.extend({'start': round(offset + s['start'], 3), 'duration': s['duration'], 'text': s['text']} for s in base)
+        offset += span
+    return out
+
+
+def cmd_transcript_mem(args) -> int:
+    from compact_transcript import CompactTranscript
+
+    print(f"{'hours':>5} {'segments':>9} {'repr':8} {'retained MB':>12} {'peak MB':>9} {'build ms':>9} {'slice ms':>9}")
+    for hours in args.hours:
+        payload = json.dumps({'language': 'ru', 'type': 'generated', 'segments': synth_segments(hours),
+                              'source': 'yt_dlp'}, ensure_ascii=False)
+        n = None
+
+        for label in ('dicts', 'compact'):
+            tracemalloc.start()
+            base = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+            obj: Any = json.loads(payload)
+            if label == 'compact':
+                obj = CompactTranscript.from_dict(obj)
+            build_ms = (time.perf_counter() - started) * 1000
+            retained, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            n = len(obj['segments'])
+
+            # Выборка 10-минутного окна из середины
+            mid = hours * 1800
+            started = time.perf_counter()
+            if label == 'compact':
+                window = len(obj.slice_time(mid, mid + 600))
+            else:
+                window = len([s for s in obj['segments'] if s['start'] < mid + 600 and s['start'] + s['duration'] > mid
+                              or mid <= s['start'] < mid + 600])
+            slice_ms = (time.perf_counter() - started) * 1000
+            print(f"{hours:>5g} {n:>9} {label:8} {(retained - base) / 1024 / 1024:>12.1f} "
+                  f"{(peak - base) / 1024 / 1024:>9.1f} {build_ms:>9.1f} {slice_ms:>9.2f}  ({window} in window)")
+            del obj
+    return 0
+
+
+def _load_json(path: str) -> Any:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def cmd_parsed_format(args) -> int:
+    import parsed_store
+
+    cases = []
+    for path in sorted(glob.glob(os.path.join(WORKERS_DIR, '*_parsed.json'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if (data.get('transcript') or {}).get('segments'):
+            cases.append((os.path.basename(path).replace('_parsed.json', ''), data))
+    if args.hours and cases:
+        data = dict(cases[-1][1])
+        data['transcript'] = dict(data['transcript'], segments=synth_segments(args.hours))
+        cases.append((f"synthetic {args.hours:g}h", data))
+
+    def timed(fn) -> Tuple[Any, float]:
+        started = time.perf_counter()
+        result = fn()
+        return result, (time.perf_counter() - started) * 1000
+
+    print(f"{'case':18} {'format':6} {'size KB':>9} {'write ms':>9} {'read ms':>9} {'header ms':>10}")
+    with tempfile.TemporaryDirectory(prefix='parsed_bench_') as tmp:
+        for name, data in cases:
+            for fmt in parsed_store.FORMATS:
+                path, write_ms = timed(lambda: parsed_store.save_parsed(data, 'bench', tmp, fmt))
+                if fmt == 'json':
+                    # Как aiVideoService: прочитать и разобрать весь файл
+                    _, read_ms = timed(lambda: _load_json(path))
+                else:
+                    _, read_ms = timed(lambda: parsed_store.read_ytc(path))
+                _, header_ms = timed(lambda: parsed_store.read_header(path))
+                print(f"{name:18} {fmt:6} {os.path.getsize(path) / 1024:>9.1f} {write_ms:>9.1f} "
+                      f"{read_ms:>9.1f} {header_ms:>10.2f}")
+    return 0
+
+
+def _multipart_file(body: bytes, content_type: str) -> Tuple[Optional[str], bytes]:
+    """(имя файла, содержимое) поля file из multipart/form-data."""
+    m = re.search(r'boundary="?([^";]+)"?', content_type or '')
+    if not m:
+        return None, b''
+    for part in body.split(b'--' + m.group(1).encode()):
+        head, _, data = part.partition(b'\r\n\r\n')
+        if b'name="file"' in head:
+            name = re.search(rb'filename="([^"]*)"', head)
+            return (name.group(1).decode() if name else None), data.rsplit(b'\r\n', 1)[0]
+    return None, b''
+
+
+def start_asr_stub(latency_per_mb: float, segment_seconds: float = 5.0):
+    """
+    Локальная заглушка POST /v1/audio/transcriptions (verbose_json)
+
+    Отвечает сегментом на каждые segment_seconds аудио ("t=<секунда от начала куска>"),
+    задержка — latency_per_mb секунд на мегабайт загрузки.
+
+    Returns:
+        (server, base_url, stats) — stats['requests'], stats['max_inflight']
+    """
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from asr_openai import find_ffmpeg, probe_audio
+
+    ffmpeg = find_ffmpeg()
+    stats = {'requests': 0, 'inflight': 0, 'max_inflight': 0, 'bytes': 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            filename, data = _multipart_file(body, self.headers.get('Content-Type', ''))
+            with lock:
+                stats['requests'] += 1
+                stats['bytes'] += len(data)
+                stats['inflight'] += 1
+                stats['max_inflight'] = max(stats['max_inflight'], stats['inflight'])
+            try:
+                with tempfile.NamedTemporaryFile(suffix=os.path.splitext(filename or 'a.mp3')[1]) as tmp:
+                    tmp.write(data)
+                    tmp.flush()
+                    duration = (probe_audio(tmp.name, ffmpeg)[0] if ffmpeg else None) or 0.0
+                time.sleep(latency_per_mb * len(data) / 1024 / 1024)
+                segments = []
+                t = 0.0
+                while t < duration:
+                    end = min(t + segment_seconds, duration)
+                    segments.append({'id': len(segments), 'start': t, 'end': end, 'text': f't={t:.0f}'})
+                    t = end
+                payload = json.dumps({'task': 'transcribe', 'language': 'english', 'duration': duration,
+                                      'text': ' '.join(s['text'] for s in segments), 'segments': segments}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            finally:
+                with lock:
+                    stats['inflight'] -= 1
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/v1', stats
+
+
+def cmd_asr_upload(args) -> int:
+    from asr_openai import find_ffmpeg, openai_chunk_transcriber, transcribe_file
+
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        print('[ERR] Нужен ffmpeg (или FFMPEG_PATH)')
+        return 1
+    with tempfile.TemporaryDirectory(prefix='asr_bench_') as tmp:
+        audio = args.audio
+        if not audio:
+            audio = os.path.join(tmp, 'synthetic.m4a')
+            subprocess.run([ffmpeg, '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i',
+                            f'sine=frequency=440:duration={args.minutes * 60}', '-c:a', 'aac', '-b:a', '128k', audio],
+                           check=True)
+        server, base_url, stats = start_asr_stub(args.latency_per_mb)
+        os.environ['ASR_API_BASE'] = base_url
+        try:
+            print(f"[INFO] Аудио: {os.path.getsize(audio) / 1024 / 1024:.1f} MB, лимит куска {args.chunk_mb} MB")
+            print(f"{'parallel':>8} {'chunks':>7} {'wall s':>8} {'segments':>9} {'covered s':>10} {'inflight':>9}")
+            for parallelism in args.parallelism:
+                stats.update(requests=0, max_inflight=0, bytes=0)
+                started = time.perf_counter()
+                result = transcribe_file(audio, openai_chunk_transcriber('stub-key'), ext=os.path.splitext(audio)[1][1:],
+                                         parallelism=parallelism, max_bytes=int(args.chunk_mb * 1024 * 1024))
+                wall = time.perf_counter() - started
+                if not result:
+                    print(f"{parallelism:>8} ERROR")
+                    continue
+                segs = result['segments']
+                covered = segs[-1]['start'] + segs[-1]['duration'] if segs else 0.0
+                ordered = all(a['start'] <= b['start'] for a, b in zip(segs, segs[1:]))
+                print(f"{parallelism:>8} {result['asr']['chunks']:>7} {wall:>8.2f} {len(segs):>9} {covered:>10.1f} "
+                      f"{stats['max_inflight']:>9}{'' if ordered else '  (unordered!)'}")
+        finally:
+            server.shutdown()
+    return 0
+
+
+# Синтетическая запись для whisper-pool: каждые полсекунды — постоянная амплитуда,
+# равная номеру «слова», так что заглушка восстанавливает абсолютное время по сигналу
+_FAKE_WORD_SECONDS = 0.5
+
+
+def synth_word_wav(path: str, minutes: float) -> int:
+    """WAV 16 кГц моно с закодированными номерами слов; возвращает число слов."""
+    import wave
+    from array import array
+
+    rate = 16000
+    per_word = int(rate * _FAKE_WORD_SECONDS)
+    words = int(minutes * 60 / _FAKE_WORD_SECONDS)
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        for h in range(words):
+            w.writeframes(array('h', [h % 32768]) * per_word)
+    return words
+
+
+class FakeWhisper:
+    """Заглушка модели Whisper: тратит CPU пропорционально длине аудио и «слышит» закодированные слова."""
+
+    def __init__(self, cost_per_minute: float):
+        self.cost_per_minute = cost_per_minute
+
+    def transcribe(self, audio, **options):
+        import numpy as np
+
+        seconds = len(audio) / 16000
+        deadline = time.process_time() + self.cost_per_minute * seconds / 60
+        while time.process_time() < deadline:
+            pass
+        values = np.rint(audio * 32768).astype(np.int32)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(values)) + 1)) if len(values) else np.array([], int)
+        bounds = list(starts) + [len(values)]
+        words = []
+        for a, b in zip(bounds, bounds[1:]):
+            start = a / 16000
+            words.append({'start': start, 'end': min(start + 0.4, b / 16000), 'word': f' w{values[a]}'})
+        segments = []
+        for i in range(0, len(words), 10):
+            chunk = words[i:i + 10]
+            segments.append({'start': chunk[0]['start'], 'end': chunk[-1]['end'],
+                             'text': ''.join(w['word'] for w in chunk), 'words': chunk})
+        return {'segments': segments, 'language': options.get('language') or 'en', 'text': ''}
+
+
+def fake_whisper_loader(name: str) -> FakeWhisper:
+    # name = 'fake:<секунд CPU на минуту аудио>'
+    return FakeWhisper(float(name.split(':', 1)[1]))
+
+
+def cmd_whisper_pool(args) -> int:
+    from asr_openai import find_ffmpeg
+    from whisper_pool import default_threads, shutdown_pools, transcribe_parallel
+
+    if not find_ffmpeg():
+        print('[ERR] Нужен ffmpeg (или FFMPEG_PATH)')
+        return 1
+    fake = args.model == 'fake'
+    if not fake and not args.audio:
+        print('[ERR] Для настоящей модели нужен --audio')
+        return 1
+    with tempfile.TemporaryDirectory(prefix='whisper_pool_bench_') as tmp:
+        audio, expected = args.audio, None
+        if fake:
+            audio = os.path.join(tmp, 'words.wav')
+            expected = synth_word_wav(audio, args.minutes)
+        model = f'fake:{args.cost}' if fake else args.model
+        loader = fake_whisper_loader if fake else None
+        print(f"[INFO] Модель {args.model}, CPU: {os.cpu_count()}, окно {args.window_seconds} с, "
+              f"перекрытие {args.overlap} с")
+        print(f"{'workers':>7} {'threads':>7} {'windows':>7} {'cold s':>8} {'warm s':>8} {'RTF':>7} "
+              f"{'speedup':>7} {'words':>7} {'dup':>5} {'missing':>7}")
+        base = None
+        for workers in args.workers:
+            threads = args.threads or default_threads(workers)
+            walls = []
+            result = None
+            for _ in range(2):
+                started = time.perf_counter()
+                result = transcribe_parallel(audio, model, language='en', workers=workers, threads=threads,
+                                             window_seconds=args.window_seconds, overlap=args.overlap, loader=loader)
+                walls.append(time.perf_counter() - started)
+            shutdown_pools()
+            if not result:
+                print(f"{workers:>7} ERROR")
+                continue
+            base = base or walls[1]
+            words = ' '.join(seg['text'] for seg in result['segments']).split()
+            dup = missing = '-'
+            if expected is not None:
+                got = [int(w[1:]) for w in words]
+                dup = len(got) - len(set(got))
+                missing = expected - len(set(got))
+            pool = result['pool']
+            print(f"{workers:>7} {threads:>7} {pool['windows']:>7} {walls[0]:>8.2f} {walls[1]:>8.2f} "
+                  f"{walls[1] / pool['audio_seconds']:>7.4f} {base / walls[1]:>6.2f}x {len(words):>7} "
+                  f"{dup:>5} {missing:>7}")
+    return 0
+
+
+def start_range_stub(blob: bytes, per_conn_bytes_s: float, fail_rate: float = 0.0, seed: int = 1):
+    """
+    Локальный HTTP-сервер с поддержкой Range и ограничением скорости на соединение
+
+    Отдаёт blob по /audio; с вероятностью fail_rate обрывает ответ посередине.
+
+    Returns:
+        (server, url, stats) — stats['requests'], stats['dropped']
+    """
+    import random
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    rng = random.Random(seed)
+    stats = {'requests': 0, 'dropped': 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _headers(self, status: int, first: int, last: int):
+            self.send_response(status)
+            self.send_header('Content-Type', 'audio/mp4')
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Content-Length', str(last - first + 1))
+            if status == 206:
+                self.send_header('Content-Range', f'bytes {first}-{last}/{len(blob)}')
+            self.end_headers()
+
+        def _range(self):
+            m = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range') or '')
+            if not m:
+                return 200, 0, len(blob) - 1
+            first = int(m.group(1))
+            last = min(int(m.group(2)) if m.group(2) else len(blob) - 1, len(blob) - 1)
+            return 206, first, last
+
+        def do_HEAD(self):
+            status, first, last = self._range()
+            self._headers(status, first, last)
+
+        def do_GET(self):
+            status, first, last = self._range()
+            with lock:
+                stats['requests'] += 1
+                drop_at = first + rng.randint(0, last - first) if rng.random() < fail_rate else None
+            self._headers(status, first, last)
+            pos = first
+            step = 64 * 1024
+            started = time.perf_counter()
+            while pos <= last:
+                end = min(pos + step, last + 1)
+                if drop_at is not None and end > drop_at:
+                    with lock:
+                        stats['dropped'] += 1
+                    self.close_connection = True
+                    self.wfile.write(blob[pos:drop_at])
+                    return
+                self.wfile.write(blob[pos:end])
+                pos = end
+                # Ограничение скорости соединения
+                ahead = (pos - first) / per_conn_bytes_s - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/audio', stats
+
+
+def cmd_range_fetch(args) -> int:
+    import hashlib
+    from range_fetch import download_to_file, fetch_spooled
+
+    blob = os.urandom(int(args.mb * 1024 * 1024))
+    digest = hashlib.sha256(blob).hexdigest()
+    server, url, stats = start_range_stub(blob, args.per_conn_mbps * 1024 * 1024, args.fail_rate)
+    try:
+        print(f"[INFO] {args.mb:.0f} MB, {args.per_conn_mbps} MB/s на соединение, обрывы {args.fail_rate:.0%}")
+        print(f"{'conns':>5} {'mode':>7} {'ranges':>6} {'wall s':>7} {'MB/s':>7} {'retries':>7} {'dropped':>7} {'sha256':>6}")
+        with tempfile.TemporaryDirectory(prefix='range_bench_') as tmp:
+            for connections in args.connections:
+                stats.update(requests=0, dropped=0)
+                path = os.path.join(tmp, f'audio_{connections}.bin')
+                try:
+                    result = download_to_file(url, path, connections=connections,
+                                              range_bytes=int(args.range_mb * 1024 * 1024), retries=args.retries)
+                except Exception as e:
+                    print(f"{connections:>5} ERROR {e}")
+                    continue
+                with open(path, 'rb') as f:
+                    ok = hashlib.sha256(f.read()).hexdigest() == digest
+                os.unlink(path)
+                print(f"{connections:>5} {result['mode']:>7} {result['ranges']:>6} {result['elapsed_ms'] / 1000:>7.2f} "
+                      f"{result['mb_per_s']:>7.2f} {result['retries']:>7} {stats['dropped']:>7} {'ok' if ok else 'BAD':>6}")
+        # Тот же путь в SpooledTemporaryFile
+        f, result = fetch_spooled(url, connections=max(args.connections), range_bytes=int(args.range_mb * 1024 * 1024),
+                                  retries=args.retries)
+        with f:
+            ok = hashlib.sha256(f.read()).hexdigest() == digest
+            rolled = getattr(f, '_rolled', None)
+        print(f"[INFO] spooled: {result['mb_per_s']} MB/s, sha256 {'ok' if ok else 'BAD'}, на диске: {rolled}")
+    finally:
+        server.shutdown()
+    return 0
+
+
+def _peak_rss_kb() -> Optional[int]:
+    """Пиковый RSS процесса в КБ (VmHWM, ru_maxrss или peak_wset в Windows)."""
+    try:
+        with open('/proc/self/status', 'r', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return int(peak // 1024) if sys.platform == 'darwin' else int(peak)
+    except Exception:
+        pass
+    try:
+        import psutil  # type: ignore
+        return int(psutil.Process().memory_info().peak_wset // 1024)
+    except Exception:
+        return None
+
+
+def _asr_backend_child(args) -> int:
+    """Один движок в отдельном процессе: холодный и тёплый прогон, пиковый RSS."""
+    from asr_backends import get_backend
+    from asr_openai import find_ffmpeg, probe_audio
+
+    out: Dict[str, Any] = {'asr_backend': args.child}
+    engine = get_backend(args.child)
+    reason = engine.unavailable_reason() if engine else 'unknown backend'
+    if engine is None or reason:
+        out['skipped'] = reason
+        print(json.dumps(out, ensure_ascii=False))
+        return 0
+    model = engine.resolve_model(args.model if args.model and engine.name != 'openai' else None)
+    duration = probe_audio(args.audio, find_ffmpeg())[0] or 0.0
+    ext = os.path.splitext(args.audio)[1][1:] or 'mp3'
+    out.update(model=model, audio_seconds=round(duration, 1), rss_start_kb=_peak_rss_kb())
+    walls, result = [], None
+    try:
+        for _ in range(2):
+            started = time.perf_counter()
+            result = engine.transcribe(args.audio, model, args.language, duration=duration, ext=ext)
+            walls.append(time.perf_counter() - started)
+    except Exception as e:
+        out['error'] = str(e).splitlines()[0] if str(e) else type(e).__name__
+    if not result:
+        out.setdefault('error', 'no result')
+    else:
+        out.update(cold_s=round(walls[0], 3), warm_s=round(walls[1], 3),
+                   rtf=round(walls[1] / duration, 4) if duration else None,
+                   load_ms=(result.get('timing') or {}).get('model_load_ms'),
+                   segments=len(result['segments']),
+                   words=sum(len(s['text'].split()) for s in result['segments']))
+    out['peak_rss_kb'] = _peak_rss_kb()
+    print(json.dumps(out, ensure_ascii=False))
+    return 0
+
+
+def cmd_asr_backends(args) -> int:
+    from asr_backends import backend_names
+    from asr_openai import find_ffmpeg
+
+    if args.child:
+        return _asr_backend_child(args)
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        print('[ERR] Нужен ffmpeg (или FFMPEG_PATH)')
+        return 1
+    with tempfile.TemporaryDirectory(prefix='asr_backends_bench_') as tmp:
+        audio = args.audio
+        if not audio:
+            audio = os.path.join(tmp, 'fixture.wav')
+            subprocess.run([ffmpeg, '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i',
+                            f'sine=frequency=220:duration={args.minutes * 60}', '-ar', '16000', '-ac', '1', audio],
+                           check=True)
+        env = dict(os.environ)
+        server = None
+        if not env.get('OPENAI_API_KEY'):
+            # Без ключа OpenAI API меряется против локальной заглушки (время сети и модели — условные)
+            server, base_url, _ = start_asr_stub(args.latency_per_mb)
+            env.update(OPENAI_API_KEY='stub-key', ASR_API_BASE=base_url)
+        try:
+            print(f"[INFO] Аудио: {audio} ({os.path.getsize(audio) / 1024 / 1024:.1f} MB), CPU: {os.cpu_count()}")
+            print(f"{'backend':<15} {'model':<12} {'cold s':>8} {'warm s':>8} {'RTF':>7} {'load ms':>8} "
+                  f"{'peak RSS MB':>11} {'segments':>8}")
+            for name in args.backends or backend_names():
+                cmd = [sys.executable, os.path.abspath(__file__), 'asr-backends', '--child', name, '--audio', audio]
+                if args.model:
+                    cmd += ['--model', args.model]
+                if args.language:
+                    cmd += ['--language', args.language]
+                proc = subprocess.run(cmd, env=env, cwd=WORKERS_DIR, capture_output=True, text=True)
+                row: Dict[str, Any] = {}
+                for line in reversed(proc.stdout.splitlines()):
+                    if line.startswith('{"asr_backend"'):
+                        row = json.loads(line)
+                        break
+                label = name + (' (stub)' if name == 'openai' and server else '')
+                if not row:
+                    tail = (proc.stderr or proc.stdout).strip().splitlines()[-1:] or ['']
+                    print(f"{label:<15} ERROR (exit {proc.returncode}): {tail[0]}")
+                elif row.get('skipped'):
+                    print(f"{label:<15} {'-':<12} пропущен: {row['skipped']}")
+                elif row.get('error'):
+                    print(f"{label:<15} {row.get('model', '-'):<12} ошибка: {row['error']}")
+                else:
+                    peak = row['peak_rss_kb'] / 1024 if row.get('peak_rss_kb') else float('nan')
+                    load = row['load_ms'] if row.get('load_ms') is not None else '-'
+                    print(f"{label:<15} {row['model']:<12} {row['cold_s']:>8.2f} {row['warm_s']:>8.2f} "
+                          f"{row['rtf']:>7.4f} {load:>8} {peak:>11.0f} {row['segments']:>8}")
+        finally:
+            if server:
+                server.shutdown()
+    return 0
+
+def _decode_ms(ffmpeg: str, path: str, repeat: int = 3) -> float:
+    """Лучшее время декодирования файла в PCM 16 кГц моно (то, что делает движок перед моделью)."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([ffmpeg, '-hide_banner', '-loglevel', 'error', '-nostdin', '-i', path, '-vn',
+                        '-f', 's16le', '-ac', '1', '-ar', '16000', '-y', os.devnull], check=True)
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return best
+
+
+def cmd_normalize(args) -> int:
+    from asr_openai import find_ffmpeg, openai_chunk_transcriber, probe_audio, transcribe_file
+    from audio_normalize import normalize_url, upload_ext
+    from range_fetch import download_to_file
+
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        print('[ERR] Нужен ffmpeg (или FFMPEG_PATH)')
+        return 1
+    with tempfile.TemporaryDirectory(prefix='normalize_bench_') as tmp:
+        audio = args.audio
+        if not audio:
+            # Как bestaudio с YouTube: AAC 160 кбит/с стерео во фрагментированном MP4 (DASH)
+            audio = os.path.join(tmp, 'source.m4a')
+            subprocess.run([ffmpeg, '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i',
+                            f'sine=frequency=220:duration={args.minutes * 60}', '-ac', '2', '-ar', '44100',
+                            '-c:a', 'aac', '-b:a', '160k', '-movflags', '+frag_keyframe+empty_moov+default_base_moof',
+                            audio], check=True)
+        with open(audio, 'rb') as f:
+            blob = f.read()
+        duration = probe_audio(audio, ffmpeg)[0]
+        server, url, _ = start_range_stub(blob, args.per_conn_mbps * 1024 * 1024, args.fail_rate)
+        asr_server, base_url, asr_stats = start_asr_stub(args.latency_per_mb)
+        os.environ['ASR_API_BASE'] = base_url
+        fetch = {'connections': args.connections, 'range_bytes': int(args.range_mb * 1024 * 1024)}
+        try:
+            print(f"[INFO] {os.path.basename(audio)}: {len(blob) / 1024 / 1024:.1f} MB, {duration:.0f} с, "
+                  f"{args.per_conn_mbps} MB/s на соединение x {args.connections}, API {args.latency_per_mb} с/MB")
+            print(f"{'variant':<18} {'MB':>7} {'fetch s':>8} {'decode ms':>10} {'upload s':>9} {'audio s':>8}")
+            rows = []
+            raw = os.path.join(tmp, 'raw' + os.path.splitext(audio)[1])
+            started = time.perf_counter()
+            download_to_file(url, raw, **fetch)
+            rows.append(('raw (было)', raw, time.perf_counter() - started))
+            for ext in (upload_ext(), 'wav'):
+                dst = os.path.join(tmp, f'norm.{ext}')
+                started = time.perf_counter()
+                normalize_url(url, dst, ext=ext, duration=duration, **fetch)
+                rows.append((f"{ext} ({'API' if ext != 'wav' else 'локально'})", dst, time.perf_counter() - started))
+            for label, path, fetch_s in rows:
+                upload = '-'
+                if not path.endswith('.wav'):
+                    # Загрузка в API: заглушка отвечает за latency_per_mb на каждый мегабайт
+                    asr_stats.update(bytes=0)
+                    started = time.perf_counter()
+                    transcribe_file(path, openai_chunk_transcriber('stub-key'), ext=os.path.splitext(path)[1][1:],
+                                    duration=duration)
+                    upload = f"{time.perf_counter() - started:.2f}"
+                got = probe_audio(path, ffmpeg)[0] or 0.0
+                print(f"{label:<18} {os.path.getsize(path) / 1024 / 1024:>7.2f} {fetch_s:>8.2f} "
+                      f"{_decode_ms(ffmpeg, path):>10.0f} {upload:>9} {got:>8.1f}")
+        finally:
+            server.shutdown()
+            asr_server.shutdown()
+    return 0
+
+# Сценарии av-hedge: client -> (задержка, сек; исход: ok | error | no_av)
+AV_HEDGE_SCENARIOS = {
+    'healthy': {'default': (1.0, 'ok'), 'web': (1.2, 'ok'), 'android': (0.8, 'ok'),
+                'android,web': (1.5, 'ok'), 'ios': (1.2, 'ok'), 'tv': (0.9, 'ok')},
+    'default-broken': {'default': (4.0, 'error'), 'web': (3.0, 'error'), 'android': (0.8, 'ok'),
+                       'android,web': (1.5, 'ok'), 'ios': (1.2, 'ok'), 'tv': (0.9, 'ok')},
+    'default-hangs': {'default': (12.0, 'error'), 'web': (0.6, 'no_av'), 'android': (1.0, 'ok'),
+                      'android,web': (1.5, 'ok'), 'ios': (1.2, 'ok'), 'tv': (0.9, 'ok')},
+    'only-tv': {'default': (2.0, 'error'), 'web': (2.0, 'error'), 'android': (1.5, 'error'),
+                'android,web': (2.5, 'error'), 'ios': (1.0, 'error'), 'tv': (1.0, 'ok')},
+}
+
+
+def stub_extractor(scenario: Dict[str, Tuple[float, str]], scale: float, rng: 'random.Random'):
+    """Замена VideoDownloader._extract_info: задержка и исход по player_client из сценария."""
+    from ytdlp_cache import client_key
+
+    formats_av = [{'url': 'http://stub/v', 'vcodec': 'avc1.64001F', 'acodec': 'none', 'ext': 'mp4', 'height': 720},
+                  {'url': 'http://stub/a', 'vcodec': 'none', 'acodec': 'mp4a.40.2', 'ext': 'm4a', 'abr': 128}]
+    formats_muxed = [{'url': 'http://stub/m', 'vcodec': 'avc1', 'acodec': 'mp4a', 'ext': 'mp4', 'height': 360}]
+
+    def extract(video_id, ydl_opts, clients=None, need_streams=True):
+        latency, outcome = scenario.get(client_key(clients), (1.0, 'error'))
+        time.sleep(latency * scale * rng.uniform(0.8, 1.2))
+        if outcome == 'error':
+            raise RuntimeError(f'stub: {client_key(clients)} failed')
+        return {'id': video_id, 'title': 'stub', 'formats': formats_av if outcome == 'ok' else formats_muxed}
+
+    return extract
+
+
+def cmd_av_hedge(args) -> int:
+    import random
+    from video_downloader import VideoDownloader
+
+    # Фиксированный порядок клиентов: статистика прошлых запусков не должна влиять на сравнение
+    os.environ['PLAYER_CLIENT_LEARN'] = '0'
+    modes = [('sequential', 0.0, 1), (f'hedge {args.delay:g}s', args.delay, args.max_parallel),
+             ('all at once', 0.0, 6)]
+    with tempfile.TemporaryDirectory(prefix='av_hedge_') as tmp:
+        downloader = VideoDownloader(download_dir=tmp)
+        print(f"[INFO] задержки x{args.scale:g}, {args.repeat} повторов; время — до ответа get_best_av_urls")
+        print(f"{'scenario':<15} {'mode':<12} {'p50 s':>6} {'max s':>6} {'launched':>8}  winner")
+        for name in args.scenarios:
+            for mode, delay, max_parallel in modes:
+                os.environ['AV_HEDGE_DELAY'] = str(delay * args.scale)
+                os.environ['AV_HEDGE_MAX'] = str(max_parallel)
+                rng = random.Random(7)
+                downloader._extract_info = stub_extractor(AV_HEDGE_SCENARIOS[name], args.scale, rng)  # type: ignore[method-assign]
+                walls, launched, winners = [], [], set()
+                for i in range(args.repeat):
+                    started = time.perf_counter()
+                    result = downloader.get_best_av_urls(f'vid{i}')
+                    walls.append(time.perf_counter() - started)
+                    report = result.get('extract') or {}
+                    launched.append(report.get('launched', 0))
+                    winners.add(report.get('winner') if result.get('success') else 'FAILED')
+                print(f"{name:<15} {mode:<12} {statistics.median(walls):>6.2f} {max(walls):>6.2f} "
+                      f"{statistics.mean(launched):>8.1f}  {','.join(sorted(map(str, winners)))}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='python-workers benchmarks')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('startup', help='Wall time and RSS to reach each CLI mode entry point')
+    p.add_argument('--repeat', type=int, default=5)
+    p.add_argument('--python', default=sys.executable, help='Interpreter to benchmark')
+    p.add_argument('--budget-ms', type=float, default=float(os.environ.get('WORKER_STARTUP_BUDGET_MS', 0) or 0),
+                   help='Fail if any mode median exceeds this (0 = off)')
+    p.add_argument('--save', help='Save results JSON (baseline)')
+    p.add_argument('--compare', help='Baseline JSON to compare against')
+    p.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown vs baseline (0.2 = 20%%)')
+    p.set_defaults(func=cmd_startup)
+
+    p = sub.add_parser('vtt', help='Legacy vs streaming WebVTT parser: time and peak memory')
+    p.add_argument('--file', help='VTT file to parse (default: synthesized from fixtures)')
+    p.add_argument('--hours', type=float, default=10.0, help='Length of synthesized VTT')
+    p.add_argument('--crlf', action='store_true', help='Use CRLF line endings in synthesized VTT')
+    p.add_argument('--chunk-kb', type=int, default=64, help='Chunk size fed to the streaming parser')
+    p.set_defaults(func=cmd_vtt)
+
+    p = sub.add_parser('dedup', help='Legacy vs overlap-merging full_text on *_parsed.json fixtures')
+    p.add_argument('--scale', type=int, nargs='+', default=[1, 10], help='Repeat each track N times')
+    p.add_argument('--repeat', type=int, default=5, help='Runs per measurement (best is reported)')
+    p.set_defaults(func=cmd_dedup)
+
+    p = sub.add_parser('transcript-mem', help='Memory of dict-list vs CompactTranscript transcripts')
+    p.add_argument('--hours', type=float, nargs='+', default=[3, 10], help='Transcript lengths to test')
+    p.set_defaults(func=cmd_transcript_mem)
+
+    p = sub.add_parser('parsed-format', help='Parsed result file: indented JSON vs compact ytc')
+    p.add_argument('--hours', type=float, default=10.0, help='Also test a synthetic transcript this long (0 = off)')
+    p.set_defaults(func=cmd_parsed_format)
+
+    p = sub.add_parser('asr-upload', help='Chunked OpenAI Whisper upload against a local stand-in server')
+    p.add_argument('--audio', help='Audio file (default: synthetic tone)')
+    p.add_argument('--minutes', type=float, default=60.0, help='Length of synthetic audio')
+    p.add_argument('--chunk-mb', type=float, default=24.0, help='Chunk size limit (MB)')
+    p.add_argument('--latency-per-mb', type=float, default=0.2, help='Simulated server time per uploaded MB (s)')
+    p.add_argument('--parallelism', type=int, nargs='+', default=[1, 2, 4])
+    p.set_defaults(func=cmd_asr_upload)
+
+    p = sub.add_parser('whisper-pool', help='Local Whisper over audio windows: wall time vs worker count')
+    p.add_argument('--model', default='fake', help="Whisper model, or 'fake' (CPU-burning stand-in, no torch)")
+    p.add_argument('--audio', help='Audio file (required for a real model; fake uses synthetic speech)')
+    p.add_argument('--minutes', type=float, default=20.0, help='Length of synthetic audio')
+    p.add_argument('--cost', type=float, default=1.0, help='Fake model CPU seconds per audio minute')
+    p.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    p.add_argument('--threads', type=int, default=0, help='Threads per worker (0 = cores / workers)')
+    p.add_argument('--window-seconds', type=float, default=300.0)
+    p.add_argument('--overlap', type=float, default=4.0)
+    p.set_defaults(func=cmd_whisper_pool)
+
+    p = sub.add_parser('range-fetch', help='Parallel HTTP range download vs single stream against a throttled local server')
+    p.add_argument('--mb', type=float, default=64.0, help='Size of the served file')
+    p.add_argument('--per-conn-mbps', type=float, default=2.0, help='Per-connection throttle (MB/s)')
+    p.add_argument('--connections', type=int, nargs='+', default=[1, 2, 4, 8])
+    p.add_argument('--range-mb', type=float, default=4.0)
+    p.add_argument('--retries', type=int, default=3)
+    p.add_argument('--fail-rate', type=float, default=0.05, help='Probability a response is cut mid-way')
+    p.set_defaults(func=cmd_range_fetch)
+
+    p = sub.add_parser('asr-backends', help='Each ASR backend on the same audio: RTF and peak RSS')
+    p.add_argument('--audio', help='Audio file (default: synthetic tone)')
+    p.add_argument('--minutes', type=float, default=2.0, help='Length of synthetic audio')
+    p.add_argument('--backends', nargs='+', help='Backends to run (default: all registered)')
+    p.add_argument('--model', help='Model for local backends (default: backend default)')
+    p.add_argument('--language', help='Audio language (default: auto-detect)')
+    p.add_argument('--latency-per-mb', type=float, default=0.2, help='Stand-in API time per uploaded MB (s)')
+    p.add_argument('--child', help=argparse.SUPPRESS)
+    p.set_defaults(func=cmd_asr_backends)
+
+    p = sub.add_parser('normalize', help='Raw bestaudio vs streamed 16 kHz mono: bytes, fetch, decode and upload time')
+    p.add_argument('--audio', help='Source audio (default: synthetic 160k AAC in fragmented MP4)')
+    p.add_argument('--minutes', type=float, default=30.0, help='Length of synthetic audio')
+    p.add_argument('--per-conn-mbps', type=float, default=2.0, help='Per-connection throttle (MB/s)')
+    p.add_argument('--connections', type=int, default=4)
+    p.add_argument('--range-mb', type=float, default=4.0)
+    p.add_argument('--fail-rate', type=float, default=0.0, help='Probability a response is cut mid-way')
+    p.add_argument('--latency-per-mb', type=float, default=0.5, help='Stand-in API time per uploaded MB (s)')
+    p.set_defaults(func=cmd_normalize)
+
+    p = sub.add_parser('av-hedge', help='get_best_av_urls: sequential vs hedged player_client extraction against a stub')
+    p.add_argument('--scenarios', nargs='+', choices=sorted(AV_HEDGE_SCENARIOS), default=list(AV_HEDGE_SCENARIOS))
+    p.add_argument('--scale', type=float, default=0.25, help='Multiply scenario latencies (1 = seconds as listed)')
+    p.add_argument('--repeat', type=int, default=5)
+    p.add_argument('--delay', type=float, default=2.0, help='Hedge delay before the next client (unscaled seconds)')
+    p.add_argument('--max-parallel', type=int, default=3)
+    p.set_defaults(func=cmd_av_hedge)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == '__main__':
+    main()
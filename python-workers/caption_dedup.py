@@ -0,0 +1,132 @@
+"""
+Склейка «бегущих» автосубтитров YouTube в сплошной текст
+
+В автосубтитрах каждая кью повторяет хвост предыдущей: сначала
+"строка1 строка2<00:00:01.2><c> слово</c>...", затем чистая "строка2",
+затем "строка2 строка3<...>" и т.д. CaptionMerger снимает инлайн-теги и для
+каждой новой кью отбрасывает самый длинный префикс, совпадающий с концом
+уже собранного текста (сравнение по словам без учёта регистра).
+
+Перекрытие ищется префикс-функцией (КМП) по словам кью и хвосту текста той
+же длины, поэтому кью обрабатывается за O(её длины), весь трек — за линейное
+время. Перекрытия снимаются только у бегущих треков (с инлайн-таймкодами):
+в ручных субтитрах, сегментах youtube_transcript_api и выводе Whisper
+повторов на стыках нет, и повтор фразы через границу кью там настоящий
+(припев, «no no no») — такие треки склеиваются как есть.
+"""
+
+import re
+import html
+from typing import Any, Iterable, List, Optional
+
+# <00:00:01.234>, <c>, </c>, <c.colorE5E5E5>, <i>, <b> ...
+_TAG_RE = re.compile(r'<[^>]*>')
+# Признак «бегущих» субтитров — инлайн-таймкоды слов
+_INLINE_TS_RE = re.compile(r'<\d{1,2}:\d{2}(?::\d{2})?[.,]\d{3}>')
+
+ROLLING_MIN_OVERLAP = 1
+
+
+def clean_caption_text(text: str) -> List[str]:
+    """Текст кью -> список слов без тегов и HTML-сущностей."""
+    if '<' in text:
+        text = _TAG_RE.sub('', text)
+    if '&' in text:
+        text = html.unescape(text)
+    return text.split()
+
+
+def is_rolling(texts: Iterable[str]) -> bool:
+    """Есть ли в текстах кью инлайн-таймкоды (признак бегущих автосубтитров YouTube)."""
+    return any(_INLINE_TS_RE.search(text or '') for text in texts)
+
+
+def _prefix_function(words: List[str]) -> List[int]:
+    pi = [0] * len(words)
+    k = 0
+    for i in range(1, len(words)):
+        while k and words[i] != words[k]:
+            k = pi[k - 1]
+        if words[i] == words[k]:
+            k += 1
+        pi[i] = k
+    return pi
+
+
+def longest_overlap(tail: List[str], words: List[str]) -> int:
+    """Длина самого длинного префикса words, который является суффиксом tail (O(len(tail) + len(words)))."""
+    if not tail or not words:
+        return 0
+    pi = _prefix_function(words)
+    k = 0
+    for w in tail:
+        while k and (k == len(words) or w != words[k]):
+            k = pi[k - 1]
+        if w == words[k]:
+            k += 1
+    return k
+
+
+class CaptionMerger:
+    """Потоковая склейка кью с удалением перекрытий."""
+
+    def __init__(self, min_overlap: int = ROLLING_MIN_OVERLAP):
+        """
+        Args:
+            min_overlap: Минимальное перекрытие (в словах), которое считается повтором
+        """
+        self.min_overlap = max(1, min_overlap)
+        self.words: List[str] = []
+        # Те же слова в casefold — ключи для сравнения
+        self._keys: List[str] = []
+        self.cues = 0
+        self.dropped_words = 0
+
+    def feed(self, text: str) -> None:
+        """Добавить текст очередной кью."""
+        words = clean_caption_text(text or '')
+        if not words:
+            return
+        self.cues += 1
+        keys = [w.casefold() for w in words]
+        k = longest_overlap(self._keys[-len(keys):], keys)
+        if k < self.min_overlap:
+            k = 0
+        self.dropped_words += k
+        self.words.extend(words[k:])
+        self._keys.extend(keys[k:])
+
+    def text(self) -> str:
+        return ' '.join(self.words)
+
+
+def merge_texts(texts: Iterable[str], min_overlap: Optional[int] = None) -> str:
+    """
+    Склеить тексты кью в сплошной текст без повторов
+
+    Args:
+        texts: Тексты сегментов по порядку
+        min_overlap: Минимальное перекрытие в словах; None — по типу трека
+                     (1 для бегущих автосубтитров, остальные склеиваются без удаления)
+
+    Returns:
+        str: Полный текст
+    """
+    texts = texts if isinstance(texts, list) else list(texts)
+    if min_overlap is None:
+        if not is_rolling(texts):
+            return ' '.join(word for text in texts for word in clean_caption_text(text or ''))
+        min_overlap = ROLLING_MIN_OVERLAP
+    merger = CaptionMerger(min_overlap)
+    for text in texts:
+        merger.feed(text)
+    return merger.text()
+
+
+def merge_segments(segments: Iterable[Any], min_overlap: Optional[int] = None) -> str:
+    """То же для сегментов {text, ...} (youtube_transcript_api, webvtt.py, Whisper) или CompactTranscript."""
+    texts = getattr(segments, 'texts', None)
+    if callable(texts):
+        return merge_texts(texts(), min_overlap)
+    return merge_texts([(seg.get('text') if isinstance(seg, dict) else getattr(seg, 'text', '')) or ''
+                        for seg in segments], min_overlap)
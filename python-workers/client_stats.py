@@ -0,0 +1,167 @@
+"""
+Статистика player_client yt-dlp: какие клиенты YouTube сейчас работают
+
+VideoDownloader перебирает варианты player_client (default, android, web, ios,
+tv, android+web) по фиксированному списку, и каждый сломанный YouTube вариант
+стоит полного извлечения. Здесь на каждый вариант копятся успехи,
+неудачи и задержка попытки (SQLite в режиме WAL — общая для процессов), а
+варианты упорядочиваются по ожидаемой стоимости: сначала тот, у которого
+выше вероятность успеха на секунду попытки (p / latency).
+
+Счётчики затухают с периодом полураспада PLAYER_CLIENT_HALF_LIFE_HOURS (6 ч):
+клиент, сломавшийся вчера, снова постепенно поднимается и проверяется.
+Варианты без данных считаются средними (p = 0.5), при равенстве сохраняется
+исходный порядок списка. PLAYER_CLIENT_LEARN=0 отключает переупорядочивание
+(статистика продолжает собираться).
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence, TypeVar
+
+from ytdlp_cache import client_key
+from worker_common import cache_path, env_float, open_sqlite, process_singleton, write_transaction
+
+DEFAULT_STATS_PATH = cache_path('player_clients.sqlite3')
+
+# Задержка варианта без замеров, мс
+_DEFAULT_LATENCY_MS = 5000.0
+
+T = TypeVar('T')
+
+
+def learning_enabled() -> bool:
+    return (os.environ.get('PLAYER_CLIENT_LEARN') or '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+class ClientStats:
+    def __init__(self, path: Optional[str] = None, half_life_s: Optional[float] = None):
+        """
+        Args:
+            path: Путь к SQLite файлу (PLAYER_CLIENT_STATS_PATH или python-workers/.cache/player_clients.sqlite3)
+            half_life_s: Период полураспада счётчиков (PLAYER_CLIENT_HALF_LIFE_HOURS, 6 ч)
+        """
+        self.path = path or os.environ.get('PLAYER_CLIENT_STATS_PATH') or DEFAULT_STATS_PATH
+        self.half_life_s = half_life_s if half_life_s is not None else \
+            max(0.01, env_float('PLAYER_CLIENT_HALF_LIFE_HOURS', 6.0)) * 3600
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = open_sqlite(self.path)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS clients (
+                    client TEXT PRIMARY KEY,
+                    successes REAL NOT NULL,
+                    failures REAL NOT NULL,
+                    latency_ms REAL,
+                    attempts INTEGER NOT NULL,
+                    last_error TEXT,
+                    last_success_at REAL,
+                    last_failure_at REAL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            self._conn = conn
+        return self._conn
+
+    def _decay(self, updated_at: float, now: float) -> float:
+        return 0.5 ** (max(0.0, now - updated_at) / self.half_life_s)
+
+    def record(self, clients: Optional[Sequence[str]], ok: bool, latency_ms: Optional[float] = None,
+               error: Optional[str] = None) -> None:
+        """
+        Учесть попытку варианта player_client
+
+        Args:
+            clients: Вариант (None — клиенты yt-dlp по умолчанию)
+            ok: Извлечение/скачивание удалось
+            latency_ms: Длительность попытки (None — не учитывать, например полное скачивание)
+            error: Текст ошибки для --env-dump
+        """
+        key = client_key(clients)
+        now = time.time()
+        try:
+            with self._lock:
+                db = self._db()
+                with write_transaction(db):
+                    row = db.execute('SELECT successes, failures, latency_ms, attempts, last_error, last_success_at, '
+                                     'last_failure_at, updated_at FROM clients WHERE client = ?', (key,)).fetchone()
+                    succ, fail, lat, attempts, last_error, last_ok, last_fail, updated = \
+                        row or (0.0, 0.0, None, 0, None, None, None, now)
+                    k = self._decay(updated, now)
+                    succ, fail = succ * k + (1.0 if ok else 0.0), fail * k + (0.0 if ok else 1.0)
+                    if latency_ms is not None:
+                        lat = latency_ms if lat is None else lat + 0.3 * (latency_ms - lat)
+                    if ok:
+                        last_ok = now
+                    else:
+                        last_fail, last_error = now, (error or '')[:300] or last_error
+                    db.execute('INSERT OR REPLACE INTO clients (client, successes, failures, latency_ms, attempts, '
+                               'last_error, last_success_at, last_failure_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                               (key, succ, fail, lat, attempts + 1, last_error, last_ok, last_fail, now))
+        except Exception as e:
+            print(f"[WARN] player_client stats write failed: {e}")
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """client -> {successes, failures (с затуханием), success_rate, latency_ms, attempts, last_error, ...}."""
+        now = time.time()
+        try:
+            with self._lock:
+                rows = self._db().execute('SELECT client, successes, failures, latency_ms, attempts, last_error, '
+                                          'last_success_at, last_failure_at, updated_at FROM clients').fetchall()
+        except Exception as e:
+            print(f"[WARN] player_client stats read failed: {e}")
+            return {}
+        out = {}
+        for client, succ, fail, lat, attempts, last_error, last_ok, last_fail, updated in rows:
+            k = self._decay(updated, now)
+            succ, fail = succ * k, fail * k
+            out[client] = {
+                'successes': round(succ, 2),
+                'failures': round(fail, 2),
+                # Сглаженная оценка: без данных — 0.5
+                'success_rate': round((succ + 1) / (succ + fail + 2), 3),
+                'latency_ms': round(lat) if lat is not None else None,
+                'attempts': attempts,
+                'last_error': last_error,
+                'last_success_at': int(last_ok) if last_ok else None,
+                'last_failure_at': int(last_fail) if last_fail else None,
+            }
+        return out
+
+    def order(self, variants: Sequence[T]) -> List[T]:
+        """Варианты player_client в порядке убывания p / latency (стабильно к исходному порядку)."""
+        if not learning_enabled() or len(variants) < 2:
+            return list(variants)
+        stats = self.snapshot()
+        if not stats:
+            return list(variants)
+        known = [s['latency_ms'] for s in stats.values() if s['latency_ms']]
+        # Медиана — и задержка вариантов без замеров, и нижняя граница: сломанный клиент часто
+        # падает быстро, но быстрая неудача не должна поднимать его над рабочими
+        median_latency = sorted(known)[len(known) // 2] if known else _DEFAULT_LATENCY_MS
+
+        def score(variant: Any) -> float:
+            s = stats.get(client_key(variant))
+            if not s:
+                return 0.5 / median_latency
+            return s['success_rate'] / max(median_latency, s['latency_ms'] or median_latency)
+
+        return sorted(variants, key=score, reverse=True)
+
+    def table(self, variants: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+        """Статистика для --env-dump: варианты в текущем порядке попыток."""
+        stats = self.snapshot()
+        names = [client_key(v) for v in self.order(variants)] if variants else []
+        names += sorted(n for n in stats if n not in names)
+        return [{'client': n, **stats.get(n, {'attempts': 0})} for n in names]
+
+
+@process_singleton
+def get_client_stats() -> ClientStats:
+    """Общая для процесса статистика (база — общая для всех процессов)."""
+    return ClientStats()
@@ -0,0 +1,269 @@
+"""
+Компактное представление транскрипта
+
+Вместо списка словарей {start, duration, text} (на многочасовом видео —
+десятки тысяч dict + float + str объектов) храним:
+    starts, durations — array('d') (float64, без потерь для float из JSON)
+    text              — одна строка со всеми текстами подряд
+    offsets           — array('L'), границы текстов сегментов в text (n + 1 значение)
+Поля транскрипта (language, type, source, resolver, ...) лежат в meta, редкие
+дополнительные ключи сегментов — в разреженном extras {индекс: {ключ: значение}}.
+
+Для чтения ведёт себя как dict транскрипта: t['language'], t.get('type'),
+'segments' in t, len(t['segments']), t['segments'][i] и итерация отдают словари.
+to_dict() возвращает прежний формат, JSON-выгрузка — через json_default/to_jsonable.
+"""
+
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+_SEGMENT_KEYS = ('start', 'duration', 'text')
+
+
+def _segment_fields(seg: Any):
+    """(start, duration, text, extras) из dict или объекта-сниппета youtube_transcript_api."""
+    if isinstance(seg, dict):
+        extra = {k: v for k, v in seg.items() if k not in _SEGMENT_KEYS}
+        return seg.get('start', 0.0), seg.get('duration', 0.0), seg.get('text', ''), extra
+    return getattr(seg, 'start', 0.0), getattr(seg, 'duration', 0.0), getattr(seg, 'text', ''), {}
+
+
+class SegmentsView:
+    """Только-для-чтения последовательность сегментов-словарей поверх CompactTranscript."""
+
+    __slots__ = ('_ct',)
+
+    def __init__(self, ct: 'CompactTranscript'):
+        self._ct = ct
+
+    def __len__(self) -> int:
+        return len(self._ct)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._ct)
+
+    def texts(self) -> Iterator[str]:
+        return self._ct.texts()
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._ct.segment(j) for j in range(*i.indices(len(self._ct)))]
+        if not -len(self._ct) <= i < len(self._ct):
+            raise IndexError('segment index out of range')
+        return self._ct.segment(i)
+
+
+class CompactTranscript:
+    __slots__ = ('starts', 'durations', 'text', 'offsets', 'meta', 'extras', '_sorted', '_max_duration', '_segments_pos')
+
+    def __init__(self, meta: Optional[Dict[str, Any]] = None):
+        self.starts = array('d')
+        self.durations = array('d')
+        self.text = ''
+        self.offsets = array('L', [0])
+        self.meta: Dict[str, Any] = dict(meta or {})
+        self.extras: Dict[int, Dict[str, Any]] = {}
+        self._sorted = True
+        self._max_duration = 0.0
+        # Позиция ключа segments среди ключей meta — для to_dict() с исходным порядком
+        self._segments_pos = len(self.meta)
+
+    # --- Построение ---
+
+    @classmethod
+    def from_segments(cls, segments: Iterable[Any], meta: Optional[Dict[str, Any]] = None) -> 'CompactTranscript':
+        """Собрать из сегментов (dict или объекты с атрибутами start/duration/text)."""
+        ct = cls(meta)
+        parts: List[str] = []
+        pos = 0
+        prev = float('-inf')
+        for i, seg in enumerate(segments):
+            start, duration, text, extra = _segment_fields(seg)
+            start = float(start or 0.0)
+            duration = float(duration or 0.0)
+            text = text if isinstance(text, str) else str(text or '')
+            ct.starts.append(start)
+            ct.durations.append(duration)
+            parts.append(text)
+            pos += len(text)
+            ct.offsets.append(pos)
+            if extra:
+                ct.extras[i] = extra
+            if start < prev:
+                ct._sorted = False
+            prev = start
+            if duration > ct._max_duration:
+                ct._max_duration = duration
+        ct.text = ''.join(parts)
+        return ct
+
+    @classmethod
+    def from_dict(cls, transcript: Dict[str, Any]) -> 'CompactTranscript':
+        """Из dict транскрипта ({language, type, segments, source, ...})."""
+        meta = {k: v for k, v in transcript.items() if k != 'segments'}
+        ct = cls.from_segments(transcript.get('segments') or [], meta)
+        ct._segments_pos = list(transcript).index('segments') if 'segments' in transcript else len(meta)
+        return ct
+
+    @classmethod
+    def from_columns(cls, starts: array, durations: array, offsets: array, text: str,
+                     meta: Optional[Dict[str, Any]] = None, extras: Optional[Dict[int, Dict[str, Any]]] = None,
+                     segments_pos: Optional[int] = None) -> 'CompactTranscript':
+        """Из готовых колонок (например, прочитанных из файла ytc)."""
+        ct = cls(meta)
+        ct.starts = starts
+        ct.durations = durations
+        ct.offsets = offsets
+        ct.text = text
+        ct.extras = dict(extras or {})
+        ct._sorted = all(starts[i] <= starts[i + 1] for i in range(len(starts) - 1))
+        ct._max_duration = max(durations) if len(durations) else 0.0
+        if segments_pos is not None:
+            ct._segments_pos = segments_pos
+        return ct
+
+    @property
+    def segments_pos(self) -> int:
+        """Позиция ключа segments в исходном dict транскрипта."""
+        return self._segments_pos
+
+    # --- Доступ к сегментам ---
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def text_at(self, i: int) -> str:
+        return self.text[self.offsets[i]:self.offsets[i + 1]]
+
+    def segment(self, i: int) -> Dict[str, Any]:
+        """i-й сегмент в формате dict."""
+        if i < 0:
+            i += len(self)
+        seg = {'start': self.starts[i], 'duration': self.durations[i], 'text': self.text_at(i)}
+        extra = self.extras.get(i)
+        if extra:
+            seg.update(extra)
+        return seg
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self.segment(i)
+
+    def texts(self) -> Iterator[str]:
+        """Тексты сегментов без создания словарей."""
+        text, offsets = self.text, self.offsets
+        for i in range(len(self)):
+            yield text[offsets[i]:offsets[i + 1]]
+
+    def _take(self, indices: Sequence[int]) -> 'CompactTranscript':
+        ct = CompactTranscript(self.meta)
+        parts: List[str] = []
+        pos = 0
+        for j, i in enumerate(indices):
+            t = self.text_at(i)
+            ct.starts.append(self.starts[i])
+            ct.durations.append(self.durations[i])
+            parts.append(t)
+            pos += len(t)
+            ct.offsets.append(pos)
+            if i in self.extras:
+                ct.extras[j] = self.extras[i]
+            if self.durations[i] > ct._max_duration:
+                ct._max_duration = self.durations[i]
+        ct.text = ''.join(parts)
+        ct._sorted = self._sorted
+        ct._segments_pos = self._segments_pos
+        return ct
+
+    def slice_index(self, start: int, stop: int) -> 'CompactTranscript':
+        """Сегменты [start:stop) по индексу."""
+        return self._take(range(*slice(start, stop).indices(len(self))))
+
+    def slice_time(self, start: float, end: float) -> 'CompactTranscript':
+        """
+        Сегменты, пересекающиеся с интервалом [start, end) секунд
+
+        Сегмент нулевой длины попадает, если его start в интервале.
+        """
+        if self._sorted:
+            lo = bisect_left(self.starts, start - self._max_duration)
+            hi = bisect_left(self.starts, end)
+            candidates: Iterable[int] = range(lo, hi)
+        else:
+            candidates = range(len(self))
+        picked = [
+            i for i in candidates
+            if self.starts[i] < end and (self.starts[i] + self.durations[i] > start or self.starts[i] >= start)
+        ]
+        return self._take(picked)
+
+    # --- Совместимость с dict транскрипта ---
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'segments':
+            return SegmentsView(self)
+        return self.meta[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key == 'segments' or key in self.meta
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == 'segments':
+            return SegmentsView(self)
+        return self.meta.get(key, default)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key == 'segments':
+            raise TypeError('segments of CompactTranscript are immutable; build a new one')
+        self.meta[key] = value
+
+    def __bool__(self) -> bool:
+        # Пустой транскрипт с метаданными всё равно «есть», как и dict
+        return True
+
+    def to_segments(self) -> List[Dict[str, Any]]:
+        return list(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Прежний формат: {..meta, segments: [{start, duration, text}, ...]} с исходным порядком ключей."""
+        items = list(self.meta.items())
+        pos = min(self._segments_pos, len(items))
+        out = dict(items[:pos])
+        out['segments'] = self.to_segments()
+        out.update(items[pos:])
+        return out
+
+    def nbytes(self) -> int:
+        """Приблизительный объём данных (массивы + текстовый буфер)."""
+        return (self.starts.itemsize * len(self.starts) + self.durations.itemsize * len(self.durations)
+                + self.offsets.itemsize * len(self.offsets) + sys.getsizeof(self.text))
+
+    def __repr__(self) -> str:
+        return f"CompactTranscript(segments={len(self)}, language={self.meta.get('language')!r})"
+
+
+def compact(transcript: Any) -> Any:
+    """dict транскрипта -> CompactTranscript (None и уже компактные возвращаются как есть)."""
+    if isinstance(transcript, dict) and 'segments' in transcript:
+        return CompactTranscript.from_dict(transcript)
+    return transcript
+
+
+def json_default(obj: Any) -> Any:
+    """Хук default= для json.dump(s)."""
+    if isinstance(obj, CompactTranscript):
+        return obj.to_dict()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def to_jsonable(obj: Any) -> Any:
+    """Рекурсивно заменить CompactTranscript на dict (для jsonify и т.п.)."""
+    if isinstance(obj, CompactTranscript):
+        return obj.to_dict()
+    if isinstance(obj, dict):
+        return {k: to_jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_jsonable(v) for v in obj]
+    return obj
@@ -0,0 +1,472 @@
+"""
+Манифест скачиваний: готовые файлы без повторного скачивания и безопасная докачка
+
+Повторный запрос того же видео раньше заново извлекал info и качал файл, а
+упавшее скачивание начиналось с нуля либо, хуже, yt-dlp дописывал .part,
+оставшийся от другого формата (следующий player_client мог выбрать другой
+поток с тем же именем файла). Здесь (SQLite в режиме WAL — общая для
+процессов) хранятся:
+
+    files     — по (папка, video_id, качество): файл, format_id, размер, sha256, mtime
+                и ответ download_video. Если файл на месте и совпадает с манифестом,
+                download_video отвечает сразу (cached: true), без yt-dlp.
+    partials  — по каждому недокачанному файлу: format_id и отпечаток потока
+                (itag/clen/lmt из ссылки googlevideo, как в asr_cache.py).
+
+Перед скачиванием (постпроцессор yt-dlp before_dl, когда формат уже выбран)
+частичные файлы сверяются с выбранным потоком: совпадает — yt-dlp докачивает
+только недостающие байты (continuedl, Range), не совпадает или неизвестного
+происхождения — удаляются. Проверка готового файла — размер и mtime; если
+mtime изменился или DOWNLOAD_VERIFY=hash — пересчитывается sha256.
+DOWNLOAD_REUSE=0 отключает ответ из манифеста (докачка остаётся).
+
+Одно видео в одной папке качает одно задание за раз (claim: блокировка в
+процессе и файловая — между процессами, .cache/locks/*.lock удаляется по
+окончании): иначе второе задание приняло бы .part первого, который ещё
+пишется, за свой и дописывало бы в те же файлы. Дождавшись, оно обычно
+получает готовый файл из манифеста.
+
+CLI:
+    python download_manifest.py --list [--video-id ID]
+    python download_manifest.py --verify          # пересчитать sha256, убрать несовпадения
+    python download_manifest.py --purge [--video-id ID]
+"""
+
+import os
+import glob
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+    import msvcrt
+
+from asr_cache import audio_fingerprint
+from worker_common import cache_path, open_sqlite, process_singleton
+
+DEFAULT_MANIFEST_PATH = cache_path('downloads.sqlite3')
+
+# Поля ответа, которые относятся к конкретному запуску, а не к файлу
+_VOLATILE_FIELDS = ('fragments', 'resume', 'queue', 'manifest', 'cached', 'priority', 'elapsed_ms')
+
+
+def reuse_enabled() -> bool:
+    return (os.environ.get('DOWNLOAD_REUSE') or '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def stream_identity(fmt: Dict[str, Any]) -> str:
+    """Отпечаток потока: itag/clen/lmt ссылки googlevideo, иначе format_id и размер."""
+    return audio_fingerprint(fmt.get('url')) or \
+        f"{fmt.get('format_id')}|{fmt.get('filesize') or fmt.get('filesize_approx') or ''}"
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _partial_files(path: str) -> List[str]:
+    """Следы недокачанного path: .part, .part-FragN и .ytdl (состояние фрагментов)."""
+    return [p for p in glob.glob(glob.escape(path) + '.part*') + [path + '.ytdl'] if os.path.exists(p)]
+
+
+def _lock_fd(fd: int, blocking: bool) -> bool:
+    """Файловая блокировка fd (снимается и при падении процесса); False — занята, а ждать не велено."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            return True
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                time.sleep(0.5)
+    except BlockingIOError:
+        return False
+
+
+def _unlock_fd(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+def _lock_file(lock_path: str, video_id: str) -> int:
+    """
+    Открыть и заблокировать файл блокировки (ждёт, если он занят другим процессом)
+
+    Владелец удаляет файл перед снятием блокировки, поэтому дождавшийся мог
+    заблокировать уже удалённый файл — тогда открываем заново.
+    """
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    waited = False
+    while True:
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if not _lock_fd(fd, blocking=False):
+                if not waited:
+                    print(f"[INFO] {video_id}: уже качается другим процессом — ждём")
+                    waited = True
+                _lock_fd(fd, blocking=True)
+            st = os.fstat(fd)
+            try:
+                current = os.stat(lock_path)
+            except FileNotFoundError:
+                current = None
+            if current is not None and (current.st_dev, current.st_ino) == (st.st_dev, st.st_ino):
+                return fd
+        except BaseException:
+            os.close(fd)
+            raise
+        os.close(fd)
+
+
+def _unlock_file(lock_path: str, fd: int) -> None:
+    """Удалить файл блокировки и снять её (на Windows открытый файл не удалить — он остаётся)."""
+    try:
+        os.remove(lock_path)
+    except OSError:
+        pass
+    try:
+        _unlock_fd(fd)
+    except OSError:
+        pass
+    os.close(fd)
+
+
+def _expected_partials(info: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Файлы, которые yt-dlp сейчас начнёт качать: путь -> формат (имена — как в YoutubeDL.process_info)."""
+    target = info.get('_filename') or info.get('filepath')
+    if not target:
+        return {}
+    formats = info.get('requested_formats')
+    if not formats:
+        return {target: info}
+    base = os.path.splitext(target)[0]
+    out: Dict[str, Dict[str, Any]] = {}
+    for f in formats:
+        # Расширение — итоговое или самого формата, в зависимости от способа склейки
+        for ext in {info.get('ext'), f.get('ext')}:
+            if ext:
+                out[f"{base}.f{f.get('format_id')}.{ext}"] = f
+    return out
+
+
+class DownloadManifest:
+    def __init__(self, path: Optional[str] = None, verify: Optional[str] = None):
+        """
+        Args:
+            path: Путь к SQLite файлу (DOWNLOAD_MANIFEST_PATH или python-workers/.cache/downloads.sqlite3)
+            verify: Проверка готового файла: size (размер и mtime) или hash (DOWNLOAD_VERIFY, size)
+        """
+        self.path = path or os.environ.get('DOWNLOAD_MANIFEST_PATH') or DEFAULT_MANIFEST_PATH
+        self.verify = (verify or os.environ.get('DOWNLOAD_VERIFY') or 'size').strip().lower()
+        self.counters: Dict[str, int] = {'hits': 0, 'misses': 0, 'invalid': 0, 'resumed': 0, 'discarded': 0}
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # Занятые видео процесса: ключ -> [lock, сколько заданий его ждут или держат]
+        self._claims: Dict[str, List[Any]] = {}
+        self._claims_lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = open_sqlite(self.path)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS files (
+                    download_dir TEXT NOT NULL,
+                    video_id TEXT NOT NULL,
+                    variant TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    format_id TEXT,
+                    size INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (download_dir, video_id, variant)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS partials (
+                    path TEXT PRIMARY KEY,
+                    video_id TEXT NOT NULL,
+                    format_id TEXT,
+                    identity TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            self._conn = conn
+        return self._conn
+
+    def lookup(self, download_dir: str, video_id: str, variant: str) -> Optional[Dict[str, Any]]:
+        """
+        Готовый файл из манифеста, если он на месте и не изменился
+
+        Args:
+            download_dir: Папка скачиваний
+            video_id: YouTube video ID
+            variant: Качество ('highest', '720', format_id) или 'audio'
+
+        Returns:
+            Сохранённый ответ download_video + {cached: True, manifest} или None
+        """
+        if not reuse_enabled():
+            return None
+        download_dir = os.path.abspath(download_dir)
+        try:
+            with self._lock:
+                row = self._db().execute('SELECT filename, format_id, size, sha256, mtime_ns, result FROM files '
+                                         'WHERE download_dir = ? AND video_id = ? AND variant = ?',
+                                         (download_dir, video_id, variant)).fetchone()
+        except Exception as e:
+            print(f"[WARN] download manifest read failed: {e}")
+            return None
+        if not row:
+            self.counters['misses'] += 1
+            return None
+        filename, format_id, size, sha256, mtime_ns, result = row
+        reason = self._check(filename, size, sha256, mtime_ns)
+        if reason:
+            print(f"[WARN] {video_id}: файл из манифеста не совпадает ({reason}) — качаем заново")
+            self.counters['invalid'] += 1
+            self._forget(download_dir, video_id, variant)
+            # Иначе yt-dlp увидит готовое имя и сочтёт испорченный файл скачанным
+            if os.path.exists(filename):
+                try:
+                    os.remove(filename)
+                except OSError as e:
+                    print(f"[WARN] {video_id}: не удалось удалить {filename}: {e}")
+            return None
+        self.counters['hits'] += 1
+        try:
+            current_mtime = os.stat(filename).st_mtime_ns
+            if current_mtime != mtime_ns:
+                # Файл трогали, но sha256 сошёлся — запоминаем новый mtime, чтобы не хешировать каждый раз
+                with self._lock:
+                    self._db().execute('UPDATE files SET mtime_ns = ? WHERE download_dir = ? AND video_id = ? '
+                                       'AND variant = ?', (current_mtime, download_dir, video_id, variant))
+        except Exception as e:
+            print(f"[WARN] download manifest write failed: {e}")
+        return {**json.loads(result), 'cached': True,
+                'manifest': {'format_id': format_id, 'size': size, 'sha256': sha256}}
+
+    def _check(self, filename: str, size: int, sha256: str, mtime_ns: Optional[int],
+               force_hash: bool = False) -> Optional[str]:
+        """Причина, по которой файлу нельзя верить (None — всё сходится)."""
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return 'файла нет'
+        if st.st_size != size:
+            return f'размер {st.st_size} вместо {size}'
+        if force_hash or self.verify == 'hash' or st.st_mtime_ns != mtime_ns:
+            if file_sha256(filename) != sha256:
+                return 'sha256'
+        return None
+
+    def record(self, download_dir: str, video_id: str, variant: str, result: Dict[str, Any],
+               info: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Записать готовый файл (sha256 считается здесь); вернуть {format_id, size, sha256} или None."""
+        filename = result.get('filename')
+        if not filename or not os.path.exists(filename):
+            return None
+        try:
+            st = os.stat(filename)
+            sha256 = file_sha256(filename)
+            format_id = (info or {}).get('format_id') or result.get('format_id')
+            stored = {k: v for k, v in result.items() if k not in _VOLATILE_FIELDS}
+            with self._lock:
+                db = self._db()
+                db.execute('INSERT OR REPLACE INTO files (download_dir, video_id, variant, filename, format_id, size, '
+                           'sha256, mtime_ns, result, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                           (os.path.abspath(download_dir), video_id, variant, filename, format_id, st.st_size,
+                            sha256, st.st_mtime_ns, json.dumps(stored, ensure_ascii=False), time.time()))
+                # Только .part этой папки: в других папках то же видео может ещё докачиваться
+                prefix = os.path.join(os.path.abspath(download_dir), '')
+                db.execute('DELETE FROM partials WHERE video_id = ? AND substr(path, 1, ?) = ?',
+                           (video_id, len(prefix), prefix))
+            return {'format_id': format_id, 'size': st.st_size, 'sha256': sha256}
+        except Exception as e:
+            print(f"[WARN] download manifest write failed: {e}")
+            return None
+
+    def _forget(self, download_dir: str, video_id: str, variant: str) -> None:
+        try:
+            with self._lock:
+                self._db().execute('DELETE FROM files WHERE download_dir = ? AND video_id = ? AND variant = ?',
+                                   (download_dir, video_id, variant))
+        except Exception as e:
+            print(f"[WARN] download manifest write failed: {e}")
+
+    @contextmanager
+    def claim(self, download_dir: str, video_id: str) -> Iterator[None]:
+        """
+        Монопольно занять видео в папке на время скачивания (ждёт, если его качает другое задание)
+
+        Ключ — без качества: у всех вариантов один шаблон имени файла, и их .part пересекаются.
+        """
+        key = f'{os.path.abspath(download_dir)}|{video_id}'
+        with self._claims_lock:
+            entry = self._claims.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        lock_path = os.path.join(os.path.dirname(os.path.abspath(self.path)), 'locks',
+                                 hashlib.sha1(key.encode('utf-8')).hexdigest()[:20] + '.lock')
+        fd: Optional[int] = None
+        try:
+            if not entry[0].acquire(blocking=False):
+                print(f"[INFO] {video_id}: уже качается другим заданием — ждём")
+                entry[0].acquire()
+            try:
+                try:
+                    fd = _lock_file(lock_path, video_id)
+                except OSError as e:
+                    # Без файловой блокировки остаётся защита внутри процесса
+                    print(f"[WARN] download lock failed: {e}")
+                yield
+            finally:
+                if fd is not None:
+                    _unlock_file(lock_path, fd)
+                entry[0].release()
+        finally:
+            with self._claims_lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    self._claims.pop(key, None)
+
+    def guard_partials(self, video_id: str, info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Сверить недокачанные файлы с выбранными форматами до начала скачивания
+
+        Returns:
+            {resumed_bytes, resumed: [format_id], discarded: [format_id]}
+        """
+        report: Dict[str, Any] = {'resumed_bytes': 0, 'resumed': [], 'discarded': []}
+        try:
+            with self._lock:
+                db = self._db()
+                for path, fmt in _expected_partials(info).items():
+                    path = os.path.abspath(path)
+                    identity = stream_identity(fmt)
+                    leftovers = _partial_files(path)
+                    if leftovers:
+                        row = db.execute('SELECT identity FROM partials WHERE path = ?', (path,)).fetchone()
+                        if row and row[0] == identity:
+                            part = path + '.part'
+                            report['resumed_bytes'] += os.path.getsize(part) if os.path.exists(part) else 0
+                            report['resumed'].append(fmt.get('format_id'))
+                        else:
+                            # Другой поток или неизвестно чей — дописывать в него нельзя
+                            for p in leftovers:
+                                try:
+                                    os.remove(p)
+                                except OSError:
+                                    pass
+                            report['discarded'].append(fmt.get('format_id'))
+                    db.execute('INSERT OR REPLACE INTO partials (path, video_id, format_id, identity, updated_at) '
+                               'VALUES (?, ?, ?, ?, ?)', (path, video_id, fmt.get('format_id'), identity, time.time()))
+        except Exception as e:
+            print(f"[WARN] download manifest partial check failed: {e}")
+        self.counters['resumed'] += len(report['resumed'])
+        self.counters['discarded'] += len(report['discarded'])
+        if report['resumed']:
+            print(f"[INFO] {video_id}: докачка {report['resumed_bytes'] / 1024 / 1024:.1f} МБ уже скачано")
+        if report['discarded']:
+            print(f"[WARN] {video_id}: удалены недокачанные файлы другого потока ({', '.join(map(str, report['discarded']))})")
+        return report
+
+    def before_dl(self, video_id: str, report: Dict[str, Any]) -> Any:
+        """Постпроцессор yt-dlp (when='before_dl'): guard_partials, итог — в report."""
+        from yt_dlp.postprocessor.common import PostProcessor
+
+        manifest = self
+
+        class PartialGuardPP(PostProcessor):
+            def run(self, info):
+                report.update(manifest.guard_partials(video_id, info))
+                return [], info
+
+        return PartialGuardPP()
+
+    def rows(self, video_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            q = 'SELECT download_dir, video_id, variant, filename, format_id, size, sha256, created_at FROM files'
+            rows = self._db().execute(q + (' WHERE video_id = ?' if video_id else '') + ' ORDER BY created_at',
+                                      (video_id,) if video_id else ()).fetchall()
+        return [{'download_dir': d, 'video_id': v, 'variant': var, 'filename': fn, 'format_id': fid, 'size': size,
+                 'sha256': sha, 'created_at': int(t)} for d, v, var, fn, fid, size, sha, t in rows]
+
+    def verify_all(self) -> Dict[str, int]:
+        """Пересчитать sha256 всех файлов; несовпадающие и пропавшие — убрать из манифеста."""
+        ok = bad = 0
+        for r in self.rows():
+            reason = self._check(r['filename'], r['size'], r['sha256'], None, force_hash=True)
+            if reason:
+                print(f"[WARN] {r['video_id']} ({r['variant']}): {reason}")
+                self._forget(r['download_dir'], r['video_id'], r['variant'])
+                bad += 1
+            else:
+                ok += 1
+        return {'ok': ok, 'removed': bad}
+
+    def purge(self, video_id: Optional[str] = None) -> int:
+        with self._lock:
+            db = self._db()
+            where, args = (' WHERE video_id = ?', (video_id,)) if video_id else ('', ())
+            n = db.execute('DELETE FROM files' + where, args).rowcount
+            db.execute('DELETE FROM partials' + where, args)
+        return n
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            with self._lock:
+                files, size = self._db().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files').fetchone()
+                partials = self._db().execute('SELECT COUNT(*) FROM partials').fetchone()[0]
+        except Exception as e:
+            return {'error': str(e)}
+        return {'path': self.path, 'verify': self.verify, 'reuse': reuse_enabled(), 'files': files,
+                'bytes': size, 'partials': partials, **self.counters}
+
+
+@process_singleton
+def get_download_manifest() -> DownloadManifest:
+    """Общий для процесса манифест (база — общая для всех процессов)."""
+    return DownloadManifest()
+
+
+def main() -> None:
+    import argparse
+    parser = argparse.ArgumentParser(description='Download manifest (completed files and partial downloads)')
+    parser.add_argument('--list', action='store_true', help='List completed files')
+    parser.add_argument('--verify', action='store_true', help='Re-hash every file, drop mismatches')
+    parser.add_argument('--purge', action='store_true', help='Forget entries (files on disk are kept)')
+    parser.add_argument('--video-id', help='Limit --list/--purge to one video')
+    args = parser.parse_args()
+
+    manifest = get_download_manifest()
+    if args.list:
+        out: Any = manifest.rows(args.video_id)
+    elif args.verify:
+        out = manifest.verify_all()
+    elif args.purge:
+        out = {'removed': manifest.purge(args.video_id)}
+    else:
+        out = manifest.stats()
+    print(json.dumps(out, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
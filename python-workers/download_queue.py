@@ -0,0 +1,159 @@
+"""
+Очередь скачиваний: общий лимит параллельности, полосы и приоритеты
+
+Раньше каждое скачивание шло отдельным процессом без оглядки на остальные:
+десять одновременных кликов — десять yt-dlp, и диск с каналом делились
+между всеми поровну, так что медленнее становилось каждое. Теперь скачивание
+сначала занимает слот очереди процесса:
+
+    DOWNLOAD_CONCURRENCY=2         — сколько видео качается одновременно
+    DOWNLOAD_BANDWIDTH_MBPS=0      — общая полоса на все скачивания, МБ/с (0 — без лимита)
+
+Свободный слот получает первый в очереди: interactive (пользователь ждёт)
+раньше bulk (пакеты), внутри приоритета — по времени прихода; вместо имени
+можно передать число (меньше — раньше), см. priority_slots.py. Полоса делится через общий
+token bucket: progress hook каждого скачивания списывает полученные байты и
+засыпает, если корзина ушла в минус (yt-dlp вызывает hook из потока
+скачивания, так что пауза притормаживает именно его).
+
+Лимиты — на процесс: скачивания, которые должны их делить, идут через один
+воркер (app.py /jobs/download) или один пакетный запуск
+(video_downloader.py --batch).
+"""
+
+import time
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from priority_slots import Priority, PrioritySlots, priority_rank
+from worker_common import env_float, env_int, process_singleton
+
+
+class TokenBucket:
+    """Общая полоса: rate байт/с, запас burst байт; долг отрабатывается паузой у того, кто его сделал."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self._lock = threading.Lock()
+        self.waited_s = 0.0
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate: float, burst: Optional[float] = None) -> None:
+        with self._lock:
+            self.rate = max(0.0, rate)
+            # Запас — секунда полосы, но не меньше 256 КБ (один чанк yt-dlp не должен ждать)
+            self.burst = burst if burst is not None else max(self.rate, 256 * 1024)
+            self.tokens = self.burst
+            self.updated = time.monotonic()
+
+    def consume(self, nbytes: int) -> float:
+        """Списать nbytes; вернуть, сколько секунд пришлось ждать."""
+        if nbytes <= 0:
+            return 0.0
+        with self._lock:
+            if not self.rate:
+                return 0.0
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= nbytes
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited_s += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class DownloadSlot:
+    """Занятый слот: hook для полосы (добавить в progress_hooks) и метрики ожидания."""
+
+    def __init__(self, queue: 'DownloadQueue', info: Dict[str, Any]):
+        self.queue = queue
+        self.info = info
+        self._seen: Dict[str, int] = {}
+
+    def hook(self, d: Dict[str, Any]) -> None:
+        """progress_hook yt-dlp: списать из общей корзины байты, полученные с прошлого вызова."""
+        if d.get('status') != 'downloading':
+            return
+        name = d.get('tmpfilename') or d.get('filename') or ''
+        done = d.get('downloaded_bytes') or 0
+        delta = done - self._seen.get(name, 0)
+        self._seen[name] = done
+        if delta > 0:
+            self.queue.bucket.consume(delta)
+
+    def wrap(self, callback: Optional[Callable[[Dict[str, Any]], None]]) -> Callable[[Dict[str, Any]], None]:
+        """progress_callback для download_video: полоса + исходный callback."""
+        def progress(d: Dict[str, Any]) -> None:
+            self.hook(d)
+            if callback:
+                callback(d)
+        return progress
+
+    def __enter__(self) -> 'DownloadSlot':
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.queue.release()
+
+
+class DownloadQueue:
+    def __init__(self, concurrency: Optional[int] = None, bandwidth_mbps: Optional[float] = None):
+        """
+        Args:
+            concurrency: Одновременных скачиваний (DOWNLOAD_CONCURRENCY, 2)
+            bandwidth_mbps: Общая полоса, МБ/с (DOWNLOAD_BANDWIDTH_MBPS, 0 — без лимита)
+        """
+        self.slots = PrioritySlots(concurrency if concurrency else env_int('DOWNLOAD_CONCURRENCY', 2))
+        mbps = bandwidth_mbps if bandwidth_mbps is not None else env_float('DOWNLOAD_BANDWIDTH_MBPS', 0.0)
+        self.bandwidth_mbps = max(0.0, mbps)
+        self.bucket = TokenBucket(self.bandwidth_mbps * 1024 * 1024)
+
+    @property
+    def limit(self) -> int:
+        return self.slots.limit
+
+    def configure(self, concurrency: Optional[int] = None, bandwidth_mbps: Optional[float] = None) -> None:
+        """Поменять лимиты на лету (флаги CLI); уже занятые слоты дорабатывают."""
+        if concurrency:
+            self.slots.set_limit(concurrency)
+        if bandwidth_mbps is not None:
+            self.bandwidth_mbps = max(0.0, bandwidth_mbps)
+            self.bucket.set_rate(self.bandwidth_mbps * 1024 * 1024)
+
+    def slot(self, priority: Priority = 'interactive', on_wait: Optional[Callable[[int], None]] = None) -> DownloadSlot:
+        """
+        Дождаться слота скачивания
+
+        Args:
+            priority: 'interactive', 'bulk' или число (меньше — раньше)
+            on_wait: Вызывается один раз с числом ожидающих, если слот занят
+
+        Returns:
+            DownloadSlot — контекстный менеджер; slot.wrap(callback) — progress_callback с полосой
+        """
+        with self.slots.cond:
+            depth = self.slots.depth()
+            wait_ms = self.slots.acquire(priority_rank(priority), on_wait)
+        if wait_ms >= 1000:
+            print(f"[INFO] Скачивание: ожидание слота {wait_ms / 1000:.1f} с ({priority})")
+        return DownloadSlot(self, {'priority': priority, 'wait_ms': round(wait_ms, 1), 'queue_depth': depth})
+
+    def release(self) -> None:
+        self.slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Лимиты, занято, ожидающие, время ожидания (среднее, p95), пауза полосы."""
+        with self.slots.cond:
+            return {
+                'bandwidth_mbps': self.bandwidth_mbps or None,
+                'waiting': self.slots.depth(),
+                'throttled_s': round(self.bucket.waited_s, 1),
+                **self.slots.stats(),
+            }
+
+
+@process_singleton
+def get_download_queue() -> DownloadQueue:
+    """Общая для процесса очередь скачиваний."""
+    return DownloadQueue()
@@ -0,0 +1,327 @@
+"""
+Адаптивная параллельность фрагментов DASH/HLS для yt-dlp
+
+download_video качал фрагментированные форматы по одному сегменту
+(concurrent_fragment_downloads=1). yt-dlp задаёт число потоков на всё
+скачивание, поэтому подбор идёт между скачиваниями: на каждый хост CDN
+хранится текущий уровень и сглаженная скорость (МБ/с) на каждом опробованном
+уровне.
+
+    скорость растёт (> +10% к уровню ниже)  -> уровень x2 (до FRAGMENT_HOST_CAP)
+    прироста нет                            -> наименьший уровень в пределах 10% от лучшего
+    403 / 429 или скорость < 50% лучшей      -> уровень / 2
+    каждые FRAGMENT_PROBE_EVERY скачиваний на лучшем уровне — проба уровнем выше
+
+Уровень, на котором пришёл 403/429, запоминается как потолок: дальше подъём
+идёт только ниже него (8 -> 429 -> 4 -> 7 -> 429 -> 3 -> 6), проба — до самого
+потолка, и удачная проба его снимает.
+
+Хост — узел CDN из ссылки выбранного формата (rr1---sn-….googlevideo.com;
+при склейке — видеопотока). Он известен только после выбора формата, поэтому
+соединения выдаются в постпроцессоре yt-dlp before_dl (FragmentLease.before_dl),
+до этого скачивание готовится с одним.
+
+Уровни на хост хранятся в python-workers/.cache/fragment_tuner.sqlite3
+(FRAGMENT_TUNER_PATH, общие для процессов). Одновременные скачивания одного процесса (воркер app.py)
+делят соединения: на хост не больше FRAGMENT_HOST_CAP (8), всего не больше
+FRAGMENT_GLOBAL_CAP (16). Одно соединение скачивание получает всегда —
+как раньше. FRAGMENT_TUNER=0 — всегда 1.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from worker_common import cache_path, env_int, open_sqlite, process_singleton, write_transaction
+
+DEFAULT_TUNER_PATH = cache_path('fragment_tuner.sqlite3')
+
+# Прирост, ради которого стоит удваивать уровень, и доля лучшей скорости, ниже которой — откат
+_GAIN = 1.1
+_COLLAPSE = 0.5
+
+# Признаки того, что CDN режет нас за параллельность
+_THROTTLE_MARKERS = ('HTTP Error 403', 'HTTP Error 429', '403: Forbidden', '429: Too Many Requests',
+                     'Too Many Requests')
+
+
+def tuner_enabled() -> bool:
+    return (os.environ.get('FRAGMENT_TUNER') or '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def is_throttled(error: Optional[str]) -> bool:
+    if not error:
+        return False
+    return any(m in error for m in _THROTTLE_MARKERS)
+
+
+def media_host(info: Dict[str, Any]) -> Optional[str]:
+    """Хост CDN, с которого пойдут байты выбранного формата (при склейке — первого, видеопотока)."""
+    for fmt in info.get('requested_formats') or [info]:
+        url = fmt.get('fragment_base_url') or fmt.get('url')
+        host = urlparse(url).hostname if url else None
+        if host:
+            return host
+    return None
+
+
+def next_level(current: int, levels: Dict[int, float], mbps: Optional[float], throttled: bool, cap: int,
+               ceiling: Optional[int] = None, settled_runs: int = 0, probe_every: int = 8) -> Tuple[int, str]:
+    """
+    Следующий уровень параллельности по итогу скачивания
+
+    Args:
+        current: Уровень, на котором качали
+        levels: Сглаженная скорость по уровням (уже с учётом этого скачивания)
+        mbps: Скорость этого скачивания (None — не замерена)
+        throttled: Был 403/429
+        cap: Потолок уровня
+        ceiling: Уровень, на котором последний раз был 403/429 (подъём — только ниже)
+        settled_runs: Сколько скачиваний подряд на лучшем уровне
+
+    Returns:
+        (уровень, решение: backoff | collapse | raise | settle | probe | hold)
+    """
+    if throttled:
+        return max(1, current // 2), 'backoff'
+    if mbps is None or not levels:
+        return current, 'hold'
+    others = [v for lvl, v in levels.items() if lvl != current]
+    if others and mbps < _COLLAPSE * max(others):
+        return max(1, current // 2), 'collapse'
+    lower = [lvl for lvl in levels if lvl < current]
+    up = min(cap, current * 2, ceiling - 1 if ceiling else cap)
+    gained = not lower or levels[current] > levels[max(lower)] * _GAIN
+    # Выше есть уровень, замеренный не лучше текущего, — туда только проба
+    flat = any(v <= levels[current] * _GAIN for lvl, v in levels.items() if lvl > current)
+    if up > current and gained and not flat:
+        return up, 'raise'
+    # Лучший — наименьший уровень в пределах 10% от максимальной скорости
+    top = max(levels.values())
+    best = min(lvl for lvl, v in levels.items() if v * _GAIN >= top)
+    if best == current and current < cap and probe_every and settled_runs + 1 >= probe_every:
+        return min(cap, current * 2, ceiling or cap), 'probe'
+    return min(best, cap), 'settle'
+
+
+class FragmentLease:
+    """Выданные скачиванию соединения и замер его скорости по progress_hooks yt-dlp."""
+
+    def __init__(self, tuner: 'FragmentTuner', host: Optional[str] = None, concurrency: int = 1, target: int = 1,
+                 counted: bool = False):
+        self.tuner = tuner
+        self.host = host
+        self.concurrency = concurrency
+        self.target = target
+        # Соединения учтены в занятых тюнера — release вернёт ровно их (FRAGMENT_TUNER могут выключить на ходу)
+        self.counted = counted
+        self.error: Optional[str] = None
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._released = False
+        self.result: Dict[str, Any] = {}
+
+    def bind(self, host: str) -> int:
+        """Получить соединения у тюнера, когда хост стал известен (один раз); вернуть их число."""
+        if self.host is None and not self._released:
+            self.host = host
+            self.concurrency, self.target, self.counted = self.tuner._grant(host)
+        return self.concurrency
+
+    def before_dl(self) -> Any:
+        """Постпроцессор yt-dlp (when='before_dl'): хост выбранного формата -> concurrent_fragment_downloads."""
+        from yt_dlp.postprocessor.common import PostProcessor
+
+        lease = self
+
+        class FragmentLeasePP(PostProcessor):
+            def run(self, info):
+                host = media_host(info)
+                if host:
+                    # Загрузчики yt-dlp читают параметр из ydl.params в момент скачивания
+                    self._downloader.params['concurrent_fragment_downloads'] = lease.bind(host)
+                return [], info
+
+        return FragmentLeasePP()
+
+    def hook(self, d: Dict[str, Any]) -> None:
+        """progress_hook yt-dlp: байты и время по каждому файлу, фрагментированный ли он."""
+        name = d.get('filename') or d.get('tmpfilename') or ''
+        f = self._files.setdefault(name, {'started': time.perf_counter(), 'bytes': 0, 'elapsed': None,
+                                          'fragmented': False})
+        if d.get('fragment_count') or d.get('fragment_index'):
+            f['fragmented'] = True
+        info = d.get('info_dict') or {}
+        if info.get('fragments') or str(info.get('protocol') or '').startswith(('http_dash_segments', 'm3u8')):
+            f['fragmented'] = True
+        f['bytes'] = d.get('downloaded_bytes') or d.get('total_bytes') or f['bytes']
+        if d.get('status') == 'finished':
+            f['elapsed'] = d.get('elapsed') or (time.perf_counter() - f['started'])
+
+    def fail(self, error: str) -> None:
+        self.error = error
+
+    def measured(self) -> Tuple[int, float, bool]:
+        """(байт, секунд, были ли фрагментированные файлы) по завершённым файлам."""
+        files = [f for f in self._files.values() if f['elapsed']]
+        fragmented = [f for f in files if f['fragmented']]
+        use = fragmented or files
+        return sum(f['bytes'] for f in use), sum(f['elapsed'] for f in use), bool(fragmented)
+
+    def release(self) -> Dict[str, Any]:
+        if not self._released:
+            self._released = True
+            self.result = self.tuner.release(self)
+        return self.result
+
+    def __enter__(self) -> 'FragmentLease':
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.release()
+
+
+class FragmentTuner:
+    def __init__(self, path: Optional[str] = None, host_cap: Optional[int] = None, global_cap: Optional[int] = None):
+        """
+        Args:
+            path: SQLite с уровнями по хостам (FRAGMENT_TUNER_PATH или python-workers/.cache/fragment_tuner.sqlite3)
+            host_cap: Соединений на хост (FRAGMENT_HOST_CAP, 8) — и потолок уровня
+            global_cap: Соединений на процесс (FRAGMENT_GLOBAL_CAP, 16)
+        """
+        self.path = path or os.environ.get('FRAGMENT_TUNER_PATH') or DEFAULT_TUNER_PATH
+        self.host_cap = max(1, host_cap if host_cap is not None else env_int('FRAGMENT_HOST_CAP', 8))
+        self.global_cap = max(1, global_cap if global_cap is not None else env_int('FRAGMENT_GLOBAL_CAP', 16))
+        self.probe_every = max(0, env_int('FRAGMENT_PROBE_EVERY', 8))
+        self._lock = threading.Lock()
+        self._in_use: Dict[str, int] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = open_sqlite(self.path)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS hosts (
+                    host TEXT PRIMARY KEY,
+                    level INTEGER NOT NULL,
+                    levels TEXT NOT NULL,
+                    ceiling INTEGER,
+                    settled_runs INTEGER NOT NULL DEFAULT 0,
+                    downloads INTEGER NOT NULL DEFAULT 0,
+                    backoffs INTEGER NOT NULL DEFAULT 0,
+                    last_decision TEXT,
+                    last_error TEXT,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            self._conn = conn
+        return self._conn
+
+    def _load(self, host: str) -> Dict[str, Any]:
+        row = self._db().execute('SELECT level, levels, ceiling, settled_runs, downloads, backoffs FROM hosts '
+                                 'WHERE host = ?', (host,)).fetchone()
+        if not row:
+            return {'level': 1, 'levels': {}, 'ceiling': None, 'settled_runs': 0, 'downloads': 0, 'backoffs': 0}
+        return {'level': row[0], 'levels': {int(k): v for k, v in json.loads(row[1]).items()}, 'ceiling': row[2],
+                'settled_runs': row[3], 'downloads': row[4], 'backoffs': row[5]}
+
+    def lease(self) -> FragmentLease:
+        """Аренда для скачивания, хост которого ещё не известен (соединения — в FragmentLease.before_dl)."""
+        return FragmentLease(self)
+
+    def acquire(self, host: str) -> FragmentLease:
+        """Аренда для скачивания с известного host."""
+        lease = FragmentLease(self)
+        lease.bind(host)
+        return lease
+
+    def _grant(self, host: str) -> Tuple[int, int, bool]:
+        """Соединения для host: уровень хоста в пределах свободного под лимитами (минимум 1) -> (выдано, уровень)."""
+        if not tuner_enabled():
+            return 1, 1, False
+        with self._lock:
+            try:
+                target = min(self.host_cap, self._load(host)['level'])
+            except Exception as e:
+                print(f"[WARN] fragment tuner read failed: {e}")
+                target = 1
+            host_free = self.host_cap - self._in_use.get(host, 0)
+            global_free = self.global_cap - sum(self._in_use.values())
+            granted = max(1, min(target, host_free, global_free))
+            self._in_use[host] = self._in_use.get(host, 0) + granted
+        if granted < target:
+            print(f"[INFO] Фрагменты {host}: {granted} вместо {target} (заняты лимиты хоста/процесса)")
+        # True — соединения учтены в занятых, release их вернёт
+        return granted, target, True
+
+    def release(self, lease: FragmentLease) -> Dict[str, Any]:
+        """Вернуть соединения и обновить уровень хоста по итогу скачивания."""
+        nbytes, seconds, fragmented = lease.measured()
+        mbps = nbytes / 1024 / 1024 / seconds if seconds > 0 and nbytes else None
+        throttled = is_throttled(lease.error)
+        result: Dict[str, Any] = {'concurrency': lease.concurrency, 'host': lease.host, 'fragmented': fragmented,
+                                  'mb_per_s': round(mbps, 2) if mbps else None}
+        with self._lock:
+            if lease.counted:
+                self._in_use[lease.host] = max(0, self._in_use.get(lease.host, 0) - lease.concurrency)
+            if not lease.counted or not tuner_enabled() or (not fragmented and not throttled):
+                # Обычный https-поток от параллельности фрагментов не зависит — уровень не трогаем
+                return result
+            try:
+                result.update(self._update(lease, mbps if fragmented else None, throttled))
+            except Exception as e:
+                print(f"[WARN] fragment tuner write failed: {e}")
+        return result
+
+    def _update(self, lease: FragmentLease, mbps: Optional[float], throttled: bool) -> Dict[str, Any]:
+        db = self._db()
+        with write_transaction(db):
+            state = self._load(lease.host)
+            levels = state['levels']
+            level = lease.concurrency
+            ceiling = state['ceiling']
+            if throttled:
+                ceiling = level
+            elif ceiling and level >= ceiling:
+                ceiling = None
+            if mbps:
+                old = levels.get(level)
+                levels[level] = mbps if old is None else old + 0.3 * (mbps - old)
+            if level < lease.target and not throttled:
+                # Урезано лимитами — скорость учтена, но уровень хоста этим скачиванием не двигаем
+                new_level, decision = state['level'], 'hold'
+            else:
+                new_level, decision = next_level(level, levels, mbps, throttled, self.host_cap, ceiling,
+                                                 state['settled_runs'], self.probe_every)
+            settled = {'settle': state['settled_runs'] + 1, 'hold': state['settled_runs']}.get(decision, 0)
+            db.execute('INSERT OR REPLACE INTO hosts (host, level, levels, ceiling, settled_runs, downloads, backoffs, '
+                       'last_decision, last_error, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                       (lease.host, new_level, json.dumps({str(k): round(v, 3) for k, v in levels.items()}), ceiling,
+                        settled, state['downloads'] + 1, state['backoffs'] + (decision in ('backoff', 'collapse')),
+                        decision, (lease.error or '')[:300] if throttled else None, time.time()))
+        if decision in ('backoff', 'collapse'):
+            print(f"[WARN] Фрагменты {lease.host}: {decision}, параллельность {level} -> {new_level}")
+        return {'next_concurrency': new_level, 'decision': decision}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._db().execute('SELECT host, level, levels, ceiling, downloads, backoffs, last_decision, '
+                                      'last_error, updated_at FROM hosts ORDER BY host').fetchall()
+            in_use = dict(self._in_use)
+        return {
+            'host_cap': self.host_cap,
+            'global_cap': self.global_cap,
+            'in_use': in_use,
+            'hosts': [{'host': h, 'level': lvl, 'mb_per_s_by_level': json.loads(levels), 'ceiling': ceil,
+                       'downloads': n, 'backoffs': b, 'last_decision': dec, 'last_error': err, 'updated_at': int(t)}
+                      for h, lvl, levels, ceil, n, b, dec, err, t in rows],
+        }
+
+
+@process_singleton
+def get_fragment_tuner() -> FragmentTuner:
+    """Общий для процесса контроллер (лимиты соединений — на процесс, уровни — общие)."""
+    return FragmentTuner()
@@ -0,0 +1,251 @@
+"""
+Компактный формат результата парсинга (.ytc)
+
+По умолчанию результат parse_video пишется в {video_id}_parsed.json (indent=2),
+его читает backend. Формат ytc (PARSED_OUTPUT_FORMAT=ytc или --output-format ytc)
+пишет {video_id}_parsed.ytc — набор независимо сжатых (zlib) секций:
+
+    b'YTCP' | версия (1 байт)
+    секция: длина имени (1 байт) | имя | длина данных (uint32 LE) | данные (zlib)
+        header    — JSON: всё, кроме full_text и сегментов; transcript — только meta + число сегментов
+        full_text — UTF-8
+        segments  — колонки: n (uint32), start[n] и duration[n] (float64), offsets[n+1] (uint32,
+                    в символах), длина JSON extras (uint32), extras, текст UTF-8
+
+read_ytc(path, sections={'header'}) / read_header(path) читают только заголовок и пропускает
+остальное через seek, не распаковывая транскрипт.
+
+CLI:
+    python parsed_store.py abc_parsed.ytc --header   # info/chapters/meta транскрипта
+    python parsed_store.py abc_parsed.ytc            # полный JSON в прежнем формате
+"""
+
+import os
+import sys
+import json
+import zlib
+import struct
+from array import array
+from typing import Any, BinaryIO, Dict, Iterable, Optional
+
+from compact_transcript import CompactTranscript, json_default
+
+MAGIC = b'YTCP'
+VERSION = 1
+FORMATS = ('json', 'ytc')
+ALL_SECTIONS = frozenset(('header', 'full_text', 'segments'))
+
+_U32 = struct.Struct('<I')
+
+
+def default_format() -> str:
+    fmt = (os.environ.get('PARSED_OUTPUT_FORMAT') or 'json').strip().lower()
+    return fmt if fmt in FORMATS else 'json'
+
+
+def parsed_path(video_id: str, output_dir: Optional[str] = None, fmt: str = 'json') -> str:
+    name = f"{video_id}_parsed.{fmt}"
+    return os.path.join(output_dir, name) if output_dir else name
+
+
+def _le(a: array) -> bytes:
+    """Байты массива в little-endian независимо от платформы."""
+    if sys.byteorder == 'big':
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def _from_le(typecode: str, data: bytes) -> array:
+    a = array(typecode)
+    a.frombytes(data)
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return a
+
+
+def _pack_segments(ct: CompactTranscript) -> bytes:
+    n = len(ct)
+    offsets = array('I', ct.offsets)
+    extras = json.dumps({str(k): v for k, v in ct.extras.items()}, ensure_ascii=False).encode('utf-8') if ct.extras else b''
+    return b''.join((
+        _U32.pack(n),
+        _le(ct.starts),
+        _le(ct.durations),
+        _le(offsets),
+        _U32.pack(len(extras)),
+        extras,
+        ct.text.encode('utf-8'),
+    ))
+
+
+def _unpack_segments(data: bytes, meta: Dict[str, Any], segments_pos: Optional[int]) -> CompactTranscript:
+    n = _U32.unpack_from(data, 0)[0]
+    pos = 4
+    starts = _from_le('d', data[pos:pos + 8 * n])
+    pos += 8 * n
+    durations = _from_le('d', data[pos:pos + 8 * n])
+    pos += 8 * n
+    offsets = array('L', _from_le('I', data[pos:pos + 4 * (n + 1)]))
+    pos += 4 * (n + 1)
+    extras_len = _U32.unpack_from(data, pos)[0]
+    pos += 4
+    extras = {}
+    if extras_len:
+        extras = {int(k): v for k, v in json.loads(data[pos:pos + extras_len].decode('utf-8')).items()}
+    pos += extras_len
+    return CompactTranscript.from_columns(starts, durations, offsets, data[pos:].decode('utf-8'),
+                                          meta, extras, segments_pos)
+
+
+def _write_section(f: BinaryIO, name: str, payload: bytes, level: int) -> None:
+    raw = name.encode('ascii')
+    body = zlib.compress(payload, level)
+    f.write(bytes((len(raw),)) + raw + _U32.pack(len(body)))
+    f.write(body)
+
+
+def write_ytc(data: Dict[str, Any], path: str, level: int = 6) -> str:
+    """Записать результат parse_video в формате ytc (атомарно через временный файл)."""
+    transcript = data.get('transcript')
+    ct: Optional[CompactTranscript] = None
+    if isinstance(transcript, CompactTranscript):
+        ct = transcript
+    elif isinstance(transcript, dict) and 'segments' in transcript:
+        ct = CompactTranscript.from_dict(transcript)
+
+    header = {k: v for k, v in data.items() if k not in ('transcript', 'full_text')}
+    if ct is not None:
+        header['transcript'] = {'meta': ct.meta, 'segments': len(ct), 'segments_pos': ct.segments_pos}
+    else:
+        header['transcript'] = None if transcript is None else {'raw': transcript}
+    # Исходный порядок ключей — чтобы полное чтение давало тот же JSON
+    header['_keys'] = list(data)
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC + bytes((VERSION,)))
+        _write_section(f, 'header', json.dumps(header, ensure_ascii=False, default=json_default).encode('utf-8'), level)
+        if 'full_text' in data:
+            _write_section(f, 'full_text', (data.get('full_text') or '').encode('utf-8'), level)
+        if ct is not None:
+            _write_section(f, 'segments', _pack_segments(ct), level)
+    os.replace(tmp, path)
+    return path
+
+
+def _iter_sections(f: BinaryIO, wanted: Iterable[str]):
+    """(имя, распакованные данные) для нужных секций; остальные пропускаются seek-ом."""
+    wanted = set(wanted)
+    while wanted:
+        head = f.read(1)
+        if not head:
+            return
+        name = f.read(head[0]).decode('ascii')
+        size = _U32.unpack(f.read(4))[0]
+        if name in wanted:
+            wanted.discard(name)
+            yield name, zlib.decompress(f.read(size))
+        else:
+            f.seek(size, os.SEEK_CUR)
+
+
+def read_ytc(path: str, sections: Iterable[str] = ALL_SECTIONS, as_dict: bool = False) -> Dict[str, Any]:
+    """
+    Прочитать файл ytc
+
+    Args:
+        path: Путь к .ytc
+        sections: Какие секции читать ('header' читается всегда)
+        as_dict: Вернуть транскрипт dict-ом (иначе CompactTranscript)
+
+    Returns:
+        dict: Данные в формате parse_video (без непрочитанных секций)
+    """
+    sections = set(sections) | {'header'}
+    with open(path, 'rb') as f:
+        if f.read(4) != MAGIC:
+            raise ValueError(f'not a ytc file: {path}')
+        version = f.read(1)[0]
+        if version > VERSION:
+            raise ValueError(f'unsupported ytc version {version}: {path}')
+        data: Dict[str, Any] = {}
+        tr_header: Any = None
+        for name, payload in _iter_sections(f, sections):
+            if name == 'header':
+                data = json.loads(payload.decode('utf-8'))
+                tr_header = data.pop('transcript', None)
+                if tr_header is None or 'raw' in tr_header:
+                    data['transcript'] = tr_header['raw'] if tr_header else None
+                else:
+                    # Пока сегменты не прочитаны — только meta и их число
+                    data['transcript'] = dict(tr_header['meta'], segment_count=tr_header['segments'])
+            elif name == 'full_text':
+                data['full_text'] = payload.decode('utf-8')
+            elif name == 'segments' and tr_header and 'meta' in tr_header:
+                ct = _unpack_segments(payload, tr_header['meta'], tr_header.get('segments_pos'))
+                data['transcript'] = ct.to_dict() if as_dict else ct
+    keys = data.pop('_keys', None) or []
+    return {**{k: data[k] for k in keys if k in data}, **data}
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    """Только info/chapters/счётчики и meta транскрипта — без full_text и сегментов."""
+    if path.endswith('.json'):
+        # Для JSON дешёвого пути нет — читаем целиком и отбрасываем тяжёлое
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        tr = data.get('transcript')
+        if isinstance(tr, dict) and 'segments' in tr:
+            data['transcript'] = dict({k: v for k, v in tr.items() if k != 'segments'},
+                                      segment_count=len(tr['segments']))
+        data.pop('full_text', None)
+        return data
+    return read_ytc(path, sections={'header'})
+
+
+def save_parsed(data: Dict[str, Any], video_id: str, output_dir: Optional[str] = None,
+                fmt: Optional[str] = None) -> str:
+    """Сохранить результат в выбранном формате ('json' — как раньше, indent=2)."""
+    fmt = fmt or default_format()
+    path = parsed_path(video_id, output_dir, fmt)
+    if fmt == 'ytc':
+        return write_ytc(data, path)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=json_default)
+    return path
+
+
+def load_parsed(video_id: str, output_dir: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Найти {video_id}_parsed.ytc или .json и прочитать целиком (транскрипт — dict)."""
+    for fmt in ('ytc', 'json'):
+        path = parsed_path(video_id, output_dir, fmt)
+        if os.path.exists(path):
+            if fmt == 'ytc':
+                return read_ytc(path, as_dict=True)
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    return None
+
+
+def main():
+    """Просмотр .ytc: заголовок или полный JSON в прежнем формате"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Parsed result (.ytc) reader')
+    parser.add_argument('path', help='Path to *_parsed.ytc or *_parsed.json')
+    parser.add_argument('--header', action='store_true', help='Print only info/chapters/transcript meta')
+    args = parser.parse_args()
+
+    if args.header:
+        data = read_header(args.path)
+    elif args.path.endswith('.json'):
+        with open(args.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    else:
+        data = read_ytc(args.path, as_dict=True)
+    print(json.dumps(data, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Ограниченные слоты с очередью по приоритету (asr_scheduler.py, download_queue.py)
+
+Не больше limit владельцев одновременно; свободный слот получает первый в
+очереди: меньший ранг раньше (interactive — 0, bulk — 1, можно передать число),
+внутри ранга — по времени прихода. Освободившийся слот передаётся ожидающему
+напрямую, поэтому пришедшая позже задача не обгонит очередь.
+"""
+
+import time
+import heapq
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+PRIORITIES = {'interactive': 0, 'bulk': 1}
+
+Priority = Union[str, int, None]
+
+
+def priority_rank(priority: Priority) -> int:
+    """'interactive' -> 0, 'bulk' -> 1, число — как есть; неизвестное — interactive."""
+    if isinstance(priority, int):
+        return priority
+    if isinstance(priority, str) and priority.strip().lstrip('-').isdigit():
+        return int(priority)
+    return PRIORITIES.get(str(priority or '').strip().lower(), PRIORITIES['interactive'])
+
+
+class PrioritySlots:
+    """Слоты, очередь ожидающих и время ожидания (последние 256)."""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.running = 0
+        # Condition на RLock: вызывающий может проверить очередь и встать в неё под одной блокировкой
+        self.cond = threading.Condition()
+        self._heap: List[Tuple[int, int]] = []
+        self._granted: set = set()
+        self._seq = 0
+        self.waits: Deque[float] = deque(maxlen=256)
+        self.counters: Dict[str, int] = {'admitted': 0, 'queued': 0, 'max_depth': 0}
+
+    def depth(self, rank: Optional[int] = None) -> int:
+        """Ожидающих всего или с данным рангом."""
+        with self.cond:
+            if rank is None:
+                return len(self._heap)
+            return sum(1 for r, _ in self._heap if r == rank)
+
+    def acquire(self, rank: int, on_wait: Optional[Callable[[int], None]] = None) -> float:
+        """
+        Дождаться слота
+
+        Args:
+            rank: Ранг (меньше — раньше), см. priority_rank
+            on_wait: Вызывается один раз с числом ожидающих, если слот занят
+
+        Returns:
+            float: Время ожидания, мс
+        """
+        started = time.perf_counter()
+        with self.cond:
+            if self.running < self.limit and not self._heap:
+                self.running += 1
+            else:
+                self._seq += 1
+                ticket = (rank, self._seq)
+                heapq.heappush(self._heap, ticket)
+                self.counters['queued'] += 1
+                self.counters['max_depth'] = max(self.counters['max_depth'], len(self._heap))
+                if on_wait:
+                    on_wait(len(self._heap))
+                while ticket not in self._granted:
+                    self.cond.wait()
+                self._granted.discard(ticket)
+            self.counters['admitted'] += 1
+            wait_ms = (time.perf_counter() - started) * 1000
+            self.waits.append(wait_ms)
+        return wait_ms
+
+    def release(self) -> None:
+        with self.cond:
+            if self._heap and self.running <= self.limit:
+                # Слот переходит первому в очереди напрямую — новые задачи его не перехватят
+                self._granted.add(heapq.heappop(self._heap))
+                self.cond.notify_all()
+            else:
+                self.running -= 1
+
+    def set_limit(self, limit: int) -> None:
+        """Поменять лимит на лету; уже занятые слоты дорабатывают, новые сразу отдаются ожидающим."""
+        with self.cond:
+            self.limit = max(1, limit)
+            while self._heap and self.running < self.limit:
+                self._granted.add(heapq.heappop(self._heap))
+                self.running += 1
+            self.cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Лимит, занято, время ожидания (среднее, p95) и счётчики; ожидающих вызывающий считает сам."""
+        with self.cond:
+            waits = sorted(self.waits)
+            return {
+                'limit': self.limit,
+                'running': self.running,
+                'wait_ms_avg': round(sum(waits) / len(waits), 1) if waits else None,
+                'wait_ms_p95': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 1) if waits else None,
+                **self.counters,
+            }
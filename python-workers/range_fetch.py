@@ -0,0 +1,242 @@
+"""
+Параллельное скачивание по HTTP Range
+
+googlevideo ограничивает скорость одного соединения, поэтому поток аудио
+для ASR качается кусками (Range: bytes=a-b) по нескольким соединениям из
+общего пула requests.Session. Каждый кусок пишется по своему смещению,
+при обрыве повторяется только недокачанный хвост куска (FETCH_RETRIES раз).
+
+Размер берётся из параметра clen= ссылки googlevideo, HEAD или пробного
+запроса bytes=0-0. Если сервер не отдаёт размер или игнорирует Range,
+файл качается одним потоком, как раньше.
+
+download_to_file(url, path) — в файл (для ffmpeg/Whisper, которым нужен путь)
+fetch_spooled(url)          — в SpooledTemporaryFile: в памяти до FETCH_SPOOL_MB, дальше на диске
+
+FETCH_CONNECTIONS=4, FETCH_RANGE_MB=4.
+"""
+
+import re
+import time
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from worker_common import env_int
+
+_CONTENT_RANGE_RE = re.compile(r'bytes\s+\d+-\d+/(\d+)')
+_READ_CHUNK = 256 * 1024
+
+# (смещение, данные)
+WriteAtFn = Callable[[int, bytes], None]
+
+
+class RangeError(Exception):
+    """Кусок не удалось скачать за отведённые попытки."""
+
+    def __init__(self, message: str, fatal: bool = False):
+        super().__init__(message)
+        self.fatal = fatal
+
+
+def make_session(connections: int) -> Any:
+    """requests.Session с пулом соединений на connections потоков."""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, connections))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def probe_size(session: Any, url: str, timeout: float = 30) -> Tuple[Optional[int], bool]:
+    """
+    Размер ресурса и поддержка Range
+
+    Returns:
+        (size или None, accepts_ranges)
+    """
+    clen = parse_qs(urlparse(url).query).get('clen')
+    if clen and clen[0].isdigit():
+        # googlevideo: размер есть в ссылке, Range поддерживается всегда
+        return int(clen[0]), True
+    try:
+        r = session.head(url, allow_redirects=True, timeout=timeout)
+        size = r.headers.get('Content-Length')
+        if r.ok and size and size.isdigit() and r.headers.get('Accept-Ranges', '').lower() == 'bytes':
+            return int(size), True
+    except Exception:
+        pass
+    try:
+        with session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=timeout) as r:
+            if r.status_code == 206:
+                m = _CONTENT_RANGE_RE.search(r.headers.get('Content-Range', ''))
+                if m:
+                    return int(m.group(1)), True
+            size = r.headers.get('Content-Length')
+            return (int(size) if r.ok and size and size.isdigit() else None), False
+    except Exception:
+        return None, False
+
+
+def plan_ranges(size: int, range_bytes: int) -> List[Tuple[int, int]]:
+    """Куски [(first, last)] включительно, как в заголовке Range."""
+    return [(start, min(start + range_bytes, size) - 1) for start in range(0, size, range_bytes)]
+
+
+def _fetch_range(session: Any, url: str, first: int, last: int, write_at: WriteAtFn, retries: int,
+                 timeout: float, stats: Dict[str, Any], lock: threading.Lock) -> None:
+    pos = first
+    for attempt in range(retries + 1):
+        try:
+            with session.get(url, headers={'Range': f'bytes={pos}-{last}'}, stream=True, timeout=timeout) as r:
+                if r.status_code != 206:
+                    # 403/404 (ссылка истекла) или 200 (Range проигнорирован) повтором не исправить
+                    fatal = r.status_code < 500 and r.status_code != 429
+                    raise RangeError(f'HTTP {r.status_code} на Range-запрос', fatal)
+                for chunk in r.iter_content(chunk_size=_READ_CHUNK):
+                    if not chunk:
+                        continue
+                    chunk = chunk[:last + 1 - pos]
+                    write_at(pos, chunk)
+                    pos += len(chunk)
+                    with lock:
+                        stats['bytes'] += len(chunk)
+                    if pos > last:
+                        return
+            raise RangeError(f'кусок {first}-{last} оборван на {pos}')
+        except Exception as e:
+            if attempt >= retries or getattr(e, 'fatal', False):
+                raise RangeError(f'{first}-{last}: {e}') from e
+            with lock:
+                stats['retries'] += 1
+            # Докачиваем только недостающий хвост куска
+            time.sleep(min(0.5 * 2 ** attempt, 5))
+
+
+def _fetch_single(session: Any, url: str, write_at: WriteAtFn, timeout: float, stats: Dict[str, Any]) -> None:
+    with session.get(url, stream=True, timeout=timeout) as r:
+        r.raise_for_status()
+        pos = 0
+        for chunk in r.iter_content(chunk_size=_READ_CHUNK):
+            if chunk:
+                write_at(pos, chunk)
+                pos += len(chunk)
+                stats['bytes'] = pos
+
+
+def fetch_into(
+    url: str,
+    write_at: WriteAtFn,
+    connections: Optional[int] = None,
+    range_bytes: Optional[int] = None,
+    retries: Optional[int] = None,
+    timeout: float = 30,
+    session: Any = None,
+    on_error: Optional[Callable[[BaseException], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Скачать url, передавая куски в write_at(offset, data) (вызывается из нескольких потоков)
+
+    Args:
+        url: Ссылка на поток
+        write_at: Запись данных по смещению
+        connections: Параллельных соединений (FETCH_CONNECTIONS, 4)
+        range_bytes: Размер куска (FETCH_RANGE_MB, 4 МБ)
+        retries: Повторов на кусок (FETCH_RETRIES, 3)
+        timeout: Таймаут соединения/чтения (сек)
+        session: Готовая requests.Session (по умолчанию — своя, с пулом на connections)
+        on_error: Вызывается при первой ошибке куска (разбудить писателей, ждущих в write_at)
+
+    Returns:
+        dict: {mode, size, bytes, ranges, connections, retries, elapsed_ms, mb_per_s}
+
+    Raises:
+        RangeError / requests.RequestException: если скачать не удалось
+    """
+    connections = max(1, connections or env_int('FETCH_CONNECTIONS', 4))
+    range_bytes = max(64 * 1024, range_bytes or env_int('FETCH_RANGE_MB', 4) * 1024 * 1024)
+    retries = env_int('FETCH_RETRIES', 3) if retries is None else retries
+    own_session = session is None
+    session = session or make_session(connections)
+    started = time.perf_counter()
+    stats: Dict[str, Any] = {'mode': 'ranges', 'size': None, 'bytes': 0, 'ranges': 0,
+                             'connections': connections, 'retries': 0}
+    try:
+        size, accepts_ranges = probe_size(session, url, timeout)
+        stats['size'] = size
+        if not size or not accepts_ranges or connections == 1 or size <= range_bytes:
+            stats.update(mode='single', connections=1)
+            _fetch_single(session, url, write_at, timeout, stats)
+        else:
+            ranges = plan_ranges(size, range_bytes)
+            stats['ranges'] = len(ranges)
+            lock = threading.Lock()
+            with ThreadPoolExecutor(max_workers=min(connections, len(ranges)), thread_name_prefix='range') as pool:
+                futures = [pool.submit(_fetch_range, session, url, first, last, write_at, retries, timeout, stats, lock)
+                           for first, last in ranges]
+                error: Optional[BaseException] = None
+                for future in futures:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        if error is None:
+                            error = e
+                            if on_error:
+                                on_error(e)
+                            # Остальные куски уже не нужны — не начинаем их
+                            for rest in futures:
+                                rest.cancel()
+            if error is not None:
+                raise error
+    finally:
+        if own_session:
+            session.close()
+    elapsed = time.perf_counter() - started
+    stats['elapsed_ms'] = int(elapsed * 1000)
+    stats['mb_per_s'] = round(stats['bytes'] / 1024 / 1024 / elapsed, 2) if elapsed > 0 else None
+    return stats
+
+
+def _locked_writer(f: BinaryIO) -> WriteAtFn:
+    lock = threading.Lock()
+
+    def write_at(offset: int, data: bytes) -> None:
+        with lock:
+            f.seek(offset)
+            f.write(data)
+
+    return write_at
+
+
+def download_to_file(url: str, path: str, **kwargs: Any) -> Dict[str, Any]:
+    """Скачать url в файл path (параметры — как у fetch_into)."""
+    with open(path, 'wb') as f:
+        stats = fetch_into(url, _locked_writer(f), **kwargs)
+        f.truncate(stats['bytes'] if stats['mode'] == 'single' else stats['size'])
+    print(f"[INFO] Скачано {stats['bytes'] / 1024 / 1024:.1f} МБ за {stats['elapsed_ms'] / 1000:.1f} с "
+          f"({stats['mb_per_s']} МБ/с, соединений: {stats['connections']}, повторов: {stats['retries']})")
+    return stats
+
+
+def fetch_spooled(url: str, spool_max_bytes: Optional[int] = None,
+                  **kwargs: Any) -> Tuple[tempfile.SpooledTemporaryFile, Dict[str, Any]]:
+    """
+    Скачать url в SpooledTemporaryFile (в памяти до FETCH_SPOOL_MB, 16 МБ, дальше на диске)
+
+    Returns:
+        (файл, открытый и перемотанный в начало — закрывает вызывающий; статистика)
+    """
+    max_size = spool_max_bytes or env_int('FETCH_SPOOL_MB', 16) * 1024 * 1024
+    f = tempfile.SpooledTemporaryFile(max_size=max_size, prefix='fetch_')
+    try:
+        stats = fetch_into(url, _locked_writer(f), **kwargs)
+    except Exception:
+        f.close()
+        raise
+    f.seek(0)
+    return f, stats
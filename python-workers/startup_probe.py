@@ -0,0 +1,63 @@
+"""
+Замер старта CLI воркеров
+
+Если задана переменная WORKER_STARTUP_PROBE=1, probe_startup(mode) печатает
+одну JSON-строку (режим, RSS, число загруженных модулей, какие тяжёлые
+зависимости уже импортированы) и немедленно завершает процесс. Так
+benchmarks.py startup измеряет время и память до точки входа режима без
+сетевых запросов.
+"""
+
+import os
+import sys
+import json
+
+# Зависимости, импорт которых заметно удлиняет старт
+HEAVY_MODULES = (
+    'yt_dlp',
+    'youtube_transcript_api',
+    'requests',
+    'googleapiclient',
+    'google.oauth2',
+    'openai',
+    'whisper',
+    'torch',
+)
+
+
+def current_rss_kb():
+    """Текущий RSS процесса в КБ (None, если платформа не поддерживается)."""
+    try:
+        with open('/proc/self/status', 'r', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import psutil  # type: ignore
+        return int(psutil.Process().memory_info().rss // 1024)
+    except Exception:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS отдаёт байты, Linux — килобайты
+        return int(peak // 1024) if sys.platform == 'darwin' else int(peak)
+    except Exception:
+        return None
+
+
+def probe_startup(mode: str) -> None:
+    """Напечатать метрики старта и выйти, если включён WORKER_STARTUP_PROBE."""
+    if str(os.environ.get('WORKER_STARTUP_PROBE', '')).lower() not in ('1', 'true', 'yes'):
+        return
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+    print(json.dumps({
+        'startup_probe': mode,
+        'rss_kb': current_rss_kb(),
+        'modules': len(sys.modules),
+        'heavy_loaded': loaded,
+    }))
+    sys.stdout.flush()
+    os._exit(0)
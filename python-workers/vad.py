@@ -0,0 +1,301 @@
+"""
+Предварительный проход VAD: распознаём только участки с речью
+
+Длинные заставки, музыкальные подложки и тишина стоят времени распознавания
+и порождают галлюцинации Whisper. detect_speech находит участки речи,
+condense склеивает только их в отдельный файл, а SpeechPlan.remap_segments
+возвращает таймкоды сегментов на исходную шкалу времени.
+
+Детекторы (VAD_BACKEND):
+    webrtc — webrtcvad (pip install webrtcvad), кадры по 30 мс; отсекает и музыку
+    energy — фильтр ffmpeg silencedetect (порог VAD_NOISE_DB); только тишина
+    auto   — webrtc, если пакет установлен, иначе energy (по умолчанию)
+
+Речь вырезается из потока PCM 16 кГц по номерам сэмплов, поэтому сдвигов на
+стыках нет: участок k сжатого файла начинается ровно в сумме длин участков до него.
+"""
+
+import os
+import re
+import time
+import wave
+import subprocess
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+from asr_openai import find_ffmpeg, probe_audio
+from audio_normalize import encoder_args
+from worker_common import env_float, env_int
+
+SAMPLE_RATE = 16000
+_FRAME_MS = 30
+
+_SILENCE_START_RE = re.compile(r'silence_start:\s*(-?\d+(?:\.\d+)?)')
+_SILENCE_END_RE = re.compile(r'silence_end:\s*(-?\d+(?:\.\d+)?)')
+
+
+def vad_enabled() -> bool:
+    return (os.environ.get('WHISPER_VAD') or '0').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _pcm_cmd(ffmpeg: str, path: str) -> List[str]:
+    return [ffmpeg, '-hide_banner', '-loglevel', 'error', '-nostdin', '-i', path, '-vn',
+            '-f', 's16le', '-ac', '1', '-ar', str(SAMPLE_RATE), '-']
+
+
+def _energy_regions(ffmpeg: str, path: str, duration: float, noise_db: float,
+                    min_silence: float) -> List[Tuple[float, float]]:
+    """Речь = всё, что не тишина по silencedetect."""
+    cmd = [ffmpeg, '-hide_banner', '-nostdin', '-i', path, '-vn',
+           '-af', f'silencedetect=noise={noise_db}dB:d={min_silence}', '-f', 'null', '-']
+    err = subprocess.run(cmd, capture_output=True, text=True, timeout=3600).stderr or ''
+    regions = []
+    pos = 0.0
+    for line in err.splitlines():
+        m = _SILENCE_START_RE.search(line)
+        if m:
+            start = max(0.0, float(m.group(1)))
+            if start > pos:
+                regions.append((pos, start))
+            pos = duration
+            continue
+        m = _SILENCE_END_RE.search(line)
+        if m:
+            pos = float(m.group(1))
+    if pos < duration:
+        regions.append((pos, duration))
+    return regions
+
+
+def _webrtc_regions(ffmpeg: str, path: str, aggressiveness: int) -> List[Tuple[float, float]]:
+    """Речь по webrtcvad: подряд идущие кадры с речью."""
+    import webrtcvad
+
+    detector = webrtcvad.Vad(aggressiveness)
+    frame_bytes = SAMPLE_RATE * _FRAME_MS // 1000 * 2
+    regions: List[Tuple[float, float]] = []
+    proc = subprocess.Popen(_pcm_cmd(ffmpeg, path), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        buf = b''
+        frame = 0
+        start: Optional[float] = None
+        while True:
+            data = proc.stdout.read(frame_bytes * 1000)  # type: ignore[union-attr]
+            if not data:
+                break
+            buf += data
+            usable = len(buf) - len(buf) % frame_bytes
+            for off in range(0, usable, frame_bytes):
+                t = frame * _FRAME_MS / 1000
+                if detector.is_speech(buf[off:off + frame_bytes], SAMPLE_RATE):
+                    if start is None:
+                        start = t
+                elif start is not None:
+                    regions.append((start, t))
+                    start = None
+                frame += 1
+            buf = buf[usable:]
+        if start is not None:
+            regions.append((start, frame * _FRAME_MS / 1000))
+    finally:
+        proc.stdout.close()  # type: ignore[union-attr]
+        proc.wait()
+    return regions
+
+
+def _smooth(regions: List[Tuple[float, float]], duration: float, pad: float, min_silence: float,
+            min_speech: float) -> List[Tuple[float, float]]:
+    """Расширить участки на pad, слить через паузы короче min_silence, выбросить щелчки короче min_speech."""
+    merged: List[List[float]] = []
+    for start, end in regions:
+        start, end = max(0.0, start - pad), min(duration, end + pad)
+        if merged and start - merged[-1][1] < min_silence:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(round(s, 3), round(e, 3)) for s, e in merged if e - s >= min_speech]
+
+
+def detect_speech(path: str, ffmpeg: Optional[str] = None, duration: Optional[float] = None,
+                  backend: Optional[str] = None) -> Optional[Tuple[List[Tuple[float, float]], float, str]]:
+    """
+    Найти участки речи
+
+    Args:
+        path: Путь к аудио
+        ffmpeg: Путь к ffmpeg (по умолчанию find_ffmpeg())
+        duration: Длительность, если известна
+        backend: 'webrtc' | 'energy' | 'auto' (VAD_BACKEND)
+
+    Returns:
+        tuple: (участки [(start, end)], длительность, детектор) или None, если VAD невозможен
+    """
+    ffmpeg = ffmpeg or find_ffmpeg()
+    if not ffmpeg:
+        print("[WARN] VAD: ffmpeg не найден — распознаём всё аудио")
+        return None
+    duration = duration or probe_audio(path, ffmpeg)[0]
+    if not duration:
+        print("[WARN] VAD: не удалось определить длительность — распознаём всё аудио")
+        return None
+
+    backend = (backend or os.environ.get('VAD_BACKEND') or 'auto').strip().lower()
+    if backend in ('auto', 'webrtc'):
+        try:
+            import webrtcvad  # noqa: F401
+            backend = 'webrtc'
+        except ImportError:
+            if backend == 'webrtc':
+                print("[WARN] VAD: webrtcvad не установлен (pip install webrtcvad), используем energy")
+            backend = 'energy'
+
+    min_silence = env_float('VAD_MIN_SILENCE', 1.5)
+    if backend == 'webrtc':
+        raw = _webrtc_regions(ffmpeg, path, min(3, max(0, env_int('VAD_AGGRESSIVENESS', 2))))
+    else:
+        raw = _energy_regions(ffmpeg, path, duration, env_float('VAD_NOISE_DB', -35.0), min_silence)
+    regions = _smooth(raw, duration, env_float('VAD_PAD', 0.25), min_silence, env_float('VAD_MIN_SPEECH', 0.3))
+    return regions, duration, backend
+
+
+class SpeechPlan:
+    """Участки речи и отображение времени сжатого файла на исходное."""
+
+    def __init__(self, regions: List[Tuple[float, float]], duration: float, backend: str,
+                 path: Optional[str] = None):
+        self.regions = regions
+        self.duration = duration
+        self.backend = backend
+        # Файл для распознавания (только речь) или None, если сжимать не стали
+        self.path = path
+        self.offsets: List[float] = []
+        pos = 0.0
+        for start, end in regions:
+            self.offsets.append(pos)
+            pos += end - start
+        self.speech_seconds = pos
+        self.vad_ms = 0.0
+
+    @property
+    def speech_ratio(self) -> float:
+        return self.speech_seconds / self.duration if self.duration else 0.0
+
+    def to_original(self, t: float) -> float:
+        """Время в сжатом файле -> время в исходном аудио."""
+        if not self.path or not self.regions:
+            return t
+        k = max(0, bisect_right(self.offsets, t) - 1)
+        return self.regions[k][0] + (t - self.offsets[k])
+
+    def remap_segments(self, segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Сегменты {start, duration, text} на исходную шкалу времени."""
+        if not self.path:
+            return segments
+        out = []
+        for seg in segments:
+            start = float(seg.get('start') or 0.0)
+            end = start + float(seg.get('duration') or 0.0)
+            new_start = self.to_original(start)
+            # Конец сегмента ищем в том же участке, если он не вышел за его пределы
+            new_end = max(new_start, self.to_original(max(start, end - 1e-6)))
+            out.append(dict(seg, start=round(new_start, 3), duration=round(new_end - new_start, 3)))
+        return out
+
+    def stats(self, asr_ms: Optional[float] = None) -> Dict[str, Any]:
+        """Метаданные для транскрипта: доля речи и сэкономленное время."""
+        skipped = self.duration - self.speech_seconds if self.path else 0.0
+        out: Dict[str, Any] = {
+            'backend': self.backend,
+            'regions': len(self.regions),
+            'audio_seconds': round(self.duration, 1),
+            'speech_seconds': round(self.speech_seconds, 1),
+            'speech_ratio': round(self.speech_ratio, 3),
+            'skipped_seconds': round(skipped, 1),
+            'vad_ms': round(self.vad_ms, 1),
+        }
+        if asr_ms is not None and self.speech_seconds > 0:
+            # Оценка: распознавание идёт примерно пропорционально длине аудио
+            out['saved_ms_est'] = round(asr_ms * skipped / self.speech_seconds - self.vad_ms, 1)
+        return out
+
+
+def _write_speech(ffmpeg: str, src: str, regions: List[Tuple[float, float]], dst: str) -> None:
+    """Переписать только участки речи (по номерам сэмплов PCM) в dst: .wav напрямую, иначе через ffmpeg."""
+    bounds = [(int(s * SAMPLE_RATE) * 2, int(e * SAMPLE_RATE) * 2) for s, e in regions]
+    decoder = subprocess.Popen(_pcm_cmd(ffmpeg, src), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    encoder = None
+    if dst.endswith('.wav'):
+        out = wave.open(dst, 'wb')
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(SAMPLE_RATE)
+        write = out.writeframesraw
+    else:
+        encoder = subprocess.Popen([ffmpeg, '-hide_banner', '-loglevel', 'error', '-y', '-f', 's16le', '-ac', '1',
+                                    '-ar', str(SAMPLE_RATE), '-i', '-', *encoder_args(os.path.splitext(dst)[1][1:]), dst],
+                                   stdin=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        write = encoder.stdin.write  # type: ignore[union-attr]
+    try:
+        pos = 0
+        k = 0
+        while k < len(bounds):
+            data = decoder.stdout.read(1024 * 1024)  # type: ignore[union-attr]
+            if not data:
+                break
+            end_pos = pos + len(data)
+            # Все участки, пересекающиеся с этим блоком
+            while k < len(bounds) and bounds[k][0] < end_pos:
+                lo, hi = max(bounds[k][0], pos), min(bounds[k][1], end_pos)
+                if hi > lo:
+                    write(data[lo - pos:hi - pos])
+                if bounds[k][1] <= end_pos:
+                    k += 1
+                else:
+                    break
+            pos = end_pos
+    finally:
+        decoder.stdout.close()  # type: ignore[union-attr]
+        decoder.kill()
+        decoder.wait()
+        if encoder is None:
+            out.close()
+        else:
+            encoder.stdin.close()  # type: ignore[union-attr]
+            if encoder.wait() != 0:
+                raise RuntimeError('ffmpeg: не удалось закодировать участки речи')
+
+
+def condense(path: str, duration: Optional[float] = None, ext: str = 'wav',
+             backend: Optional[str] = None) -> Optional[SpeechPlan]:
+    """
+    Участки речи -> отдельный файл рядом с исходным
+
+    Args:
+        path: Путь к аудио
+        duration: Длительность, если известна
+        ext: Формат файла речи ('wav' для локальных движков, mp3/ogg для API — см. audio_normalize.upload_ext)
+        backend: Детектор (VAD_BACKEND)
+
+    Returns:
+        SpeechPlan: plan.path — файл речи (удаляет вызывающий), None, если речи почти
+                    столько же, сколько аудио (VAD_MAX_RATIO); сам plan — None, если VAD невозможен
+    """
+    started = time.perf_counter()
+    ffmpeg = find_ffmpeg()
+    try:
+        detected = detect_speech(path, ffmpeg, duration, backend)
+        if not detected:
+            return None
+        regions, duration, backend = detected
+        plan = SpeechPlan(regions, duration, backend)
+        if regions and plan.speech_ratio < env_float('VAD_MAX_RATIO', 0.95):
+            speech_path = f'{os.path.splitext(path)[0]}_speech.{ext}'
+            _write_speech(ffmpeg, path, regions, speech_path)  # type: ignore[arg-type]
+            plan = SpeechPlan(regions, duration, backend, speech_path)
+    except Exception as e:
+        print(f"[WARN] VAD не выполнен: {e}")
+        return None
+    plan.vad_ms = (time.perf_counter() - started) * 1000
+    print(f"[INFO] VAD ({plan.backend}): речь {plan.speech_seconds:.0f} из {plan.duration:.0f} с "
+          f"({plan.speech_ratio:.0%}), участков {len(plan.regions)}, {plan.vad_ms / 1000:.1f} с")
+    return plan
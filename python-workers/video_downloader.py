@@ -4,11 +4,67 @@ Downloader сервис для скачивания YouTube видео
 """
 
 import os
+import re
 import json
 import sys
+import time
+import queue
+import threading
 from pathlib import Path
-import yt_dlp
-from typing import Any, Dict, List, Optional, Callable, cast
+from typing import Any, Dict, List, Optional, Callable, Tuple, cast
+from ytdlp_cache import client_key, get_info_cache
+from client_stats import get_client_stats
+from fragment_tuner import get_fragment_tuner
+from download_queue import DownloadQueue, get_download_queue, priority_rank
+from download_manifest import get_download_manifest
+from startup_probe import probe_startup
+from batch_jsonl import Emit, batch_stdout, exit_no_jobs, read_batch_jobs, run_jsonl_batch
+from worker_common import env_float, env_int
+
+# yt_dlp импортируется внутри методов: --yt-dlp-version и --env-dump его не загружают
+
+# Варианты player_client для скачивания; порядок — исходный, пока нет статистики (client_stats.py)
+CLIENT_VARIANTS: List[Optional[List[str]]] = [
+    None,
+    ['android'],
+    ['web'],
+    ['ios'],
+    ['tv'],
+    ['android', 'web'],
+]
+
+
+def yt_dlp_version_info() -> Dict[str, Any]:
+    """Версия и путь yt_dlp без импорта пакета (метаданные дистрибутива / version.py)."""
+    import importlib.util
+    ver = 'unknown'
+    origin = None
+    try:
+        spec = importlib.util.find_spec('yt_dlp')
+        origin = spec.origin if spec else None
+    except Exception:
+        origin = None
+    try:
+        from importlib.metadata import version
+        ver = version('yt-dlp')
+    except Exception:
+        # Установка без метаданных (например, исходники рядом): читаем yt_dlp/version.py
+        try:
+            if origin:
+                with open(os.path.join(os.path.dirname(origin), 'version.py'), 'r', encoding='utf-8') as f:
+                    m = re.search(r"^__version__\s*=\s*['\"]([^'\"]+)['\"]", f.read(), re.M)
+                    if m:
+                        ver = m.group(1)
+        except Exception:
+            pass
+    if ver == 'unknown' and origin:
+        # Последний вариант — обычный импорт
+        try:
+            import yt_dlp
+            ver = getattr(yt_dlp, '__version__', 'unknown')
+        except Exception:
+            pass
+    return {'version': ver, 'file': origin}
 
 
 class VideoDownloader:
@@ -23,15 +79,64 @@ class VideoDownloader:
         self.download_dir.mkdir(exist_ok=True)
         # Путь к cookies.txt (если присутствует рядом со скриптом)
         self.cookies_file = (Path(__file__).parent / 'cookies.txt')
+        # Общий дисковый кэш info-словарей yt-dlp (YTDLP_CACHE=0 — отключить)
+        self.info_cache = get_info_cache()
         # Предупреждение о старой версии yt-dlp
         try:
-            ver = getattr(yt_dlp, '__version__', '0')
+            ver = yt_dlp_version_info()['version']
             # Очень грубая проверка: если год < 2025, советуем обновить
             if isinstance(ver, str) and ver[:4].isdigit() and int(ver[:4]) < 2025:
                 print(f"[WARN] yt-dlp version {ver} may be outdated. Consider updating to latest to avoid YouTube changes.")
         except Exception:
             pass
     
+    def _extract_info(
+        self,
+        video_id: str,
+        ydl_opts: Dict[str, Any],
+        clients: Optional[List[str]] = None,
+        need_streams: bool = True,
+    ) -> Optional[Dict[str, Any]]:
+        """extract_info(download=False) через кэш по (video_id, player client, format).
+
+        Args:
+            ydl_opts: Опции YoutubeDL (player_client уже должен быть проставлен, если нужен)
+            clients: Список player_client — часть ключа кэша
+            need_streams: Нужны ли непросроченные ссылки на потоки
+        """
+        import yt_dlp
+
+        ckey = client_key(clients)
+        fmt = str(ydl_opts.get('format') or '')
+        cached = self.info_cache.get(video_id, ckey, fmt, need_streams=need_streams)
+        if cached is not None:
+            return cached
+        # Исход и время реального извлечения — в статистику клиентов (порядок попыток, --env-dump)
+        started = time.perf_counter()
+        try:
+            with yt_dlp.YoutubeDL(cast(Any, ydl_opts)) as ydl:
+                info = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
+                if info:
+                    info = ydl.sanitize_info(info)
+        except Exception as e:
+            get_client_stats().record(clients, False, (time.perf_counter() - started) * 1000, str(e))
+            raise
+        get_client_stats().record(clients, bool(info), (time.perf_counter() - started) * 1000,
+                                  None if info else 'empty info')
+        if not info:
+            return info
+        self.info_cache.put(video_id, ckey, fmt, info)
+        return info
+
+    @staticmethod
+    def _record_download(clients: Optional[List[str]], started: float, error: Optional[str] = None) -> None:
+        """Исход скачивания для статистики клиентов: время успеха включает само скачивание — его не учитываем."""
+        if error is None:
+            get_client_stats().record(clients, True)
+        elif 'Requested format is not available' not in error:
+            # Нет нужного формата — свойство ролика, а не поломка клиента
+            get_client_stats().record(clients, False, (time.perf_counter() - started) * 1000, error)
+
     def get_video_formats(self, video_id: str) -> List[Dict[str, Any]]:
         """
         Получить доступные форматы видео
@@ -50,29 +155,28 @@ class VideoDownloader:
             if self.cookies_file.exists():
                 ydl_opts['cookiefile'] = str(self.cookies_file)
             
-            with yt_dlp.YoutubeDL(cast(Any, ydl_opts)) as ydl:
-                info = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
-                
-                formats: List[Dict[str, Any]] = []
-                formats_list = info.get('formats') or []
-                for f in formats_list:
-                    if f.get('vcodec') != 'none' and f.get('acodec') != 'none':  # Видео + аудио
-                        formats.append({
-                            'format_id': f.get('format_id'),
-                            'ext': f.get('ext'),
-                            'resolution': f.get('resolution'),
-                            'height': f.get('height'),
-                            'width': f.get('width'),
-                            'fps': f.get('fps'),
-                            'filesize': f.get('filesize'),
-                            'vcodec': f.get('vcodec'),
-                            'acodec': f.get('acodec'),
-                            'url': f.get('url'),
-                        })
-                
-                # Сортировать по высоте (качеству)
-                formats.sort(key=lambda x: x.get('height', 0) if x.get('height') else 0, reverse=True)
-                return formats
+            info = self._extract_info(video_id, ydl_opts) or {}
+
+            formats: List[Dict[str, Any]] = []
+            formats_list = info.get('formats') or []
+            for f in formats_list:
+                if f.get('vcodec') != 'none' and f.get('acodec') != 'none':  # Видео + аудио
+                    formats.append({
+                        'format_id': f.get('format_id'),
+                        'ext': f.get('ext'),
+                        'resolution': f.get('resolution'),
+                        'height': f.get('height'),
+                        'width': f.get('width'),
+                        'fps': f.get('fps'),
+                        'filesize': f.get('filesize'),
+                        'vcodec': f.get('vcodec'),
+                        'acodec': f.get('acodec'),
+                        'url': f.get('url'),
+                    })
+
+            # Сортировать по высоте (качеству)
+            formats.sort(key=lambda x: x.get('height', 0) if x.get('height') else 0, reverse=True)
+            return formats
                 
         except Exception as e:
             print(f"[ERR] Ошибка получения форматов: {e}")
@@ -95,8 +199,7 @@ class VideoDownloader:
                 base_opts['cookiefile'] = str(self.cookies_file)
 
             # Первый проход: общая информация и formats
-            with yt_dlp.YoutubeDL(cast(Any, base_opts)) as ydl:
-                info = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
+            info = self._extract_info(video_id, base_opts, need_streams=False)
 
             if not info:
                 return { 'success': False, 'video_id': video_id, 'error': 'Failed to extract info' }
@@ -132,8 +235,7 @@ class VideoDownloader:
             try:
                 opts2 = dict(base_opts)
                 opts2['format'] = 'bestvideo*+bestaudio*/bestvideo+bestaudio/best'
-                with yt_dlp.YoutubeDL(cast(Any, opts2)) as y2:
-                    req_info = y2.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
+                req_info = self._extract_info(video_id, opts2, need_streams=False)
             except Exception as e:
                 req_info = {'error': str(e)}
 
@@ -187,8 +289,22 @@ class VideoDownloader:
         Returns:
             dict: Информация о скачанном файле
         """
+        manifest = get_download_manifest()
+        # Одно видео в папке качает одно задание: второе дождётся и, скорее всего, получит готовый файл
+        with manifest.claim(str(self.download_dir), video_id):
+            return self._download_video(video_id, quality, progress_callback, manifest)
+
+    def _download_video(self, video_id: str, quality: str,
+                        progress_callback: Optional[Callable[[Dict[str, Any]], None]], manifest: Any) -> Dict[str, Any]:
+        # Тот же файл уже скачан и не изменился — ответ из манифеста, без yt-dlp
+        cached = manifest.lookup(str(self.download_dir), video_id, quality)
+        if cached:
+            print(f"[INFO] {video_id}: уже скачано — {cached.get('filename')}")
+            return cached
+
         try:
             import shutil
+            import yt_dlp
             has_ffmpeg = shutil.which('ffmpeg') is not None or shutil.which('ffmpeg.exe') is not None
 
             # Форматы: сначала пробуем прогрессивные (muxed), затем fallback на объединение видео+аудио (если есть ffmpeg)
@@ -216,7 +332,11 @@ class VideoDownloader:
                 'noplaylist': True,
                 'extractor_retries': 3,
                 'retries': 3,
-                'concurrent_fragment_downloads': 1,
+                # Повтор после обрыва докачивает с места (.part сверен с потоком, download_manifest.py);
+                # пропущенный фрагмент — ошибка, а не дырявый файл
+                'continuedl': True,
+                'fragment_retries': 10,
+                'skip_unavailable_fragments': False,
                 'geo_bypass': True,
                 'geo_bypass_country': 'US',
                 'http_headers': {
@@ -228,33 +348,37 @@ class VideoDownloader:
             if self.cookies_file.exists():
                 base_opts['cookiefile'] = str(self.cookies_file)
 
-            if progress_callback:
-                base_opts['progress_hooks'] = [progress_callback]
+            # Параллельность фрагментов DASH/HLS подбирается между скачиваниями (fragment_tuner.py)
+            tuner = get_fragment_tuner()
+            hooks = [progress_callback] if progress_callback else []
 
-            # Попробуем разные клиенты YouTube (иногда помогает обойти nsig и 400)
-            client_variants = [
-                None,
-                ['android'],
-                ['web'],
-                ['ios'],
-                ['tv'],
-                ['android', 'web'],
-            ]
+            # Попробуем разные клиенты YouTube (иногда помогает обойти nsig и 400);
+            # первым идёт тот, что сейчас лучше работает (client_stats.py)
+            client_variants = CLIENT_VARIANTS
 
             last_err: Optional[str] = None
 
             # 1) Попытка прогрессивного формата
-            for clients in client_variants:
+            for clients in get_client_stats().order(client_variants):
                 opts = dict(base_opts)
                 opts['format'] = prog_fmt
                 if clients:
                     opts['extractor_args'] = { 'youtube': { 'player_client': clients, 'po_token_sources': ['auto'] } }
+                lease = tuner.lease()
+                opts['concurrent_fragment_downloads'] = lease.concurrency
+                opts['progress_hooks'] = [lease.hook, *hooks]
+                started = time.perf_counter()
+                resume: Dict[str, Any] = {}
                 try:
                     with yt_dlp.YoutubeDL(cast(Any, opts)) as ydl:
+                        ydl.add_post_processor(manifest.before_dl(video_id, resume), when='before_dl')
+                        ydl.add_post_processor(lease.before_dl(), when='before_dl')
                         info = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=True)
+                        self._record_download(clients, started)
+                        fragments = lease.release()
                         filename = ydl.prepare_filename(info)
                         filesize = os.path.getsize(filename) if os.path.exists(filename) else 0
-                        return {
+                        result = {
                             'success': True,
                             'video_id': video_id,
                             'title': info.get('title'),
@@ -264,22 +388,39 @@ class VideoDownloader:
                             'resolution': f"{info.get('width')}x{info.get('height')}",
                             'format': info.get('format'),
                             'ext': info.get('ext'),
+                            'fragments': fragments,
+                            'resume': resume or None,
                         }
+                        result['manifest'] = manifest.record(str(self.download_dir), video_id, quality, result, info)
+                        return result
                 except Exception as e1:
                     last_err = str(e1)
+                    self._record_download(clients, started, last_err)
+                    lease.fail(last_err)
                     continue
+                finally:
+                    lease.release()
 
             # 2) Фолбэк: объединение bestvideo+bestaudio (если есть ffmpeg)
             if has_ffmpeg:
-                for clients in client_variants:
+                for clients in get_client_stats().order(client_variants):
                     opts = dict(base_opts)
                     opts['format'] = merge_fmt
                     opts['merge_output_format'] = 'mp4'
                     if clients:
                         opts['extractor_args'] = { 'youtube': { 'player_client': clients, 'po_token_sources': ['auto'] } }
+                    lease = tuner.lease()
+                    opts['concurrent_fragment_downloads'] = lease.concurrency
+                    opts['progress_hooks'] = [lease.hook, *hooks]
+                    started = time.perf_counter()
+                    resume = {}
                     try:
                         with yt_dlp.YoutubeDL(cast(Any, opts)) as ydl:
+                            ydl.add_post_processor(manifest.before_dl(video_id, resume), when='before_dl')
+                            ydl.add_post_processor(lease.before_dl(), when='before_dl')
                             info = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=True)
+                            self._record_download(clients, started)
+                            fragments = lease.release()
                             filename = ydl.prepare_filename(info)
                             # Если итоговый контейнер mp4 — имя может уже быть mp4
                             if not filename.lower().endswith('.mp4'):
@@ -287,7 +428,7 @@ class VideoDownloader:
                                 if os.path.exists(mp4):
                                     filename = mp4
                             filesize = os.path.getsize(filename) if os.path.exists(filename) else 0
-                            return {
+                            result = {
                                 'success': True,
                                 'video_id': video_id,
                                 'title': info.get('title'),
@@ -297,10 +438,19 @@ class VideoDownloader:
                                 'resolution': f"{info.get('width')}x{info.get('height')}",
                                 'format': info.get('format'),
                                 'ext': 'mp4',
+                                'fragments': fragments,
+                                'resume': resume or None,
                             }
+                            result['manifest'] = manifest.record(str(self.download_dir), video_id, quality, result,
+                                                                 info)
+                            return result
                     except Exception as e2:
                         last_err = str(e2)
+                        self._record_download(clients, started, last_err)
+                        lease.fail(last_err)
                         continue
+                    finally:
+                        lease.release()
 
             # Если ничего не получилось
             raise RuntimeError(last_err or 'Requested format is not available')
@@ -348,17 +498,16 @@ class VideoDownloader:
 
             last_error: Optional[str] = None
             info = None
-            for clients in client_variants:
+            for clients in get_client_stats().order(client_variants):
                 ydl_opts = dict(base_opts)
                 if clients:
                     ydl_opts['extractor_args'] = { 'youtube': { 'player_client': clients } }
                 # Игнорируем ошибки форматов, если вдруг нет нужных
                 ydl_opts['ignore_no_formats_error'] = True
                 try:
-                    with yt_dlp.YoutubeDL(cast(Any, ydl_opts)) as ydl:
-                        info = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
-                        if info:
-                            break
+                    info = self._extract_info(video_id, ydl_opts, clients)
+                    if info:
+                        break
                 except Exception as e1:
                     last_error = str(e1)
                     continue
@@ -402,20 +551,19 @@ class VideoDownloader:
                     ydl_opts2 = dict(base_opts)
                     ydl_opts2['format'] = 'best[ext=mp4][vcodec!=none][acodec!=none]/best[acodec!=none]/best'
                     ydl_opts2['ignore_no_formats_error'] = True
-                    with yt_dlp.YoutubeDL(cast(Any, ydl_opts2)) as ydl2:
-                        info2 = ydl2.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
-                        if info2 and info2.get('url'):
-                            return {
-                                'success': True,
-                                'video_id': video_id,
-                                'title': info2.get('title') or title,
-                                'url': info2.get('url'),
-                                'ext': info2.get('ext') or 'mp4',
-                                'height': info2.get('height'),
-                                'width': info2.get('width'),
-                                'filesize': info2.get('filesize'),
-                                'format_id': info2.get('format_id'),
-                            }
+                    info2 = self._extract_info(video_id, ydl_opts2)
+                    if info2 and info2.get('url'):
+                        return {
+                            'success': True,
+                            'video_id': video_id,
+                            'title': info2.get('title') or title,
+                            'url': info2.get('url'),
+                            'ext': info2.get('ext') or 'mp4',
+                            'height': info2.get('height'),
+                            'width': info2.get('width'),
+                            'filesize': info2.get('filesize'),
+                            'format_id': info2.get('format_id'),
+                        }
                 except Exception as e2:
                     last_error = str(e2)
 
@@ -437,6 +585,132 @@ class VideoDownloader:
             print(f"[ERR] Ошибка получения прямого URL: {e}")
             return { 'success': False, 'error': str(e), 'video_id': video_id }
 
+    @staticmethod
+    def _pick_av(info: Dict[str, Any], quality: str) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Лучшие раздельные видео (mp4/avc, высота <= quality) и аудио (m4a/aac, abr) из info['formats']."""
+        formats_list = info.get('formats') or []
+
+        videos = [f for f in formats_list if f.get('vcodec') != 'none' and f.get('acodec') == 'none' and f.get('url')]
+        audios = [f for f in formats_list if f.get('acodec') != 'none' and f.get('vcodec') == 'none' and f.get('url')]
+
+        def height_ok(fh, q):
+            if not fh:
+                return False
+            if q == 'highest':
+                return True
+            try:
+                return int(fh) <= int(q)
+            except Exception:
+                return True
+
+        cand_v = [f for f in videos if height_ok(f.get('height'), quality)] or videos
+        cand_v.sort(key=lambda f: ((f.get('ext') == 'mp4') or ('avc' in str(f.get('vcodec','')) or 'h264' in str(f.get('vcodec',''))), f.get('height') or 0), reverse=True)
+        best_v = cand_v[0] if cand_v else None
+
+        audios.sort(key=lambda f: ((f.get('ext') == 'm4a') or ('aac' in str(f.get('acodec','')) or 'mp4a' in str(f.get('acodec',''))), f.get('abr') or 0), reverse=True)
+        best_a = audios[0] if audios else None
+        return best_v, best_a
+
+    def _extract_hedged(
+        self,
+        video_id: str,
+        base_opts: Dict[str, Any],
+        variants: List[Optional[List[str]]],
+        accept: Callable[[Dict[str, Any]], bool],
+        delay: Optional[float] = None,
+        max_parallel: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Извлечение с хеджем по вариантам player_client.
+
+        Первый вариант стартует сразу, следующий — через delay сек без ответа или
+        сразу после неудачи; одновременно не больше max_parallel. Побеждает первый
+        по времени info, прошедший accept; ещё не начатые варианты не запускаются,
+        начатые дорабатывают в фоне (yt-dlp не прерывается) и игнорируются.
+
+        Args:
+            variants: Варианты player_client в порядке попыток (None — по умолчанию yt-dlp)
+            accept: Подходит ли info (например, есть раздельные видео и аудио)
+            delay: Задержка хеджа, сек (AV_HEDGE_DELAY, 2; 0 — все сразу в пределах max_parallel)
+            max_parallel: Одновременных извлечений (AV_HEDGE_MAX, 3; 1 — по очереди, как раньше)
+
+        Returns:
+            dict: { info — победитель или первый по порядку непустой info, error — последняя ошибка,
+                    report: { winner, ms, launched, attempts: [{client, status, ms, error?}] } }
+        """
+        delay = max(0.0, env_float('AV_HEDGE_DELAY', 2.0) if delay is None else delay)
+        max_parallel = max(1, env_int('AV_HEDGE_MAX', 3) if max_parallel is None else max_parallel)
+        results: 'queue.Queue[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]' = queue.Queue()
+        attempts = [{'client': client_key(v), 'status': 'not_started', 'ms': None} for v in variants]
+        infos: Dict[int, Dict[str, Any]] = {}
+
+        def run(i: int, t0: float) -> None:
+            clients = variants[i]
+            ydl_opts = dict(base_opts)
+            if clients:
+                ydl_opts['extractor_args'] = { 'youtube': { 'player_client': clients } }
+            try:
+                results.put((i, self._extract_info(video_id, ydl_opts, clients), None))
+            except Exception as e:
+                results.put((i, None, str(e)))
+            finally:
+                attempts[i]['ms'] = int((time.perf_counter() - t0) * 1000)
+
+        started = time.perf_counter()
+        next_i, running = 0, 0
+        last_launch = 0.0
+        launch_now = True
+        winner: Optional[int] = None
+        last_error: Optional[str] = None
+        while winner is None and (running or next_i < len(variants)):
+            now = time.perf_counter()
+            timeout = None
+            if next_i < len(variants) and running < max_parallel:
+                if launch_now or now - last_launch >= delay:
+                    # Потоки-демоны: проигравшие извлечения не держат процесс CLI после ответа
+                    attempts[next_i]['status'] = 'running'
+                    threading.Thread(target=run, args=(next_i, now), daemon=True,
+                                     name=f'extract-{attempts[next_i]["client"]}').start()
+                    next_i, running, last_launch, launch_now = next_i + 1, running + 1, now, False
+                    continue
+                timeout = delay - (now - last_launch)
+            try:
+                i, info, error = results.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            running -= 1
+            if info and accept(info):
+                attempts[i]['status'] = 'ok'
+                infos[i] = info
+                winner = i
+                break
+            if info:
+                attempts[i]['status'] = 'rejected'
+                infos[i] = info
+            else:
+                attempts[i]['status'] = 'error'
+                if error:
+                    attempts[i]['error'] = error[:200]
+                    last_error = error
+            # Неудача — следующий вариант сразу, не дожидаясь задержки
+            launch_now = True
+        for a in attempts:
+            if a['status'] == 'running':
+                a['status'] = 'discarded'
+            elif a['status'] == 'not_started' and winner is not None:
+                a['status'] = 'cancelled'
+
+        if winner is None and infos:
+            winner_info: Optional[Dict[str, Any]] = infos[min(infos)]
+        else:
+            winner_info = infos.get(winner) if winner is not None else None
+        report = {
+            'winner': attempts[winner]['client'] if winner is not None else None,
+            'ms': int((time.perf_counter() - started) * 1000),
+            'launched': next_i,
+            'attempts': attempts,
+        }
+        return {'info': winner_info, 'error': last_error, 'report': report}
+
     def get_best_av_urls(self, video_id: str, quality: str = 'highest') -> Dict[str, Any]:
         """Получить лучшие раздельные потоки видео и аудио (для последующего mux-а).
 
@@ -459,48 +733,21 @@ class VideoDownloader:
             if self.cookies_file.exists():
                 base_opts['cookiefile'] = str(self.cookies_file)
 
-            # 1) Попробуем, как есть, получить раздельные форматы из formats
+            # 1) Раздельные форматы из formats. Клиенты перебираются с хеджем: следующий стартует через
+            # AV_HEDGE_DELAY сек или сразу после неудачи, не больше AV_HEDGE_MAX одновременно;
+            # побеждает первый info с раздельными видео и аудио
             client_variants = [None, ['web'], ['android'], ['android', 'web'], ['ios'], ['tv']]
-            last_error = None
-            info = None
-            for clients in client_variants:
-                ydl_opts = dict(base_opts)
-                if clients:
-                    ydl_opts['extractor_args'] = { 'youtube': { 'player_client': clients } }
-                try:
-                    with yt_dlp.YoutubeDL(cast(Any, ydl_opts)) as ydl:
-                        info = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
-                        if info:
-                            break
-                except Exception as e1:
-                    last_error = str(e1)
-                    continue
+            hedged = self._extract_hedged(video_id, base_opts, get_client_stats().order(client_variants),
+                                          accept=lambda i: all(self._pick_av(i, quality)))
+            info = hedged['info']
+            last_error = hedged['error']
 
             if not info:
-                return { 'success': False, 'error': last_error or 'Failed to extract info', 'video_id': video_id }
+                return { 'success': False, 'error': last_error or 'Failed to extract info', 'video_id': video_id,
+                         'extract': hedged['report'] }
 
             title = info.get('title') or video_id
-            formats_list = info.get('formats') or []
-
-            videos = [f for f in formats_list if f.get('vcodec') != 'none' and f.get('acodec') == 'none' and f.get('url')]
-            audios = [f for f in formats_list if f.get('acodec') != 'none' and f.get('vcodec') == 'none' and f.get('url')]
-
-            def height_ok(fh, q):
-                if not fh:
-                    return False
-                if q == 'highest':
-                    return True
-                try:
-                    return int(fh) <= int(q)
-                except Exception:
-                    return True
-
-            cand_v = [f for f in videos if height_ok(f.get('height'), quality)] or videos
-            cand_v.sort(key=lambda f: ((f.get('ext') == 'mp4') or ('avc' in str(f.get('vcodec','')) or 'h264' in str(f.get('vcodec',''))), f.get('height') or 0), reverse=True)
-            best_v = cand_v[0] if cand_v else None
-
-            audios.sort(key=lambda f: ((f.get('ext') == 'm4a') or ('aac' in str(f.get('acodec','')) or 'mp4a' in str(f.get('acodec',''))), f.get('abr') or 0), reverse=True)
-            best_a = audios[0] if audios else None
+            best_v, best_a = self._pick_av(info, quality)
 
             if best_v and best_a:
                 return {
@@ -520,38 +767,38 @@ class VideoDownloader:
                         'ext': best_a.get('ext'),
                         'acodec': best_a.get('acodec'),
                         'filesize': best_a.get('filesize'),
-                    }
+                    },
+                    'extract': hedged['report'],
                 }
 
             # 2) Фолбэк через выбор формата 'bestvideo+bestaudio' и чтение requested_formats
             try:
                 ydl_opts2 = dict(base_opts)
                 ydl_opts2['format'] = 'bestvideo*+bestaudio*/bestvideo+bestaudio/best'
-                with yt_dlp.YoutubeDL(cast(Any, ydl_opts2)) as ydl2:
-                    info2 = ydl2.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
-                    req = info2.get('requested_formats') or []
-                    if len(req) >= 2 and req[0].get('url') and req[1].get('url'):
-                        v = req[0] if req[0].get('vcodec') != 'none' else req[1]
-                        a = req[1] if v is req[0] else req[0]
-                        return {
-                            'success': True,
-                            'video_id': video_id,
-                            'title': info2.get('title') or title,
-                            'video': {
-                                'url': v.get('url'),
-                                'ext': v.get('ext'),
-                                'height': v.get('height'),
-                                'width': v.get('width'),
-                                'vcodec': v.get('vcodec'),
-                                'filesize': v.get('filesize'),
-                            },
-                            'audio': {
-                                'url': a.get('url'),
-                                'ext': a.get('ext'),
-                                'acodec': a.get('acodec'),
-                                'filesize': a.get('filesize'),
-                            }
+                info2 = self._extract_info(video_id, ydl_opts2) or {}
+                req = info2.get('requested_formats') or []
+                if len(req) >= 2 and req[0].get('url') and req[1].get('url'):
+                    v = req[0] if req[0].get('vcodec') != 'none' else req[1]
+                    a = req[1] if v is req[0] else req[0]
+                    return {
+                        'success': True,
+                        'video_id': video_id,
+                        'title': info2.get('title') or title,
+                        'video': {
+                            'url': v.get('url'),
+                            'ext': v.get('ext'),
+                            'height': v.get('height'),
+                            'width': v.get('width'),
+                            'vcodec': v.get('vcodec'),
+                            'filesize': v.get('filesize'),
+                        },
+                        'audio': {
+                            'url': a.get('url'),
+                            'ext': a.get('ext'),
+                            'acodec': a.get('acodec'),
+                            'filesize': a.get('filesize'),
                         }
+                    }
             except Exception as e3:
                 last_error = str(e3)
 
@@ -576,14 +823,29 @@ class VideoDownloader:
                 'extractor_retries': 2,
                 'ignore_no_formats_error': True,
         """
+        manifest = get_download_manifest()
+        with manifest.claim(str(self.download_dir), video_id):
+            return self._download_audio_only(video_id, progress_callback, manifest)
+
+    def _download_audio_only(self, video_id: str, progress_callback: Optional[Callable[[Dict[str, Any]], None]],
+                             manifest: Any) -> Dict[str, Any]:
+        cached = manifest.lookup(str(self.download_dir), video_id, 'audio')
+        if cached:
+            print(f"[INFO] {video_id}: аудио уже скачано — {cached.get('filename')}")
+            return cached
+
         try:
             import shutil
+            import yt_dlp
             has_ffmpeg = shutil.which('ffmpeg') is not None or shutil.which('ffmpeg.exe') is not None
 
             ydl_opts: Dict[str, Any] = {
                 'format': 'bestaudio[ext=m4a]/bestaudio',
                 'outtmpl': str(self.download_dir / '%(id)s_%(title)s.%(ext)s'),
                 'quiet': False,
+                'continuedl': True,
+                'fragment_retries': 10,
+                'skip_unavailable_fragments': False,
             }
             if self.cookies_file.exists():
                 ydl_opts['cookiefile'] = str(self.cookies_file)
@@ -603,7 +865,9 @@ class VideoDownloader:
             if progress_callback:
                 ydl_opts['progress_hooks'] = [progress_callback]
             
+            resume: Dict[str, Any] = {}
             with yt_dlp.YoutubeDL(cast(Any, ydl_opts)) as ydl:
+                ydl.add_post_processor(manifest.before_dl(video_id, resume), when='before_dl')
                 info = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=True)
                 
                 filename = ydl.prepare_filename(info)
@@ -613,7 +877,7 @@ class VideoDownloader:
                 
                 filesize = os.path.getsize(filename) if os.path.exists(filename) else 0
                 
-                return {
+                result = {
                     'success': True,
                     'video_id': video_id,
                     'title': info.get('title'),
@@ -622,7 +886,10 @@ class VideoDownloader:
                     'duration': info.get('duration'),
                     'format': 'mp3' if has_ffmpeg else info.get('acodec', 'audio'),
                     'ext': 'mp3' if has_ffmpeg else info.get('ext', 'm4a'),
+                    'resume': resume or None,
                 }
+                result['manifest'] = manifest.record(str(self.download_dir), video_id, 'audio', result, info)
+                return result
                 
         except Exception as e:
             print(f"[ERR] Ошибка скачивания аудио: {e}")
@@ -632,6 +899,104 @@ class VideoDownloader:
                 'video_id': video_id,
             }
     
+    def download_many(
+        self,
+        jobs: List[Any],
+        queue: Optional[DownloadQueue] = None,
+        on_progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Скачать несколько видео через общую очередь (download_queue.py)
+
+        Одновременно качается не больше queue.limit видео, все делят полосу
+        queue.bucket, свободный слот получает задача с меньшим приоритетом.
+        Ошибка одного видео не влияет на остальные. Повтор video_id пропускается —
+        остаётся первое задание.
+
+        Args:
+            jobs: video_id или dict {video_id, quality='highest', audio_only=False, priority='bulk'}
+            queue: Очередь (по умолчанию общая для процесса)
+            on_progress: Функция (video_id, event) — event: {status: queued | downloading | finished,
+                         progress, downloaded_bytes, total_bytes, speed, eta}
+            on_result: Функция (result) — результат download_video/download_audio_only
+                       + {priority, queue: {wait_ms, queue_depth}, elapsed_ms}
+
+        Returns:
+            list: Результаты в порядке завершения
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        queue = queue or get_download_queue()
+        normalized: List[Dict[str, Any]] = []
+        seen = set()
+        for j in jobs:
+            job = j if isinstance(j, dict) else {'video_id': j}
+            vid = str(job.get('video_id') or '')
+            if vid in seen:
+                print(f"[WARN] {vid}: повтор в пакете пропущен")
+                continue
+            seen.add(vid)
+            normalized.append(job)
+        # Пул раздаёт задачи по порядку — сначала более приоритетные, внутри приоритета — как во входе
+        ordered = sorted(enumerate(normalized), key=lambda ij: (priority_rank(ij[1].get('priority', 'bulk')), ij[0]))
+        emit = on_progress or (lambda vid, event: None)
+
+        def progress_for(vid: str) -> Callable[[Dict[str, Any]], None]:
+            last = {'pct': -1, 'at': 0.0}
+
+            def hook(d: Dict[str, Any]) -> None:
+                status = d.get('status')
+                if status == 'downloading':
+                    total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+                    done = d.get('downloaded_bytes') or 0
+                    pct = max(1, min(99, int(done * 100 / total))) if total else None
+                    now = time.monotonic()
+                    # yt-dlp зовёт hook на каждый чанк — наружу не чаще смены процента или раза в секунду
+                    if pct == last['pct'] and now - last['at'] < 1.0:
+                        return
+                    last['pct'], last['at'] = pct if pct is not None else -1, now
+                    emit(vid, {'status': 'downloading', 'progress': pct, 'downloaded_bytes': done,
+                               'total_bytes': total or None, 'speed': d.get('speed'), 'eta': d.get('eta')})
+                elif status == 'finished':
+                    emit(vid, {'status': 'finished', 'filename': d.get('filename')})
+            return hook
+
+        def run_one(job: Dict[str, Any]) -> Dict[str, Any]:
+            vid = str(job.get('video_id') or '')
+            priority = job.get('priority', 'bulk')
+            started = time.monotonic()
+            try:
+                with queue.slot(priority) as slot:
+                    callback = slot.wrap(progress_for(vid))
+                    if job.get('audio_only'):
+                        result = self.download_audio_only(vid, callback)
+                    else:
+                        result = self.download_video(vid, str(job.get('quality') or 'highest'), callback)
+                    result['queue'] = slot.info
+            except Exception as e:
+                result = {'success': False, 'error': str(e), 'video_id': vid}
+            result['priority'] = priority
+            result['elapsed_ms'] = int((time.monotonic() - started) * 1000)
+            print(f"[BATCH] {vid}: {'OK' if result.get('success') else 'ERR'} за {result['elapsed_ms']} ms")
+            return result
+
+        for position, (_, job) in enumerate(ordered, 1):
+            emit(str(job.get('video_id') or ''), {'status': 'queued', 'position': position})
+
+        results: List[Dict[str, Any]] = []
+        with ThreadPoolExecutor(max_workers=max(1, min(queue.limit, len(ordered)))) as pool:
+            futures = {pool.submit(run_one, job): job for _, job in ordered}
+            for fut in as_completed(futures):
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    result = {'success': False, 'error': str(e), 'video_id': futures[fut].get('video_id')}
+                results.append(result)
+                if on_result:
+                    on_result(result)
+        return results
+
     def get_download_progress(self, d: Dict[str, Any]) -> None:
         """
         Callback для прогресса скачивания (использовать с progress_hooks)
@@ -652,12 +1017,34 @@ class VideoDownloader:
             print(f"  [OK] Скачивание завершено, обработка...")
 
 
+def run_batch(downloader: 'VideoDownloader', jobs: List[Dict[str, Any]], out) -> int:
+    """
+    Пакетный режим CLI: JSONL в out (исходный stdout), логи — в stderr
+
+    Строки stdout:
+        {"event": "progress", "video_id", "status", "progress", "downloaded_bytes", "total_bytes", "speed", "eta"}
+        {"event": "result", "video_id", "success", "filename" | "error", "priority", "queue", "elapsed_ms", ...}
+        {"event": "summary", "total", "succeeded", "failed", "elapsed_ms", "queue"}
+    """
+    queue = get_download_queue()
+
+    def run(emit: Emit) -> List[Dict[str, Any]]:
+        return downloader.download_many(
+            jobs,
+            queue=queue,
+            on_progress=lambda vid, event: emit({'event': 'progress', 'video_id': vid, **event}),
+            on_result=lambda result: emit({'event': 'result', **result}),
+        )
+
+    return run_jsonl_batch(out, run, lambda: {'queue': queue.stats()})
+
+
 def main():
     """Пример использования"""
     import argparse
     
     parser = argparse.ArgumentParser(description='YouTube Video Downloader')
-    parser.add_argument('video_id', help='YouTube Video ID')
+    parser.add_argument('video_ids', nargs='*', default=[], help='YouTube Video ID (несколько — пакетный режим)')
     parser.add_argument('--quality', default='highest', help='Quality: highest, 1080, 720, 480, 360')
     parser.add_argument('--audio-only', action='store_true', help='Download audio only')
     parser.add_argument('--list-formats', action='store_true', help='List available formats')
@@ -667,10 +1054,49 @@ def main():
     parser.add_argument('--formats-json', action='store_true', help='Print detailed formats JSON and exit')
     parser.add_argument('--yt-dlp-version', action='store_true', help='Print yt-dlp version JSON and exit')
     parser.add_argument('--env-dump', action='store_true', help='Print environment info (python, yt_dlp path/version, cookies) and exit')
+    parser.add_argument('--batch', action='store_true', help='Batch mode: download through one queue, JSONL events on stdout, logs on stderr')
+    parser.add_argument('--ids-file', help='File with video IDs or JSON jobs for batch mode ("-" = stdin)')
+    parser.add_argument('--concurrency', type=int, help='Batch mode: videos downloaded in parallel (default: DOWNLOAD_CONCURRENCY or 2)')
+    parser.add_argument('--bandwidth', type=float, help='Batch mode: total bandwidth for all downloads, MB/s (default: DOWNLOAD_BANDWIDTH_MBPS, 0 = unlimited)')
+    parser.add_argument('--priority', default='bulk', help='Batch mode: default job priority: interactive | bulk | number (lower first)')
     
     args = parser.parse_args()
+
+    batch_mode = bool(args.batch or args.ids_file or len(args.video_ids) > 1)
+    jsonl_out = batch_stdout(batch_mode)
+    if not batch_mode and not args.video_ids and not args.yt_dlp_version:
+        parser.error('VIDEO_ID is required')
+    args.video_id = args.video_ids[0] if args.video_ids else None
     
+    if args.yt_dlp_version:
+        ver = yt_dlp_version_info()['version']
+        probe_startup('yt-dlp-version')
+        try:
+            print(json.dumps({ 'success': True, 'yt_dlp_version': ver }, ensure_ascii=False))
+        except Exception:
+            pass
+        sys.exit(0)
+
     downloader = VideoDownloader(download_dir=args.output_dir)
+    mode = next((m for m, on in (
+        ('formats-json', args.formats_json),
+        ('env-dump', args.env_dump),
+        ('list-formats', args.list_formats),
+        ('direct-url', args.direct_url),
+        ('best-av-urls', args.best_av_urls),
+        ('audio-only', args.audio_only),
+    ) if on), 'download')
+    if batch_mode:
+        probe_startup('batch')
+        jobs = read_batch_jobs(args.video_ids, args.ids_file,
+                               {'quality': args.quality, 'audio_only': args.audio_only, 'priority': args.priority})
+        if not jobs:
+            exit_no_jobs()
+        get_download_queue().configure(args.concurrency, args.bandwidth)
+        sys.exit(run_batch(downloader, jobs, jsonl_out))
+
+    if mode != 'env-dump':
+        probe_startup(mode)
     
     if args.formats_json:
         result = downloader.get_formats_debug(args.video_id)
@@ -680,28 +1106,25 @@ def main():
             pass
         sys.exit(0 if result.get('success') else 1)
 
-    if args.yt_dlp_version:
-        ver = getattr(yt_dlp, '__version__', 'unknown')
-        try:
-            print(json.dumps({ 'success': True, 'yt_dlp_version': ver }, ensure_ascii=False))
-        except Exception:
-            pass
-        sys.exit(0)
-
     if args.env_dump:
-        try:
-            ver = getattr(yt_dlp, '__version__', 'unknown')
-            yfile = getattr(yt_dlp, '__file__', None)
-        except Exception:
-            ver = 'unknown'
-            yfile = None
+        yinfo = yt_dlp_version_info()
+        ver = yinfo['version']
+        yfile = yinfo['file']
         info = {
             'success': True,
             'python_executable': sys.executable,
             'yt_dlp_version': ver,
             'yt_dlp_file': yfile,
             'has_cookies': downloader.cookies_file.exists(),
+            'info_cache': downloader.info_cache.stats(),
+            # Успехи/неудачи (с затуханием) и задержка по player_client, в текущем порядке попыток
+            'player_clients': get_client_stats().table(CLIENT_VARIANTS),
+            # Уровни параллельности фрагментов и скорость на них по хостам CDN
+            'fragment_tuner': get_fragment_tuner().stats(),
+            # Готовые файлы в манифесте и счётчики повторного использования / докачки
+            'download_manifest': get_download_manifest().stats(),
         }
+        probe_startup('env-dump')
         try:
             print(json.dumps(info, ensure_ascii=False))
         except Exception:
@@ -7,18 +7,32 @@
 import os
 import sys
 import json
-from youtube_transcript_api import YouTubeTranscriptApi
-import requests
-from io import BytesIO
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from google.oauth2.credentials import Credentials
-from google.oauth2 import service_account
-import yt_dlp
-from typing import Any, Dict, List, Optional, cast
+from typing import Any, Callable, Dict, List, Optional, Tuple, cast
 import base64
-import subprocess
 import tempfile
+import threading
+import time
+from ytdlp_cache import get_info_cache
+from webvtt import iter_vtt_segments, parse_vtt
+from caption_dedup import merge_segments
+from compact_transcript import compact as compact_transcript, json_default
+from parsed_store import FORMATS as PARSED_FORMATS, default_format, save_parsed
+from whisper_models import get_model_cache
+from asr_backends import resolve_backend
+from asr_scheduler import AsrRejected, get_scheduler
+from asr_budget import budget_seconds, detect_language_enabled, pick_model
+from asr_budget import detect_language as detect_asr_language, record_run as record_asr_run
+from asr_openai import guess_audio_ext
+from vad import condense, vad_enabled
+from range_fetch import download_to_file
+from audio_normalize import normalize_enabled, normalize_url
+from asr_cache import audio_fingerprint, cache_key, get_asr_cache
+from startup_probe import probe_startup
+from batch_jsonl import Emit, batch_stdout, exit_no_jobs, read_batch_jobs, run_jsonl_batch
+
+# Тяжёлые зависимости (yt_dlp, youtube_transcript_api, requests, googleapiclient,
+# google.oauth2) импортируются внутри методов, которым они нужны, — так режимы
+# CLI, которым они не требуются, стартуют быстрее (см. benchmarks.py startup).
 
 try:
     # Грузим .env из корня репозитория (ищем вверх по дереву)
@@ -27,6 +41,61 @@ try:
 except Exception:
     pass
 
+
+class VideoInfoBundle:
+    """
+    Общий результат одной yt-dlp экстракции для всех этапов parse_video.
+
+    info, chapters, дорожки субтитров и ссылка на аудио берутся из одного
+    info-словаря, поэтому на видео за задачу выполняется одна экстракция.
+    Если передан кэш (ytdlp_cache.InfoCache), экстракция выполняется только
+    при промахе: для метаданных достаточно любой свежей записи, для ссылок
+    на потоки/субтитры — записи с непросроченным `expire`.
+    """
+
+    def __init__(self, video_id: str, extractor: Callable[[str], Optional[Dict[str, Any]]],
+                 cache: Any = None, cache_client: str = 'default', cache_fmt: str = ''):
+        self.video_id = video_id
+        self._extractor = extractor
+        self._cache = cache
+        self._cache_client = cache_client
+        self._cache_fmt = cache_fmt
+        self._info: Optional[Dict[str, Any]] = None
+        self._streams_fresh = False
+        self._error: Optional[str] = None
+        self._lock = threading.Lock()
+        # Сколько раз реально ходили в YouTube и сколько раз взяли из кэша
+        self.extractions = 0
+        self.cache_hits = 0
+
+    def get(self, need_streams: bool = True) -> Dict[str, Any]:
+        """Вернуть info-словарь, выполнив экстракцию только при необходимости."""
+        with self._lock:
+            if self._info is not None and (self._streams_fresh or not need_streams):
+                return self._info
+            if self._error is not None:
+                raise RuntimeError(self._error)
+            if self._cache is not None:
+                found = self._cache.fetch(self.video_id, self._cache_client, self._cache_fmt, need_streams)
+                if found:
+                    self.cache_hits += 1
+                    self._info, self._streams_fresh = found
+                    return self._info
+            self.extractions += 1
+            try:
+                info = self._extractor(self.video_id)
+            except Exception as e:
+                self._error = str(e)
+                raise
+            if not info:
+                self._error = 'Failed to extract info'
+                raise RuntimeError(self._error)
+            self._info, self._streams_fresh = info, True
+            if self._cache is not None:
+                self._cache.put(self.video_id, self._cache_client, self._cache_fmt, info)
+            return self._info
+
+
 class VideoParser:
     def __init__(self, google_credentials_path=None):
         """
@@ -37,20 +106,37 @@ class VideoParser:
         """
         self.google_credentials_path = google_credentials_path
         self._creds_info: Optional[Dict[str, Any]] = None
-        self.sheets_service = None
+        self._sheets_service = None
+        self._sheets_ready = False
+        # Клиент googleapiclient не потокобезопасен: запись в таблицу — по одному потоку
+        self._sheets_lock = threading.Lock()
+        self._sheets_init_lock = threading.Lock()
         # Подхватываем cookies.txt рядом со скриптом (если есть)
         self.cookies_file = os.path.join(os.path.dirname(__file__), 'cookies.txt')
+        # Общий дисковый кэш info-словарей yt-dlp (YTDLP_CACHE=0 — отключить)
+        self.info_cache = get_info_cache()
         
-        # Инициализация Google Sheets по приоритетам источников:
+        # Поиск кредов Google Sheets по приоритетам источников (клиент создаётся лениво, см. sheets_service):
         # 1) Явно переданный путь --credentials
         # 2) GOOGLE_CREDENTIALS_PATH
         # 3) GOOGLE_APPLICATION_CREDENTIALS (стандарт Google)
         # 4) GOOGLE_CREDENTIALS_JSON (прямой JSON или base64)
         # 5) Локальный файл рядом: python-workers/google-credentials.json
-        self._resolve_and_init_google_creds()
+        self._resolve_google_creds()
+
+    @property
+    def sheets_service(self):
+        """Клиент Google Sheets API; создаётся при первом обращении (None, если кредов нет)."""
+        if not self._sheets_ready:
+            with self._sheets_init_lock:
+                if not self._sheets_ready:
+                    if self.google_credentials_path or self._creds_info:
+                        self._init_google_sheets()
+                    self._sheets_ready = True
+        return self._sheets_service
 
-    def _resolve_and_init_google_creds(self):
-        """Определить учетные данные для Google и инициализировать клиент Sheets."""
+    def _resolve_google_creds(self):
+        """Определить учетные данные для Google (без импорта клиентских библиотек)."""
         try:
             # Список кандидатов-файлов
             file_candidates: List[str] = []
@@ -68,7 +154,7 @@ class VideoParser:
             for p in file_candidates:
                 if p and os.path.exists(p):
                     self.google_credentials_path = p
-                    return self._init_google_sheets()
+                    return
 
             # Если файлов нет — пробуем переменную GOOGLE_CREDENTIALS_JSON
             raw = os.environ.get('GOOGLE_CREDENTIALS_JSON')
@@ -85,8 +171,9 @@ class VideoParser:
                     except Exception:
                         info = None
                 if info and isinstance(info, dict):
+                    self.google_credentials_path = None
                     self._creds_info = info
-                    return self._init_google_sheets()
+                    return
 
             print("[INFO] Google Sheets креды не найдены: используйте --credentials или переменные окружения GOOGLE_CREDENTIALS_PATH/GOOGLE_APPLICATION_CREDENTIALS/GOOGLE_CREDENTIALS_JSON")
         except Exception as e:
@@ -95,6 +182,9 @@ class VideoParser:
     def _init_google_sheets(self):
         """Инициализация Google Sheets API из файла или из словаря creds info."""
         try:
+            from googleapiclient.discovery import build
+            from google.oauth2 import service_account
+
             SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
             creds_obj = None
             if self.google_credentials_path and os.path.exists(self.google_credentials_path):
@@ -108,106 +198,103 @@ class VideoParser:
 
             if not creds_obj:
                 print("[WARN] Креды Google не заданы")
-                self.sheets_service = None
+                self._sheets_service = None
                 return
 
-            self.sheets_service = build('sheets', 'v4', credentials=creds_obj)
+            self._sheets_service = build('sheets', 'v4', credentials=creds_obj)
             print("[OK] Google Sheets API инициализирован")
         except Exception as e:
             print(f"[ERR] Ошибка инициализации Google Sheets: {e}")
-            self.sheets_service = None
+            self._sheets_service = None
     
-    def get_video_info(self, video_id: str) -> Optional[Dict[str, Any]]:
+    def _extract_info(self, video_id: str) -> Optional[Dict[str, Any]]:
+        """Одна полная yt-dlp экстракция без скачивания (android client)."""
+        import yt_dlp
+
+        ydl_opts: Dict[str, Any] = {
+            'quiet': True,
+            'no_warnings': True,
+            'extract_flat': False,
+            # Важно: не пытаться подбирать недоступные форматы при download=False
+            'skip_download': True,               # алиас simulate=True
+            'ignore_no_formats_error': True,     # не падать, если формат не найден
+            'format': 'best/bestvideo+bestaudio',# безопасный формат на случай потребности
+            'extractor_args': {
+                'youtube': {
+                    'player_client': ['android']
+                }
+            }
+        }
+        if os.path.exists(self.cookies_file):
+            ydl_opts['cookiefile'] = self.cookies_file
+
+        with yt_dlp.YoutubeDL(cast(Any, ydl_opts)) as ydl:
+            info = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
+            # JSON-совместимый вид, чтобы info можно было положить в кэш
+            return ydl.sanitize_info(info) if info else info
+
+    def new_info_bundle(self, video_id: str) -> VideoInfoBundle:
+        """Создать общий info-bundle для одной задачи по видео."""
+        return VideoInfoBundle(video_id, self._extract_info, cache=self.info_cache, cache_client='android')
+
+    def get_video_info(self, video_id: str, bundle: Optional[VideoInfoBundle] = None) -> Optional[Dict[str, Any]]:
         """
         Получить базовую информацию о видео
         
         Args:
             video_id: YouTube video ID
+            bundle: Общий info-bundle задачи (если None — создаётся свой)
             
         Returns:
             dict: Информация о видео
         """
         try:
-            ydl_opts: Dict[str, Any] = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': False,
-                # Важно: не пытаться подбирать недоступные форматы при download=False
-                'skip_download': True,               # алиас simulate=True
-                'ignore_no_formats_error': True,     # не падать, если формат не найден
-                'format': 'best/bestvideo+bestaudio',# безопасный формат на случай потребности
-                'extractor_args': {
-                    'youtube': {
-                        'player_client': ['android']
-                    }
-                }
+            info = (bundle or self.new_info_bundle(video_id)).get(need_streams=False)
+            return {
+                'video_id': video_id,
+                'title': info.get('title'),
+                'description': info.get('description'),
+                'duration': info.get('duration'),
+                'channel': info.get('channel'),
+                'channel_id': info.get('channel_id'),
+                'upload_date': info.get('upload_date'),
+                'view_count': info.get('view_count'),
+                'like_count': info.get('like_count'),
+                'categories': info.get('categories', []),
+                'tags': info.get('tags', []),
             }
-            if os.path.exists(self.cookies_file):
-                ydl_opts['cookiefile'] = self.cookies_file
-            
-            with yt_dlp.YoutubeDL(cast(Any, ydl_opts)) as ydl:
-                info = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
-                
-                return {
-                    'video_id': video_id,
-                    'title': info.get('title'),
-                    'description': info.get('description'),
-                    'duration': info.get('duration'),
-                    'channel': info.get('channel'),
-                    'channel_id': info.get('channel_id'),
-                    'upload_date': info.get('upload_date'),
-                    'view_count': info.get('view_count'),
-                    'like_count': info.get('like_count'),
-                    'categories': info.get('categories', []),
-                    'tags': info.get('tags', []),
-                }
         except Exception as e:
             print(f"[ERR] Ошибка получения информации о видео: {e}")
             return None
     
-    def get_chapters(self, video_id: str) -> List[Dict[str, Any]]:
+    def get_chapters(self, video_id: str, bundle: Optional[VideoInfoBundle] = None) -> List[Dict[str, Any]]:
         """
         Извлечь таймкоды (chapters) из видео
         
         Args:
             video_id: YouTube video ID
+            bundle: Общий info-bundle задачи (если None — создаётся свой)
             
         Returns:
             list: Список таймкодов с названиями
         """
         try:
-            ydl_opts: Dict[str, Any] = {
-                'quiet': True,
-                'no_warnings': True,
-                'skip_download': True,
-                'ignore_no_formats_error': True,
-                'format': 'best/bestvideo+bestaudio',
-                'extractor_args': {
-                    'youtube': {
-                        'player_client': ['android']
+            info = (bundle or self.new_info_bundle(video_id)).get(need_streams=False)
+            chapters = info.get('chapters', [])
+            
+            if chapters:
+                return [
+                    {
+                        'start_time': ch.get('start_time'),
+                        'end_time': ch.get('end_time'),
+                        'title': ch.get('title'),
                     }
-                }
-            }
-            if os.path.exists(self.cookies_file):
-                ydl_opts['cookiefile'] = self.cookies_file
+                    for ch in chapters
+                ]
             
-            with yt_dlp.YoutubeDL(cast(Any, ydl_opts)) as ydl:
-                info = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
-                chapters = info.get('chapters', [])
-                
-                if chapters:
-                    return [
-                        {
-                            'start_time': ch.get('start_time'),
-                            'end_time': ch.get('end_time'),
-                            'title': ch.get('title'),
-                        }
-                        for ch in chapters
-                    ]
-                
-                # Если нет chapters, попробовать извлечь из description
-                description = info.get('description', '')
-                return self._parse_chapters_from_description(description)
+            # Если нет chapters, попробовать извлечь из description
+            description = info.get('description', '')
+            return self._parse_chapters_from_description(description)
                 
         except Exception as e:
             print(f"[ERR] Ошибка получения таймкодов: {e}")
@@ -245,44 +332,60 @@ class VideoParser:
         
         return chapters
     
-    def get_transcript(self, video_id, languages=['en', 'ru'], translate_to: str | None = None):
+    def get_transcript(self, video_id, languages=['en', 'ru'], translate_to: str | None = None,
+                       bundle: Optional[VideoInfoBundle] = None):
         """
         Получить транскрипт (автогенерируемые или ручные субтитры)
+
+        Список дорожек запрашивается один раз, затем кандидаты скачиваются
+        параллельно. Победитель выбирается по приоритету: ручные > автогенерируемые >
+        перевод > yt-dlp, в порядке languages. Как только готов результат, выше
+        которого никто не может оказаться, оставшиеся попытки отменяются.
+        Фолбэк yt-dlp стартует с задержкой TRANSCRIPT_FALLBACK_DELAY (хедж) или
+        сразу, когда все кандидаты API уже отвалились.
         
         Args:
             video_id: YouTube video ID
             languages: Список предпочитаемых языков
+            translate_to: Язык автоперевода, если нет субтитров на нужных языках
+            bundle: Общий info-bundle задачи для фолбэка через yt-dlp
             
         Returns:
-            dict: Транскрипт с временными метками
+            dict: Транскрипт с временными метками; в 'resolver' — победитель и время каждой попытки
         """
+        started = time.monotonic()
+        # Кандидаты в порядке приоритета: (метка, функция -> transcript dict | None)
+        candidates: List[tuple] = []
+
+        def api_candidate(tr, lang: str, kind: str):
+            def fetch():
+                segments = tr.fetch()
+                if not segments:
+                    return None
+                return {'language': lang, 'type': kind, 'segments': segments, 'source': 'youtube_transcript_api'}
+            return fetch
+
+        list_ms = None
         try:
-            # Попытка получить транскрипт через официальные API субтитров
+            from youtube_transcript_api import YouTubeTranscriptApi
+
+            # Список дорожек — один запрос; find_* дальше работают локально
             transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+            list_ms = int((time.monotonic() - started) * 1000)
 
             # 1) Ручные субтитры
             for lang in languages:
                 try:
-                    transcript = transcript_list.find_manually_created_transcript([lang])
-                    return {
-                        'language': lang,
-                        'type': 'manual',
-                        'segments': transcript.fetch(),
-                        'source': 'youtube_transcript_api'
-                    }
+                    tr = transcript_list.find_manually_created_transcript([lang])
+                    candidates.append((f'manual:{lang}', api_candidate(tr, lang, 'manual')))
                 except Exception:
                     pass
 
             # 2) Автогенерируемые (YouTube)
             for lang in languages:
                 try:
-                    transcript = transcript_list.find_generated_transcript([lang])
-                    return {
-                        'language': lang,
-                        'type': 'generated',
-                        'segments': transcript.fetch(),
-                        'source': 'youtube_transcript_api'
-                    }
+                    tr = transcript_list.find_generated_transcript([lang])
+                    candidates.append((f'generated:{lang}', api_candidate(tr, lang, 'generated')))
                 except Exception:
                     pass
 
@@ -300,92 +403,117 @@ class VideoParser:
                             break
                     if first:
                         translated = first.translate(translate_to)
-                        return {
-                            'language': translate_to,
-                            'type': 'translated',
-                            'segments': translated.fetch(),
-                            'source': 'youtube_transcript_api'
-                        }
+                        candidates.append((f'translated:{translate_to}', api_candidate(translated, translate_to, 'translated')))
                 except Exception:
                     pass
+        except Exception as e:
+            print(f"[ERR] Ошибка получения транскрипта: {e}")
 
-            # 4) Фолбэк через yt-dlp: получить ссылки на субтитры и скачать текст без видео
-            print("[INFO] Фолбэк: пытаемся получить субтитры через yt-dlp")
-            via_ytdlp = self._get_subtitles_via_ytdlp(video_id, languages)
-            if via_ytdlp:
-                return via_ytdlp
+        # 4) Фолбэк через yt-dlp: получить ссылки на субтитры и скачать текст без видео
+        candidates.append(('yt_dlp', lambda: self._get_subtitles_via_ytdlp(video_id, languages, bundle)))
+        fallback_idx = len(candidates) - 1
 
+        result = self._resolve_transcript_candidates(candidates, fallback_idx)
+        winner_idx = result['winner']
+        resolver = {
+            'winner': candidates[winner_idx][0] if winner_idx is not None else None,
+            'list_ms': list_ms,
+            'total_ms': int((time.monotonic() - started) * 1000),
+            'attempts': result['attempts'],
+        }
+        if winner_idx is None:
             print(f"[WARN] Транскрипт не найден для языков: {languages}")
             return None
+        transcript = result['transcript']
+        transcript['resolver'] = resolver
+        print(f"[INFO] Транскрипт: {resolver['winner']} за {resolver['total_ms']} ms")
+        return transcript
 
-        except Exception as e:
-            print(f"[ERR] Ошибка получения транскрипта: {e}")
-            # Попробуем фолбэк даже при общей ошибке
-            try:
-                via_ytdlp = self._get_subtitles_via_ytdlp(video_id, languages)
-                if via_ytdlp:
-                    return via_ytdlp
-            except Exception:
-                pass
-            return None
+    def _resolve_transcript_candidates(self, candidates: List[tuple], fallback_idx: int) -> Dict[str, Any]:
+        """
+        Запустить кандидатов параллельно и выбрать лучший по приоритету
 
-    def _parse_vtt(self, vtt_text: str) -> List[Dict[str, Any]]:
-        """Мини-парсер WebVTT -> список сегментов {start, duration, text}."""
-        def parse_ts(ts: str) -> float:
-            # 00:00:05.123 или 00:05.123
-            parts = ts.replace(',', '.').split(':')
-            if len(parts) == 3:
-                h, m, s = parts
-                return int(h) * 3600 + int(m) * 60 + float(s)
-            if len(parts) == 2:
-                m, s = parts
-                return int(m) * 60 + float(s)
+        Returns:
+            dict: { winner: индекс | None, transcript, attempts: [{candidate, status, ms, error?}] }
+        """
+        from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+        max_workers = max(1, int(os.environ.get('TRANSCRIPT_FETCH_WORKERS', 4)))
+        fallback_delay = float(os.environ.get('TRANSCRIPT_FALLBACK_DELAY', 1.5))
+        n = len(candidates)
+        attempts: List[Dict[str, Any]] = [{'candidate': label, 'status': 'not_started', 'ms': None} for label, _ in candidates]
+        outcomes: Dict[int, Optional[Dict[str, Any]]] = {}
+
+        def run(i: int):
+            t0 = time.monotonic()
+            attempts[i]['status'] = 'running'
             try:
-                return float(parts[0])
-            except Exception:
-                return 0.0
-
-        segments: List[Dict[str, Any]] = []
-        blocks = vtt_text.split('\n\n')
-        for block in blocks:
-            lines = [ln.strip('\ufeff').strip() for ln in block.splitlines() if ln.strip()]
-            if len(lines) < 2:
-                continue
-            # возможная первая строка — ID, поэтому ищем стрелку в любой из первых двух строк
-            time_line = None
-            for i in range(min(2, len(lines))):
-                if '-->' in lines[i]:
-                    time_line = lines[i]
-                    text_lines = lines[i+1:]
+                data = candidates[i][1]()
+                attempts[i]['status'] = 'ok' if data else 'empty'
+                return data
+            except Exception as e:
+                attempts[i]['status'] = 'error'
+                attempts[i]['error'] = str(e)[:200]
+                return None
+            finally:
+                attempts[i]['ms'] = int((time.monotonic() - t0) * 1000)
+
+        pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='transcript')
+        started = time.monotonic()
+        futures = {pool.submit(run, i): i for i in range(n) if i != fallback_idx}
+        fallback_started = False
+        winner: Optional[int] = None
+        try:
+            while True:
+                # Победитель — первый по приоритету успешный, если все кандидаты выше уже завершились
+                for i in range(n):
+                    if i not in outcomes:
+                        break
+                    if outcomes[i]:
+                        winner = i
+                        break
+                if winner is not None or len(outcomes) == n:
                     break
-            if not time_line:
-                continue
-            try:
-                start_s, end_s = [s.strip() for s in time_line.split('-->')[:2]]
-                start = parse_ts(start_s)
-                end = parse_ts(end_s)
-                text = ' '.join(text_lines).strip()
-                if text:
-                    segments.append({'start': start, 'duration': max(0.0, end - start), 'text': text})
-            except Exception:
-                continue
-        return segments
-
-    def _get_subtitles_via_ytdlp(self, video_id: str, languages: List[str]):
+
+                api_done = all(i in outcomes for i in range(n) if i != fallback_idx)
+                if not fallback_started and (api_done or time.monotonic() - started >= fallback_delay):
+                    futures[pool.submit(run, fallback_idx)] = fallback_idx
+                    fallback_started = True
+
+                pending = [f for f in futures if futures[f] not in outcomes]
+                timeout = None if fallback_started else max(0.0, fallback_delay - (time.monotonic() - started))
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for f in done:
+                    outcomes[futures[f]] = f.result()
+        finally:
+            # Проигравшие: ещё не начатые отменяем, выполняющиеся дорабатывают в фоне и игнорируются
+            for f, i in futures.items():
+                if i not in outcomes:
+                    if f.cancel():
+                        attempts[i]['status'] = 'cancelled'
+                    else:
+                        attempts[i]['status'] = 'discarded'
+            if not fallback_started and winner is not None:
+                attempts[fallback_idx]['status'] = 'skipped'
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        return {
+            'winner': winner,
+            'transcript': outcomes.get(winner) if winner is not None else None,
+            'attempts': [dict(a) for a in attempts],
+        }
+
+    def _parse_vtt(self, vtt_text: str) -> List[Dict[str, Any]]:
+        """Мини-парсер WebVTT -> список сегментов {start, duration, text} (см. webvtt.py)."""
+        return parse_vtt(vtt_text)
+
+    def _get_subtitles_via_ytdlp(self, video_id: str, languages: List[str],
+                                 bundle: Optional[VideoInfoBundle] = None):
         """Попробовать достать ручные/авто субтитры через yt-dlp без скачивания видео."""
         try:
-            ydl_opts: Dict[str, Any] = {
-                'quiet': True,
-                'no_warnings': True,
-                'skip_download': True,
-                'ignore_no_formats_error': True,
-                'extractor_args': { 'youtube': { 'player_client': ['android'] }},
-            }
-            if os.path.exists(self.cookies_file):
-                ydl_opts['cookiefile'] = self.cookies_file
+            import requests
 
-            with yt_dlp.YoutubeDL(cast(Any, ydl_opts)) as ydl:
-                info = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
+            info = (bundle or self.new_info_bundle(video_id)).get()
 
             # В info есть две структуры с URL субтитров
             subs = info.get('subtitles') or {}
@@ -406,9 +534,9 @@ class VideoParser:
                     if not track:
                         track = tracks[0]
                     try:
-                        resp = requests.get(track['url'], timeout=20)
-                        if resp.ok and resp.text:
-                            segs = self._parse_vtt(resp.text)
+                        # Разбираем поток по мере загрузки, не собирая весь файл в строку
+                        with requests.get(track['url'], stream=True, timeout=20) as resp:
+                            segs = list(iter_vtt_segments(resp.iter_content(chunk_size=64 * 1024))) if resp.ok else []
                             if segs:
                                 return {
                                     'language': lang,
@@ -446,229 +574,232 @@ class VideoParser:
         """
         if not transcript or 'segments' not in transcript:
             return ""
-        
-        # Очищаем текст от таймкодов вида <00:00:00.240> и XML-тегов <c>
-        import re
-        
-        # Берём только "чистые" сегменты без XML-тегов (они идут как финальные версии блоков)
-        # В VTT-формате YouTube создаёт:
-        # 1) Сегмент с таймкодами: "Привет<00:00:01> мир<00:00:02>"
-        # 2) Чистый сегмент: "Привет мир"
-        # 3) Следующий с таймкодами: "Привет мир как<00:00:03> дела<00:00:04>"
-        # Нужно брать только чистые (без "<"), чтобы избежать перекрытий
-        
-        clean_segments = []
-        for seg in transcript['segments']:
-            text = seg.get('text', '')
-            if not text:
-                continue
-            
-            # Берём только сегменты БЕЗ XML-тегов (чистые версии)
-            if '<' not in text:
-                clean_segments.append(text.strip())
-        
-        # Если чистых сегментов нет (бывает с Whisper API), очищаем от тегов вручную
-        if not clean_segments:
-            for seg in transcript['segments']:
-                text = seg.get('text', '')
-                if text:
-                    clean_text = re.sub(r'<[^>]+>', '', text).strip()
-                    if clean_text:
-                        clean_segments.append(clean_text)
-        
-        return " ".join(clean_segments)
+
+        # Бегущие автосубтитры повторяют хвост предыдущей кью — склеиваем
+        # с удалением перекрытий за линейное время (см. caption_dedup.py)
+        return merge_segments(transcript['segments'])
     
-    def transcribe_audio_with_whisper(self, video_id, model='base', language=None, use_openai_api=False):
+    def transcribe_audio_with_whisper(self, video_id, model='base', language=None, use_openai_api=False,
+                                      bundle: Optional[VideoInfoBundle] = None, vad: Optional[bool] = None,
+                                      backend: Optional[str] = None, budget: Optional[float] = None):
         """
         Транскрибация аудио из видео через Whisper
         
         Args:
             video_id: YouTube video ID
             model: Модель Whisper ('tiny', 'base', 'small', 'medium', 'large')
-                   Используется только для локального Whisper
+                   Используется только для локальных движков; с бюджетом — наибольшая допустимая
             language: Язык аудио (например, 'en', 'ru'). None = автоопределение
             use_openai_api: Использовать OpenAI API вместо локального Whisper
+            bundle: Общий info-bundle задачи (ссылка на аудио берётся из него)
+            vad: Распознавать только участки речи (vad.py); None = WHISPER_VAD
+            backend: Движок из asr_backends.py ('openai', 'whisper', 'faster_whisper');
+                     по умолчанию — OpenAI API при наличии ключа, иначе локальный Whisper
+            budget: Бюджет времени на распознавание, сек — модель подбирается по длительности (asr_budget.py)
             
         Returns:
             dict: Транскрипт с временными метками или None
         """
         try:
-            # Проверяем переменные окружения
-            if use_openai_api or os.environ.get('OPENAI_API_KEY'):
-                print("[INFO] Используем OpenAI Whisper API")
-                return self._transcribe_via_openai_whisper(video_id, os.environ.get('OPENAI_API_KEY'), language)
-            
-            # Локальный Whisper
-            print(f"[INFO] Используем локальный Whisper (модель: {model})")
-            return self._transcribe_via_local_whisper(video_id, model, language)
-            
+            if not backend:
+                backend = 'openai' if use_openai_api or os.environ.get('OPENAI_API_KEY') else 'whisper'
+            return self.transcribe_audio(video_id, backend, model=None if backend == 'openai' else model,
+                                         language=language, bundle=bundle, vad=vad, budget=budget)
         except Exception as e:
             print(f"[ERR] Ошибка транскрибации Whisper: {e}")
             return None
     
-    def _transcribe_via_openai_whisper(self, video_id, api_key, language=None):
-        """Транскрибация через OpenAI Whisper API"""
-        if not api_key:
-            print("[WARN] OPENAI_API_KEY не настроен")
+    def transcribe_audio(self, video_id: str, backend: Optional[str] = None, model: Optional[str] = None,
+                         language: Optional[str] = None, bundle: Optional[VideoInfoBundle] = None,
+                         vad: Optional[bool] = None, priority: str = 'interactive', budget: Optional[float] = None,
+                         detect_language: Optional[bool] = None) -> Optional[Dict[str, Any]]:
+        """
+        Распознать речь видео выбранным движком ASR (см. asr_backends.py)
+
+        Общий для всех движков путь: кэш результатов до скачивания, аудиопоток
+        Range-кусками через ffmpeg в 16 кГц моно, VAD, распознавание, перенос таймкодов.
+
+        Args:
+            video_id: YouTube video ID
+            backend: Имя движка; None = ASR_BACKEND / auto
+            model: Модель движка; None = модель движка по умолчанию, 'auto' — под бюджет;
+                   при заданном бюджете — наибольшая допустимая модель
+            language: Язык аудио; None = автоопределение
+            bundle: Общий info-bundle задачи
+            vad: Распознавать только участки речи; None = WHISPER_VAD
+            priority: Очередь планировщика ASR: 'interactive' или 'bulk' (см. asr_scheduler.py)
+            budget: Бюджет времени на распознавание, сек; None = ASR_TIME_BUDGET (0 — модель не подбирается)
+            detect_language: Определить язык заранее маленькой моделью; None = ASR_DETECT_LANGUAGE
+
+        Returns:
+            dict: {language, type, segments, source, download, scheduler[, normalize][, asr | timing][, vad]
+                   [, budget][, language_detect]} или None
+        """
+        engine = resolve_backend(backend)
+        if engine is None:
             return None
-        
+        budget_s = budget_seconds() if budget is None else budget
+        detect = language is None and (detect_language_enabled() if detect_language is None else detect_language)
+        tmp_audio_path = None
+        speech = None
         try:
-            # Проверяем наличие библиотеки openai
-            try:
-                from openai import OpenAI
-            except ImportError:
-                print("[WARN] Библиотека openai не установлена. Установите: pip install openai")
-                return None
-            
-            # Получаем прямую ссылку на аудио
-            audio_url = self._get_best_audio_url(video_id)
+            job_started = time.perf_counter()
+            bundle = bundle or self.new_info_bundle(video_id)
+            duration = bundle.get(need_streams=False).get('duration')
+            use_vad = vad_enabled() if vad is None else vad
+            # Под бюджет модель выбирается по длительности и замеренной скорости движка (asr_budget.py)
+            plan = None
+            if budget_s or model == 'auto':
+                plan = pick_model(engine, duration, budget_s, None if model == 'auto' else model, detect=detect,
+                                  vad=use_vad)
+            model = engine.resolve_model(plan['model'] if plan else (None if model == 'auto' else model))
+            print(f"[INFO] ASR: движок {engine.name} (модель: {model})")
+            audio_url = self._get_best_audio_url(video_id, bundle)
             if not audio_url:
                 print("[WARN] Не удалось получить ссылку на аудио")
                 return None
-            
+
+            # Тот же поток уже распознавался этим движком и моделью — аудио не качаем
+            cache_ref, cached = self._asr_cache_lookup(video_id, engine.name,
+                                                       engine.cache_model(model) + ('+vad' if use_vad else ''),
+                                                       language, audio_url)
+            if cached:
+                return cached
+
+            # googlevideo режет скорость одного соединения — качаем Range-кусками параллельно (range_fetch.py)
+            # и сразу перекодируем ffmpeg в 16 кГц моно в формате движка (audio_normalize.py): исходный
+            # поток на диск не пишется. Лимиты API соблюдаются нарезкой по времени (asr_openai.py)
             print(f"[INFO] Скачиваем аудио для транскрибации...")
-            
-            # Скачиваем аудио во временный файл
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_audio:
-                audio_response = requests.get(audio_url, stream=True, timeout=60)
-                if not audio_response.ok:
-                    print(f"[ERR] Не удалось скачать аудио: {audio_response.status_code}")
+            normalized = None
+            if normalize_enabled():
+                ext = engine.speech_ext
+                tmp_audio_path = self._temp_path(ext)
+                try:
+                    normalized = normalize_url(audio_url, tmp_audio_path, ext=ext, duration=duration)
+                    download = normalized.pop('download')
+                except Exception as e:
+                    print(f"[WARN] Нормализация аудио не удалась ({e}) — качаем исходный поток")
+                    self._unlink_quiet(tmp_audio_path)
+            if normalized is None:
+                ext = guess_audio_ext(audio_url)
+                tmp_audio_path = self._temp_path(ext)
+                try:
+                    download = download_to_file(audio_url, tmp_audio_path)
+                except Exception as e:
+                    print(f"[ERR] Не удалось скачать аудио: {e}")
                     return None
-                
-                for chunk in audio_response.iter_content(chunk_size=8192):
-                    tmp_audio.write(chunk)
-                
-                tmp_audio_path = tmp_audio.name
-            
-            print(f"[INFO] Аудио сохранено: {tmp_audio_path}")
-            print(f"[INFO] Отправляем на транскрибацию в OpenAI...")
-            
-            # Вызываем OpenAI API
-            client = OpenAI(api_key=api_key)
-            
-            with open(tmp_audio_path, 'rb') as audio_file:
-                params = {
-                    'file': audio_file,
-                    'model': 'whisper-1',
-                    'response_format': 'verbose_json',  # Получаем временные метки
-                }
-                if language:
-                    params['language'] = language
-                
-                transcript = client.audio.transcriptions.create(**params)
-            
-            # Удаляем временный файл
-            try:
-                os.unlink(tmp_audio_path)
-            except:
-                pass
-            
-            # Преобразуем в наш формат
-            segments = []
-            if hasattr(transcript, 'segments') and transcript.segments:
-                for seg in transcript.segments:
-                    segments.append({
-                        'start': seg.get('start', 0),
-                        'duration': seg.get('end', 0) - seg.get('start', 0),
-                        'text': seg.get('text', '').strip()
-                    })
-            else:
-                # Если нет сегментов, создаем один большой
-                segments = [{
-                    'start': 0,
-                    'duration': 0,
-                    'text': transcript.text if hasattr(transcript, 'text') else str(transcript)
-                }]
-            
-            print(f"[SUCCESS] Транскрибация выполнена: {len(segments)} сегментов")
-            
-            return {
-                'language': language or 'auto',
-                'type': 'whisper_api',
-                'segments': segments,
-                'source': 'openai_whisper_api'
-            }
-            
-        except Exception as e:
-            print(f"[ERR] Ошибка OpenAI Whisper API: {e}")
-            return None
-    
-    def _transcribe_via_local_whisper(self, video_id, model='base', language=None):
-        """Транскрибация через локальный Whisper"""
-        try:
-            # Проверяем наличие библиотеки whisper
+
+            asr_path, asr_ext, asr_duration = tmp_audio_path, ext, duration
+            if use_vad:
+                # Движок получает только участки речи, таймкоды потом возвращаются на исходную шкалу
+                speech = condense(tmp_audio_path, duration=duration, ext=engine.speech_ext)
+                if speech and not speech.regions:
+                    print("[INFO] VAD: речи не найдено — распознавать нечего")
+                    return None
+                if speech and speech.path:
+                    asr_path, asr_ext, asr_duration = speech.path, engine.speech_ext, speech.speech_seconds
+
+            # Подготовка замеряется до очереди: ожидание слота — не скорость хоста, в RTF ему не место
+            prep_s = time.perf_counter() - job_started
+            # Слот движка: не больше ASR_CONCURRENCY_<ДВИЖОК> распознаваний в процессе (asr_scheduler.py);
+            # при длинной очереди локальный движок может получить модель меньше
             try:
-                import whisper
-            except ImportError:
-                print("[WARN] Библиотека openai-whisper не установлена.")
-                print("[INFO] Установите: pip install openai-whisper")
-                print("[INFO] Внимание: требуется ffmpeg и PyTorch (>1GB)")
+                slot = get_scheduler().acquire(engine, model, priority)
+            except AsrRejected as e:
+                print(f"[WARN] ASR отклонён: {e}")
                 return None
-            
-            # Получаем аудио
-            audio_url = self._get_best_audio_url(video_id)
-            if not audio_url:
-                print("[WARN] Не удалось получить ссылку на аудио")
+            detected = None
+            with slot:
+                run_language = language
+                if detect:
+                    # Язык по 30 с маленькой моделью — основная распознаёт сразу на нём
+                    detected = detect_asr_language(engine, asr_path, asr_duration)
+                    run_language = (detected or {}).get('language') or language
+                started = time.perf_counter()
+                result = engine.transcribe(asr_path, slot.model, run_language, duration=asr_duration, ext=asr_ext)
+                asr_ms = (time.perf_counter() - started) * 1000
+            if not result or not result['segments']:
                 return None
-            
-            print(f"[INFO] Скачиваем аудио для локальной транскрибации...")
-            
-            # Скачиваем аудио
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_audio:
-                audio_response = requests.get(audio_url, stream=True, timeout=60)
-                if not audio_response.ok:
-                    return None
-                
-                for chunk in audio_response.iter_content(chunk_size=8192):
-                    tmp_audio.write(chunk)
-                
-                tmp_audio_path = tmp_audio.name
-            
-            print(f"[INFO] Загружаем модель Whisper: {model}")
-            model_obj = whisper.load_model(model)
-            
-            print(f"[INFO] Транскрибируем аудио...")
-            options = {}
-            if language:
-                options['language'] = language
-            
-            result = model_obj.transcribe(tmp_audio_path, **options)
-            
-            # Удаляем временный файл
-            try:
-                os.unlink(tmp_audio_path)
-            except:
-                pass
-            
-            # Преобразуем в наш формат
-            segments = []
-            if 'segments' in result:
-                for seg in result['segments']:
-                    segments.append({
-                        'start': seg.get('start', 0),
-                        'duration': seg.get('end', 0) - seg.get('start', 0),
-                        'text': seg.get('text', '').strip()
-                    })
-            else:
-                segments = [{
-                    'start': 0,
-                    'duration': 0,
-                    'text': result.get('text', '')
-                }]
-            
-            detected_lang = result.get('language', language or 'auto')
-            print(f"[SUCCESS] Транскрибация выполнена: {len(segments)} сегментов (язык: {detected_lang})")
-            
-            return {
-                'language': detected_lang,
-                'type': 'whisper_local',
-                'segments': segments,
-                'source': f'whisper_local_{model}'
+            load_ms = (result.get('timing') or {}).get('model_load_ms') or 0.0
+            record_asr_run(engine, slot.model, asr_duration, (asr_ms - load_ms) / 1000,
+                           load_s=load_ms / 1000 if load_ms else None, prep_s=prep_s, prep_seconds=duration,
+                           vad=use_vad)
+
+            segments = result.pop('segments')
+            transcript = {
+                'language': result.pop('language', None) or language or 'auto',
+                'type': engine.transcript_type,
+                'segments': speech.remap_segments(segments) if speech else segments,
+                'source': engine.source(slot.model),
+                'download': download,
             }
-            
+            if normalized:
+                transcript['normalize'] = normalized
+            # Метаданные движка: asr (OpenAI по кускам) или timing (загрузка модели и распознавание)
+            transcript.update(result)
+            if speech:
+                transcript['vad'] = speech.stats(asr_ms)
+            if plan:
+                plan['actual_s'] = round(time.perf_counter() - job_started, 1)
+                # Ожидание слота в оценку не входит — показываем его отдельно от actual_s
+                plan['wait_s'] = round(slot.info['wait_ms'] / 1000, 1)
+                transcript['budget'] = plan
+            if detected:
+                transcript['language_detect'] = detected
+            print(f"[SUCCESS] Транскрибация выполнена: {len(segments)} сегментов (язык: {transcript['language']})")
+            # Результат уменьшенной модели не кэшируем под запрошенной — следующий запуск распознает полноценно
+            if 'degraded_from' not in slot.info:
+                self._asr_cache_store(cache_ref, transcript)
+            transcript['scheduler'] = slot.info
+            return transcript
         except Exception as e:
-            print(f"[ERR] Ошибка локального Whisper: {e}")
+            print(f"[ERR] Ошибка ASR ({engine.name}): {e}")
             return None
+        finally:
+            if tmp_audio_path:
+                self._unlink_quiet(tmp_audio_path)
+            if speech and speech.path:
+                self._unlink_quiet(speech.path)
+
+    def load_whisper_model(self, model: str = 'base'):
+        """Модель локального Whisper из кэша процесса (LRU с бюджетом памяти, см. whisper_models.py)."""
+        return get_model_cache().get(model)[0]
+
+    @staticmethod
+    def _asr_cache_lookup(video_id: str, backend: str, model: str, language: Optional[str],
+                          audio_url: str) -> Tuple[Optional[Tuple[str, ...]], Optional[Dict[str, Any]]]:
+        """
+        Поиск результата ASR в кэше до скачивания аудио (см. asr_cache.py)
+
+        Returns:
+            (ссылка для _asr_cache_store или None, если поток не опознан; транскрипт из кэша или None)
+        """
+        audio_hash = audio_fingerprint(audio_url)
+        if not audio_hash:
+            return None, None
+        key = cache_key(video_id, backend, model, language, audio_hash)
+        cached = get_asr_cache().get(key)
+        if cached:
+            print(f"[INFO] ASR: результат из кэша ({backend}/{model}, {len(cached.get('segments') or [])} сегментов)")
+        return (key, video_id, backend, model, language or 'auto', audio_hash), cached
+
+    @staticmethod
+    def _asr_cache_store(cache_ref: Optional[Tuple[str, ...]], transcript: Dict[str, Any]) -> None:
+        if cache_ref and transcript.get('segments'):
+            get_asr_cache().put(*cache_ref, transcript)
+
+    @staticmethod
+    def _temp_path(ext: str) -> str:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{ext}') as tmp:
+            return tmp.name
+
+    @staticmethod
+    def _unlink_quiet(path: str) -> None:
+        """Удалить временный файл, не падая, если его уже нет."""
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
 
     @staticmethod
     def _format_duration_hhmm(seconds: int) -> str:
@@ -698,153 +829,180 @@ class VideoParser:
         s = str(yyyymmdd)
         return f"{s[6:8]}.{s[4:6]}.{s[0:4]}"
     
-    def parse_video(self, video_id, languages=['en', 'ru', 'uk', 'de', 'fr', 'es'], translate_to: str | None = None):
+    @staticmethod
+    def _print_progress(step: Optional[str], progress: Optional[int]) -> None:
+        """Прогресс по умолчанию: строки STEP:/PROGRESS:, которые читает Node (videoDownloadService)."""
+        if step:
+            print(f"STEP: {step}")
+        if progress is not None:
+            print(f"PROGRESS: {progress}")
+
+    def parse_video(self, video_id, languages=['en', 'ru', 'uk', 'de', 'fr', 'es'], translate_to: str | None = None,
+                    progress_callback: Optional[Callable[[Optional[str], Optional[int]], None]] = None,
+                    compact: bool = False, asr_backend: Optional[str] = None, asr_priority: str = 'interactive',
+                    asr_budget: Optional[float] = None):
         """
         Полный парсинг видео: информация + таймкоды + транскрипт
         
         Args:
             video_id: YouTube video ID
             languages: Список предпочитаемых языков для транскрипта
+            progress_callback: Функция (step, progress) для отслеживания прогресса
+                               (по умолчанию печатает STEP:/PROGRESS:)
+            compact: Вернуть транскрипт как CompactTranscript (для долгого хранения в памяти;
+                     save_parsed_json пишет его в прежнем формате)
+            asr_backend: Движок ASR для видео без субтитров ('openai', 'whisper', 'faster_whisper',
+                         'auto'); None = ASR_BACKEND, иначе OpenAI API при наличии ключа
+            asr_priority: Очередь ASR: 'interactive' (ждёт пользователь) или 'bulk' (пакеты)
+            asr_budget: Бюджет времени на распознавание, сек (None = ASR_TIME_BUDGET): локальный
+                        движок подбирает модель по длительности видео (asr_budget.py)
             
         Returns:
             dict: Полные данные о видео
         """
+        report = progress_callback or self._print_progress
         print(f"[PARSE] Парсинг видео: {video_id}")
-        print("STEP: info")
-        print("PROGRESS: 10")
+        report('info', 10)
+
+        # Одна yt-dlp экстракция на всю задачу: info, chapters, субтитры и аудио берутся из неё
+        bundle = self.new_info_bundle(video_id)
 
         # 1. Базовая информация
-        info = self.get_video_info(video_id)
+        info = self.get_video_info(video_id, bundle)
         if not info:
             return None
-        print("PROGRESS: 20")
+        report(None, 20)
 
         # 2. Таймкоды
-        print("STEP: chapters")
-        chapters = self.get_chapters(video_id)
+        report('chapters', None)
+        chapters = self.get_chapters(video_id, bundle)
         print(f"  [INFO] Найдено таймкодов: {len(chapters)}")
-        print("PROGRESS: 50")
+        report(None, 50)
 
         # 3. Транскрипт/субтитры
-        print("STEP: transcript")
-        transcript = self.get_transcript(video_id, languages, translate_to=translate_to)
+        report('transcript', None)
+        transcript = self.get_transcript(video_id, languages, translate_to=translate_to, bundle=bundle)
         if transcript:
             print(f"  [TRANSCRIPT] Получен: {transcript['language']} ({transcript['type']})")
             full_text = self.get_full_text(transcript)
         else:
-            # Попробуем распознать речь через OpenAI Whisper API, если доступно
+            # Субтитров нет — распознаём речь: движок задачи (asr_backend) или ASR_BACKEND,
+            # без них — OpenAI Whisper API, если задан ключ (локальный Whisper только по явному выбору)
             use_asr = os.environ.get('ENABLE_ASR_IF_NO_CAPTIONS', '1') not in ('0', 'false', 'no')
-            api_key = os.environ.get('OPENAI_API_KEY')
-            if use_asr and api_key:
-                print("[INFO] Субтитров нет — пробуем OpenAI Whisper API")
-                try:
-                    asr_data = self._transcribe_via_openai_whisper(video_id, api_key)
-                    if asr_data:
-                        transcript = asr_data
-                        full_text = self.get_full_text(transcript)
-                    else:
-                        full_text = ""
-                except Exception as e:
-                    print(f"[WARN] Whisper ASR failed: {e}")
-                    full_text = ""
-            else:
-                full_text = ""
-        print("PROGRESS: 80")
+            backend = asr_backend or os.environ.get('ASR_BACKEND') or ('openai' if os.environ.get('OPENAI_API_KEY') else None)
+            full_text = ""
+            if use_asr and backend:
+                print(f"[INFO] Субтитров нет — распознаём речь ({backend})")
+                asr_data = self.transcribe_audio(video_id, backend, bundle=bundle, priority=asr_priority,
+                                                 budget=asr_budget)
+                if asr_data:
+                    transcript = asr_data
+                    full_text = self.get_full_text(transcript)
+        report(None, 80)
 
         return {
             'info': info,
             'chapters': chapters,
-            'transcript': transcript,
+            'transcript': compact_transcript(transcript) if compact else transcript,
             'full_text': full_text,
+            'ytdlp_extractions': bundle.extractions,
+            'ytdlp_cache_hits': bundle.cache_hits,
         }
 
-    def _get_best_audio_url(self, video_id: str) -> Optional[str]:
-        try:
-            ydl_opts: Dict[str, Any] = {
-                'quiet': True,
-                'no_warnings': True,
-                'skip_download': True,
-                'ignore_no_formats_error': True,
-                'format': 'bestaudio/best',
-                'extractor_args': { 'youtube': { 'player_client': ['android'] }},
-            }
-            if os.path.exists(self.cookies_file):
-                ydl_opts['cookiefile'] = self.cookies_file
-            with yt_dlp.YoutubeDL(cast(Any, ydl_opts)) as ydl:
-                info = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
-                # у аудио формата должен быть direct url
-                url = info.get('url')
-                if not url:
-                    # иногда нужный урл в entries/formats
-                    fmts = info.get('formats') or []
-                    audio = None
-                    for f in fmts:
-                        if f.get('acodec') and f.get('vcodec') in (None, 'none') and f.get('url'):
-                            audio = f
-                    if audio:
-                        url = audio.get('url')
-                return url
-        except Exception:
-            return None
-
-    def _transcribe_via_openai_whisper(self, video_id: str, api_key: str):
-        """Распознать речь без скачивания видео на диск: забираем аудио поток и отправляем в OpenAI Whisper API."""
-        try:
-            # Динамический импорт, чтобы не требовать обязательной установки openai
-            import importlib
-            try:
-                _openai = importlib.import_module('openai')
-                OpenAI = getattr(_openai, 'OpenAI')
-            except Exception:
-                print("[WARN] Библиотека openai не установлена — пропускаем ASR")
-                return None
-
-            audio_url = self._get_best_audio_url(video_id)
-            if not audio_url:
-                return None
+    def parse_many(
+        self,
+        video_ids: List[str],
+        languages=['en', 'ru', 'uk', 'de', 'fr', 'es'],
+        translate_to: str | None = None,
+        concurrency: int = 4,
+        spreadsheet_id: Optional[str] = None,
+        sheet_name: str = 'Videos',
+        on_progress: Optional[Callable[[str, Optional[str], Optional[int]], None]] = None,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+        output_format: Optional[str] = None,
+        asr_backend: Optional[str] = None,
+        asr_budget: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Пакетный парсинг: несколько видео на ограниченном пуле потоков
 
-            # Качаем в память. Важно: большие видео могут занять много RAM — ограничим до ~100 МБ
-            max_bytes = int(os.environ.get('ASR_MAX_BYTES', 100 * 1024 * 1024))
-            bio = BytesIO()
-            with requests.get(audio_url, stream=True, timeout=30) as r:
-                r.raise_for_status()
-                for chunk in r.iter_content(chunk_size=1024 * 256):
-                    if not chunk:
-                        continue
-                    bio.write(chunk)
-                    if bio.tell() > max_bytes:
-                        print("[WARN] Достигнут лимит ASR_MAX_BYTES, обрезаем аудио")
-                        break
-            bio.seek(0)
+        Ошибка одного видео не влияет на остальные. Результаты передаются в
+        on_result по мере готовности (порядок завершения, не порядок входа).
 
-            client = OpenAI(api_key=api_key)
-            resp = client.audio.transcriptions.create(
-                model=os.environ.get('ASR_MODEL', 'whisper-1'),
-                file=('audio.mp3', bio),
-                response_format='verbose_json'
-            )
+        Args:
+            video_ids: Список YouTube video ID
+            concurrency: Сколько видео обрабатывать одновременно
+            spreadsheet_id: Если задан — каждый результат дописывается в Google Sheets
+            on_progress: Функция (video_id, step, progress)
+            on_result: Функция (result) — { video_id, success, data | error, output_file, elapsed_ms }
+            output_format: 'json' или 'ytc' (по умолчанию PARSED_OUTPUT_FORMAT / json)
+            asr_backend: Движок ASR для видео без субтитров (см. parse_video)
+            asr_budget: Бюджет времени ASR на видео, сек (см. parse_video)
 
-            # resp содержит text и segments
-            segments = []
-            for seg in getattr(resp, 'segments', []) or []:
-                segments.append({'start': seg.get('start', 0.0), 'duration': float(seg.get('end', 0.0)) - float(seg.get('start', 0.0)), 'text': seg.get('text', '')})
+        Returns:
+            list: Результаты в порядке завершения
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
 
-            if not segments and getattr(resp, 'text', None):
-                segments = [{'start': 0.0, 'duration': 0.0, 'text': resp.text}]
+        def run_one(vid: str) -> Dict[str, Any]:
+            started = time.monotonic()
+            progress = (lambda step, pct: on_progress(vid, step, pct)) if on_progress else (lambda step, pct: None)
+            result: Dict[str, Any]
+            try:
+                # Результаты всего пакета держатся в памяти — транскрипт храним компактно
+                data = self.parse_video(vid, languages, translate_to=translate_to, progress_callback=progress,
+                                        compact=True, asr_backend=asr_backend, asr_priority='bulk',
+                                        asr_budget=asr_budget)
+                if data:
+                    output_file = save_parsed_json(data, vid, fmt=output_format)
+                    if spreadsheet_id and self.sheets_service:
+                        progress('sheets', None)
+                        if self.save_to_google_sheets(spreadsheet_id, data, sheet_name=sheet_name):
+                            progress(None, 95)
+                    progress(None, 100)
+                    result = {'video_id': vid, 'success': True, 'output_file': output_file, 'data': data}
+                else:
+                    result = {'video_id': vid, 'success': False, 'error': 'Не удалось распарсить видео'}
+            except Exception as e:
+                result = {'video_id': vid, 'success': False, 'error': str(e)}
+            result['elapsed_ms'] = int((time.monotonic() - started) * 1000)
+            print(f"[BATCH] {vid}: {'OK' if result['success'] else 'ERR'} за {result['elapsed_ms']} ms")
+            return result
 
-            if not segments:
-                return None
+        results: List[Dict[str, Any]] = []
+        with ThreadPoolExecutor(max_workers=max(1, int(concurrency))) as pool:
+            futures = {pool.submit(run_one, vid): vid for vid in video_ids}
+            for fut in as_completed(futures):
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    result = {'video_id': futures[fut], 'success': False, 'error': str(e)}
+                results.append(result)
+                if on_result:
+                    on_result(result)
+        return results
 
-            return {
-                'language': getattr(resp, 'language', 'auto'),
-                'type': 'asr_openai',
-                'segments': segments,
-                'source': 'openai_whisper'
-            }
-        except Exception as e:
-            print(f"[ERR] OpenAI Whisper error: {e}")
+    def _get_best_audio_url(self, video_id: str, bundle: Optional[VideoInfoBundle] = None) -> Optional[str]:
+        """Прямая ссылка на лучший аудио-поток из общего info (без отдельной экстракции)."""
+        try:
+            info = (bundle or self.new_info_bundle(video_id)).get()
+            fmts = info.get('formats') or []
+            # Предпочитаем audio-only с максимальным битрейтом
+            audio_only = [
+                f for f in fmts
+                if f.get('url') and f.get('acodec') not in (None, 'none') and f.get('vcodec') in (None, 'none')
+            ]
+            if audio_only:
+                best = max(audio_only, key=lambda f: (f.get('abr') or f.get('tbr') or 0))
+                return best.get('url')
+            # иначе любой формат со звуком (прогрессивный)
+            with_audio = [f for f in fmts if f.get('url') and f.get('acodec') not in (None, 'none')]
+            if with_audio:
+                return min(with_audio, key=lambda f: (f.get('tbr') or 0)).get('url')
+            return info.get('url')
+        except Exception:
             return None
-    
+
     def _sanitize_sheet_name(self, sheet_name):
         name = (sheet_name or 'Videos').strip()
         if not name:
@@ -865,6 +1023,7 @@ class VideoParser:
     def ensure_sheet_exists(self, spreadsheet_id, sheet_name):
         if not self.sheets_service:
             return False, False
+        from googleapiclient.errors import HttpError
 
         try:
             meta = self.sheets_service.spreadsheets().get(
@@ -959,90 +1118,92 @@ class VideoParser:
         if not self.sheets_service:
             print("[ERR] Google Sheets API не инициализирован")
             return False
+        from googleapiclient.errors import HttpError
         
-        try:
-            sheet_name = self._sanitize_sheet_name(sheet_name)
-            ok, created = self.ensure_sheet_exists(spreadsheet_id, sheet_name)
-            if not ok:
-                return False
-            if created and not self._write_sheet_headers(spreadsheet_id, sheet_name):
-                print(f"[ERR] Не удалось подготовить заголовки для листа {sheet_name}")
-                return False
+        with self._sheets_lock:
+            try:
+                sheet_name = self._sanitize_sheet_name(sheet_name)
+                ok, created = self.ensure_sheet_exists(spreadsheet_id, sheet_name)
+                if not ok:
+                    return False
+                if created and not self._write_sheet_headers(spreadsheet_id, sheet_name):
+                    print(f"[ERR] Не удалось подготовить заголовки для листа {sheet_name}")
+                    return False
 
-            info = data['info']
-            chapters = data['chapters']
-            transcript = data.get('transcript')
-            full_text = data.get('full_text', '')
+                info = data['info']
+                chapters = data['chapters']
+                transcript = data.get('transcript')
+                full_text = data.get('full_text', '')
             
-            # Для таблицы: длительность теперь в формате ЧЧ:ММ:СС
-            duration_hhmmss = self._format_hhmmss(info.get('duration') or 0)
-            has_subs = 'да' if transcript and transcript.get('segments') else 'нет'
-            subs_lang = transcript.get('language') if transcript else ''
+                # Для таблицы: длительность теперь в формате ЧЧ:ММ:СС
+                duration_hhmmss = self._format_hhmmss(info.get('duration') or 0)
+                has_subs = 'да' if transcript and transcript.get('segments') else 'нет'
+                subs_lang = transcript.get('language') if transcript else ''
             
-            # Ограничим полный текст для таблицы (первые 500 символов)
-            full_text_preview = full_text[:500] + '...' if len(full_text) > 500 else full_text
+                # Ограничим полный текст для таблицы (первые 500 символов)
+                full_text_preview = full_text[:500] + '...' if len(full_text) > 500 else full_text
             
-            # Ссылка на скачивание полного транскрипта
-            backend_url = os.environ.get('BACKEND_URL', 'http://localhost:3000')
-            transcript_link = f"{backend_url}/api/videos/{info['video_id']}/transcript/download" if full_text else ''
+                # Ссылка на скачивание полного транскрипта
+                backend_url = os.environ.get('BACKEND_URL', 'http://localhost:3000')
+                transcript_link = f"{backend_url}/api/videos/{info['video_id']}/transcript/download" if full_text else ''
             
-            url = f"https://www.youtube.com/watch?v={info['video_id']}"
-            # теги или категории — в одну ячейку, первые 10
-            tags = info.get('tags') or info.get('categories') or []
-            tags_str = ', '.join(tags[:10]) if isinstance(tags, list) else str(tags)
-            status = 'OK' if info else 'ERROR'
-            upload_date = self._format_date_ddmmyyyy(info.get('upload_date', ''))
-
-            # Таймкоды строкой построчно: HH:MM:SS — Title
-            chapters_lines = []
-            for ch in chapters or []:
-                t = self._format_hhmmss(int(ch.get('start_time') or 0))
-                title = ch.get('title') or ''
-                chapters_lines.append(f"{t} — {title}")
-            chapters_multiline = "\n".join(chapters_lines)
-
-            # Новая схема колонок:
-            # A:Video ID, B:URL, C:Название, D:Канал, E:Дата (ДД.ММ.ГГГГ), F:Длительность (ЧЧ:ММ:СС),
-            # G:Таймкоды (список), H:Субтитры (да/нет), I:Язык субтитров, 
-            # J:Полный текст (первые 500), K:Теги/Категории, L:Статус, M:Ссылка на транскрипт
-            values = [[
-                info['video_id'],
-                url,
-                info.get('title', ''),
-                info.get('channel', ''),
-                upload_date,
-                duration_hhmmss,
-                chapters_multiline,
-                has_subs,
-                subs_lang,
-                full_text_preview,
-                tags_str,
-                status,
-                transcript_link,
-            ]]
+                url = f"https://www.youtube.com/watch?v={info['video_id']}"
+                # теги или категории — в одну ячейку, первые 10
+                tags = info.get('tags') or info.get('categories') or []
+                tags_str = ', '.join(tags[:10]) if isinstance(tags, list) else str(tags)
+                status = 'OK' if info else 'ERROR'
+                upload_date = self._format_date_ddmmyyyy(info.get('upload_date', ''))
+
+                # Таймкоды строкой построчно: HH:MM:SS — Title
+                chapters_lines = []
+                for ch in chapters or []:
+                    t = self._format_hhmmss(int(ch.get('start_time') or 0))
+                    title = ch.get('title') or ''
+                    chapters_lines.append(f"{t} — {title}")
+                chapters_multiline = "\n".join(chapters_lines)
+
+                # Новая схема колонок:
+                # A:Video ID, B:URL, C:Название, D:Канал, E:Дата (ДД.ММ.ГГГГ), F:Длительность (ЧЧ:ММ:СС),
+                # G:Таймкоды (список), H:Субтитры (да/нет), I:Язык субтитров, 
+                # J:Полный текст (первые 500), K:Теги/Категории, L:Статус, M:Ссылка на транскрипт
+                values = [[
+                    info['video_id'],
+                    url,
+                    info.get('title', ''),
+                    info.get('channel', ''),
+                    upload_date,
+                    duration_hhmmss,
+                    chapters_multiline,
+                    has_subs,
+                    subs_lang,
+                    full_text_preview,
+                    tags_str,
+                    status,
+                    transcript_link,
+                ]]
             
-            body = {'values': values}
+                body = {'values': values}
             
-            # Вставить данные
-            try:
-                result = self.sheets_service.spreadsheets().values().append(
-                    spreadsheetId=spreadsheet_id,
-                    range=f'{sheet_name}!A1',  # Универсально: допишет справа столько колонок, сколько дадим
-                    valueInputOption='RAW',
-                    body=body
-                ).execute()
-            except HttpError as e:
-                raise
+                # Вставить данные
+                try:
+                    result = self.sheets_service.spreadsheets().values().append(
+                        spreadsheetId=spreadsheet_id,
+                        range=f'{sheet_name}!A1',  # Универсально: допишет справа столько колонок, сколько дадим
+                        valueInputOption='RAW',
+                        body=body
+                    ).execute()
+                except HttpError as e:
+                    raise
             
-            print(f"[OK] Данные сохранены в Google Sheets: {result.get('updates').get('updatedCells')} ячеек")
-            return True
+                print(f"[OK] Данные сохранены в Google Sheets: {result.get('updates').get('updatedCells')} ячеек")
+                return True
             
-        except HttpError as e:
-            print(f"[ERR] Ошибка Google Sheets API: {e}")
-            return False
-        except Exception as e:
-            print(f"[ERR] Ошибка сохранения в Google Sheets: {e}")
-            return False
+            except HttpError as e:
+                print(f"[ERR] Ошибка Google Sheets API: {e}")
+                return False
+            except Exception as e:
+                print(f"[ERR] Ошибка сохранения в Google Sheets: {e}")
+                return False
     
     def create_sheets_template(self, spreadsheet_id, sheet_name='Videos'):
         """
@@ -1072,23 +1233,80 @@ class VideoParser:
             return False
 
 
+def save_parsed_json(data: Dict[str, Any], video_id: str, output_dir: Optional[str] = None,
+                     fmt: Optional[str] = None) -> str:
+    """
+    Сохранить результат parse_video в {video_id}_parsed.json (по умолчанию — текущая директория)
+
+    fmt='ytc' (или PARSED_OUTPUT_FORMAT=ytc) пишет компактный {video_id}_parsed.ytc, см. parsed_store.py.
+    """
+    return save_parsed(data, video_id, output_dir=output_dir, fmt=fmt)
+
+
+def run_batch(parser_instance: 'VideoParser', video_ids: List[str], args, out) -> int:
+    """
+    Пакетный режим CLI: JSONL в out (исходный stdout), логи — в stderr
+
+    Строки stdout:
+        {"event": "progress", "video_id", "step", "progress"}
+        {"event": "result", "video_id", "success", "output_file", "data" | "error", "elapsed_ms"}
+        {"event": "summary", "total", "succeeded", "failed", "elapsed_ms", "asr_scheduler"}
+    """
+    def run(emit: Emit) -> List[Dict[str, Any]]:
+        def on_progress(vid: str, step: Optional[str], progress: Optional[int]) -> None:
+            emit({'event': 'progress', 'video_id': vid, 'step': step, 'progress': progress})
+
+        def on_result(result: Dict[str, Any]) -> None:
+            if not args.jsonl_data:
+                result = {k: v for k, v in result.items() if k != 'data'}
+            emit({'event': 'result', **result})
+
+        return parser_instance.parse_many(
+            video_ids,
+            args.languages,
+            translate_to=args.translate_to,
+            concurrency=args.concurrency,
+            spreadsheet_id=args.spreadsheet,
+            sheet_name=args.sheet_name,
+            on_progress=on_progress,
+            on_result=on_result,
+            output_format=args.output_format,
+            asr_backend=args.asr_backend,
+            asr_budget=args.asr_budget,
+        )
+
+    return run_jsonl_batch(out, run, lambda: {'asr_scheduler': get_scheduler().stats()['backends']},
+                           default=json_default)
+
+
 def main():
     """Пример использования"""
     import argparse
     
     parser = argparse.ArgumentParser(description='YouTube Video Parser')
-    parser.add_argument('video_id', nargs='?', default=None, help='YouTube Video ID')
+    parser.add_argument('video_ids', nargs='*', default=[], help='YouTube Video ID (несколько — пакетный режим)')
     parser.add_argument('--credentials', help='Path to Google Service Account JSON (или задайте GOOGLE_CREDENTIALS_PATH / GOOGLE_APPLICATION_CREDENTIALS / GOOGLE_CREDENTIALS_JSON)')
     parser.add_argument('--spreadsheet', help='Google Sheets Spreadsheet ID')
     parser.add_argument('--languages', nargs='+', default=['en', 'ru', 'uk', 'de', 'fr', 'es'], help='Preferred languages for transcript')
     parser.add_argument('--translate-to', default='ru', help='Auto-translate transcript to this language if not found in preferred languages')
     parser.add_argument('--init-template', action='store_true', help='Initialize or update Google Sheets header row to the latest schema and exit')
     parser.add_argument('--sheet-name', default='Videos', help='Sheet name to use (default: Videos)')
+    parser.add_argument('--batch', action='store_true', help='Batch mode: JSONL results on stdout, logs on stderr')
+    parser.add_argument('--ids-file', help='File with video IDs for batch mode ("-" = stdin)')
+    parser.add_argument('--concurrency', type=int, default=int(os.environ.get('PARSER_CONCURRENCY', 4)), help='Batch mode: videos processed in parallel (default: 4 or PARSER_CONCURRENCY)')
+    parser.add_argument('--jsonl-data', action='store_true', help='Batch mode: include full parse data in each result line')
+    parser.add_argument('--output-format', choices=PARSED_FORMATS, default=default_format(), help='Result file format: json (default, read by backend) or compact ytc (or PARSED_OUTPUT_FORMAT)')
+    parser.add_argument('--asr-backend', help='ASR engine for videos without captions: openai | whisper | faster_whisper | auto (default: ASR_BACKEND, else OpenAI API if OPENAI_API_KEY is set)')
+    parser.add_argument('--asr-budget', type=float, help='Local ASR: wall-clock budget per video in seconds; the Whisper model is picked from the video duration and measured speed (default: ASR_TIME_BUDGET)')
     
     args = parser.parse_args()
 
+    batch_mode = bool(args.batch or args.ids_file or len(args.video_ids) > 1)
+    jsonl_out = batch_stdout(batch_mode)
+
     # Инициализация парсера
     parser_instance = VideoParser(args.credentials)
+    probe_startup('init-template' if args.init_template else ('batch' if batch_mode else 'parse'))
 
     # Режим инициализации шаблона таблицы
     if args.init_template:
@@ -1098,23 +1316,31 @@ def main():
         ok = parser_instance.create_sheets_template(args.spreadsheet, sheet_name=args.sheet_name)
         sys.exit(0 if ok else 1)
 
-    if not args.video_id:
+    # Пакетный режим: несколько ID, файл или stdin
+    if batch_mode:
+        video_ids = [job['video_id'] for job in read_batch_jobs(args.video_ids, args.ids_file)]
+        if not video_ids:
+            exit_no_jobs()
+        sys.exit(run_batch(parser_instance, video_ids, args, jsonl_out))
+
+    if not args.video_ids:
         print("[ERR] VIDEO_ID is required when not using --init-template")
         sys.exit(2)
+    args.video_id = args.video_ids[0]
     
     # Парсинг видео
-    data = parser_instance.parse_video(args.video_id, args.languages, translate_to=args.translate_to)
+    data = parser_instance.parse_video(args.video_id, args.languages, translate_to=args.translate_to,
+                                        asr_backend=args.asr_backend, asr_budget=args.asr_budget)
     
     if data:
         print(f"\n[OK] Парсинг завершен!")
         print(f"  Название: {data['info']['title']}")
         print(f"  Таймкодов: {len(data['chapters'])}")
         print(f"  Текст: {len(data['full_text'])} символов")
+        print(f"  Экстракций yt-dlp: {data.get('ytdlp_extractions')}")
         
-        # Сохранить в JSON
-        output_file = f"{args.video_id}_parsed.json"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # Сохранить в JSON (или ytc)
+        output_file = save_parsed_json(data, args.video_id, fmt=args.output_format)
         print(f"  [SAVE] Сохранено в: {output_file}")
         
         # Сохранить в Google Sheets если указан spreadsheet
@@ -0,0 +1,120 @@
+"""
+Потоковый парсер WebVTT
+
+Принимает куски ответа (bytes или str, например resp.iter_content()) и отдаёт
+сегменты {start, duration, text} по мере чтения, не держа весь файл в памяти.
+Поддерживает CRLF/CR переводы строк, BOM, блоки NOTE/STYLE/REGION, идентификаторы
+кью и настройки кью после таймкода (align:start position:0% ...).
+"""
+
+import codecs
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+# Блоки, которые не являются кью
+_SKIP_BLOCKS = ('NOTE', 'STYLE', 'REGION')
+
+
+def parse_timestamp(ts: str) -> Optional[float]:
+    """00:00:05.123 / 00:05.123 / 5.123 (допускается запятая) -> секунды или None."""
+    parts = ts.strip().replace(',', '.').split(':')
+    try:
+        if len(parts) == 3:
+            return int(parts[0]) * 3600 + int(parts[1]) * 60 + float(parts[2])
+        if len(parts) == 2:
+            return int(parts[0]) * 60 + float(parts[1])
+        if len(parts) == 1:
+            return float(parts[0])
+    except ValueError:
+        return None
+    return None
+
+
+def _is_skip_block(first_line: str) -> bool:
+    for kw in _SKIP_BLOCKS:
+        if first_line.startswith(kw) and (len(first_line) == len(kw) or first_line[len(kw)] in ' \t'):
+            return True
+    return False
+
+
+def _parse_block(lines: List[str]) -> Optional[Dict[str, Any]]:
+    """Один блок (без пустых строк) -> сегмент или None."""
+    if not lines or _is_skip_block(lines[0]) or lines[0].startswith('WEBVTT'):
+        return None
+    # Первая строка может быть идентификатором кью — стрелку ищем в первых двух
+    for i in range(min(2, len(lines))):
+        if '-->' in lines[i]:
+            start_s, _, rest = lines[i].partition('-->')
+            # После времени конца могут идти настройки кью через пробел
+            end_tokens = rest.split()
+            start = parse_timestamp(start_s)
+            end = parse_timestamp(end_tokens[0]) if end_tokens else None
+            if start is None or end is None:
+                return None
+            # Строки блока уже без пробелов по краям и непустые
+            text = ' '.join(lines[i + 1:])
+            if not text:
+                return None
+            return {'start': start, 'duration': max(0.0, end - start), 'text': text}
+    return None
+
+
+def _iter_line_batches(chunks: Iterable[Union[bytes, str]], encoding: str = 'utf-8') -> Iterator[List[str]]:
+    """Склеить куски в строки (пачкой на кусок); CRLF/CR -> LF, в т.ч. когда \\r и \\n в разных кусках."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    buf = ''
+    first = True
+    for chunk in chunks:
+        if not chunk:
+            continue
+        text = decoder.decode(chunk) if isinstance(chunk, (bytes, bytearray)) else chunk
+        if first and text:
+            text = text.lstrip('\ufeff')
+            first = False
+        buf += text
+        # \r в конце может быть половиной \r\n — ждём следующий кусок
+        hold = buf.endswith('\r')
+        if hold:
+            buf = buf[:-1]
+        if '\r' in buf:
+            buf = buf.replace('\r\n', '\n').replace('\r', '\n')
+        lines = buf.split('\n')
+        buf = lines.pop()
+        if hold:
+            buf += '\r'
+        yield lines
+    tail = decoder.decode(b'', final=True)
+    yield (buf + tail).replace('\r\n', '\n').replace('\r', '\n').split('\n')
+
+
+def iter_vtt_segments(chunks: Iterable[Union[bytes, str]], encoding: str = 'utf-8') -> Iterator[Dict[str, Any]]:
+    """
+    Потоково разобрать WebVTT
+
+    Args:
+        chunks: Итератор кусков файла (bytes декодируются инкрементально)
+        encoding: Кодировка для bytes
+
+    Yields:
+        dict: {start, duration, text}
+    """
+    block: List[str] = []
+    for lines in _iter_line_batches(chunks, encoding):
+        for line in lines:
+            line = line.strip()
+            if line:
+                block.append(line)
+                continue
+            if block:
+                seg = _parse_block(block)
+                if seg:
+                    yield seg
+                block = []
+    if block:
+        seg = _parse_block(block)
+        if seg:
+            yield seg
+
+
+def parse_vtt(vtt_text: str) -> List[Dict[str, Any]]:
+    """Разобрать WebVTT целиком из строки."""
+    return list(iter_vtt_segments([vtt_text]))
@@ -0,0 +1,171 @@
+"""
+Кэш моделей локального Whisper на процесс
+
+Модели держатся в памяти между задачами (ключ — имя модели) и вытесняются по
+LRU, когда суммарный размер превышает бюджет WHISPER_MODEL_RAM_MB. Размер
+модели считается по параметрам и буферам torch, а если это невозможно —
+по таблице примерных размеров. Одновременные запросы одной модели ждут
+одну загрузку, а не грузят её параллельно.
+
+WHISPER_PRELOAD_MODEL=base,small — какие модели загрузить при старте воркера.
+"""
+
+import os
+import gc
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from worker_common import env_int, process_singleton
+
+# Примерный объём весов в памяти (fp32 на CPU), МБ — если посчитать по тензорам не удалось
+_APPROX_MODEL_MB = {
+    'tiny': 150, 'tiny.en': 150,
+    'base': 290, 'base.en': 290,
+    'small': 970, 'small.en': 970,
+    'medium': 3000, 'medium.en': 3000,
+    'large': 6200, 'large-v1': 6200, 'large-v2': 6200, 'large-v3': 6200,
+    'turbo': 3200, 'large-v3-turbo': 3200,
+}
+_DEFAULT_MODEL_MB = 1000
+
+
+def model_nbytes(name: str, model: Any) -> int:
+    """Объём модели в байтах: параметры + буферы torch или оценка по имени."""
+    try:
+        total = sum(p.numel() * p.element_size() for p in model.parameters())
+        total += sum(b.numel() * b.element_size() for b in model.buffers())
+        if total > 0:
+            return int(total)
+    except Exception:
+        pass
+    return _APPROX_MODEL_MB.get(name, _DEFAULT_MODEL_MB) * 1024 * 1024
+
+
+def _default_loader(name: str) -> Any:
+    import whisper
+    device = os.environ.get('WHISPER_DEVICE') or None
+    return whisper.load_model(name, device=device) if device else whisper.load_model(name)
+
+
+class WhisperModelCache:
+    def __init__(self, budget_bytes: Optional[int] = None, loader: Optional[Callable[[str], Any]] = None):
+        """
+        Args:
+            budget_bytes: Бюджет памяти на модели (по умолчанию WHISPER_MODEL_RAM_MB, 4096 МБ)
+            loader: Функция загрузки модели по имени (по умолчанию whisper.load_model)
+        """
+        self.budget_bytes = budget_bytes if budget_bytes is not None else env_int('WHISPER_MODEL_RAM_MB', 4096) * 1024 * 1024
+        self._loader = loader or _default_loader
+        # name -> (model, nbytes, load_ms); порядок — от давно использованной к недавней
+        self._models: 'OrderedDict[str, Tuple[Any, int, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Event] = {}
+        self.counters: Dict[str, int] = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, name: str) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Модель из кэша или загрузить
+
+        Returns:
+            (model, {'model': name, 'model_cached': bool, 'model_load_ms': float, 'model_mb': float})
+        """
+        while True:
+            with self._lock:
+                entry = self._models.get(name)
+                if entry is not None:
+                    self._models.move_to_end(name)
+                    self.counters['hits'] += 1
+                    model, nbytes, _ = entry
+                    return model, {'model': name, 'model_cached': True, 'model_load_ms': 0.0,
+                                   'model_mb': round(nbytes / 1024 / 1024, 1)}
+                waiter = self._loading.get(name)
+                if waiter is None:
+                    # Грузим мы; остальные подождут событие
+                    self._loading[name] = threading.Event()
+                    self.counters['misses'] += 1
+                    break
+            waiter.wait()
+
+        try:
+            print(f"[INFO] Загружаем модель Whisper: {name}")
+            started = time.perf_counter()
+            model = self._loader(name)
+            load_ms = (time.perf_counter() - started) * 1000
+            nbytes = model_nbytes(name, model)
+            with self._lock:
+                self._evict_for(nbytes)
+                self._models[name] = (model, nbytes, load_ms)
+            print(f"[INFO] Whisper {name}: {nbytes / 1024 / 1024:.0f} МБ за {load_ms / 1000:.1f} с")
+            return model, {'model': name, 'model_cached': False, 'model_load_ms': round(load_ms, 1),
+                           'model_mb': round(nbytes / 1024 / 1024, 1)}
+        finally:
+            with self._lock:
+                self._loading.pop(name).set()
+
+    def loaded(self, name: str) -> bool:
+        """Модель уже в памяти (без загрузки и без учёта в LRU)."""
+        with self._lock:
+            return name in self._models
+
+    def _evict_for(self, nbytes: int) -> None:
+        """Вытеснить LRU-модели, чтобы новая поместилась в бюджет (вызывается под lock)."""
+        used = sum(e[1] for e in self._models.values())
+        evicted = False
+        while self._models and used + nbytes > self.budget_bytes:
+            old_name, (_, old_bytes, _) = self._models.popitem(last=False)
+            used -= old_bytes
+            self.counters['evictions'] += 1
+            evicted = True
+            print(f"[INFO] Whisper {old_name} вытеснена из кэша ({old_bytes / 1024 / 1024:.0f} МБ)")
+        if nbytes > self.budget_bytes:
+            print(f"[WARN] Модель Whisper ({nbytes / 1024 / 1024:.0f} МБ) больше бюджета WHISPER_MODEL_RAM_MB")
+        if evicted:
+            # Память освобождается, когда текущие транскрибации отпустят ссылки
+            gc.collect()
+            try:
+                torch = sys.modules.get('torch')
+                if torch is not None and torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except Exception:
+                pass
+
+    def preload(self, names: Iterable[str]) -> None:
+        """Загрузить модели заранее (ошибки только логируются)."""
+        for name in names:
+            name = name.strip()
+            if not name:
+                continue
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"[WARN] Не удалось предзагрузить Whisper ({name}): {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = [
+                {'model': name, 'mb': round(nbytes / 1024 / 1024, 1), 'load_ms': round(load_ms, 1)}
+                for name, (_, nbytes, load_ms) in self._models.items()
+            ]
+            used = sum(e[1] for e in self._models.values())
+            return {
+                'models': models,
+                'used_mb': round(used / 1024 / 1024, 1),
+                'budget_mb': round(self.budget_bytes / 1024 / 1024, 1),
+                **self.counters,
+            }
+
+
+@process_singleton
+def get_model_cache() -> WhisperModelCache:
+    """Общий для процесса кэш моделей."""
+    return WhisperModelCache()
+
+
+def preload_from_env() -> None:
+    """Предзагрузка моделей из WHISPER_PRELOAD_MODEL (через запятую)."""
+    names = os.environ.get('WHISPER_PRELOAD_MODEL') or ''
+    if names.strip():
+        get_model_cache().preload(names.split(','))
@@ -0,0 +1,288 @@
+"""
+Многоядерная локальная транскрибация Whisper по окнам аудио
+
+model.transcribe(path) декодирует весь трек последовательно и на CPU занимает
+лишь часть ядер. Здесь аудио делится на перекрывающиеся окна (plan_windows),
+окна распознаются в пуле процессов (WHISPER_WORKERS процессов по
+WHISPER_THREADS_PER_WORKER потоков torch), а результаты склеиваются
+asr_openai.stitch: окна распознаются с пословными метками, и каждое слово
+перекрытия берётся ровно из одного окна — по тому, в чью половину перекрытия
+попадает его середина.
+
+Каждый процесс сам декодирует своё окно через ffmpeg (-ss/-t -> PCM 16 кГц),
+поэтому между процессами передаются только пути и сегменты, а не аудио.
+Пул живёт между задачами: модель грузится в каждом процессе один раз (через
+кэш whisper_models, так что WHISPER_MODEL_RAM_MB действует на процесс, и
+памяти нужно в WHISPER_WORKERS раз больше, чем для одной модели).
+
+WHISPER_WORKERS=1 (по умолчанию) — прежний последовательный режим.
+"""
+
+import os
+import math
+import time
+import atexit
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from asr_openai import find_ffmpeg, probe_audio, stitch
+from worker_common import env_float, env_int
+
+SAMPLE_RATE = 16000
+# Whisper всё равно дополняет вход до 30 с — окна короче только тратят время
+MIN_WINDOW_SECONDS = 30.0
+
+
+def whisper_workers() -> int:
+    """Число процессов локального Whisper (WHISPER_WORKERS, 1 — без пула)."""
+    return max(1, env_int('WHISPER_WORKERS', 1))
+
+
+def default_threads(workers: int) -> int:
+    """Потоков torch на процесс: WHISPER_THREADS_PER_WORKER или ядра поровну между процессами."""
+    return max(1, env_int('WHISPER_THREADS_PER_WORKER', (os.cpu_count() or 1) // max(1, workers)))
+
+
+def plan_windows(duration: float, workers: int, window_seconds: float, overlap: float) -> List[Tuple[float, float]]:
+    """
+    Окна (start, length) для пула
+
+    Окон не меньше числа процессов и не длиннее window_seconds (чтобы процессы
+    загружались равномерно), но шаг не короче MIN_WINDOW_SECONDS. Число окон
+    по возможности кратно числу процессов.
+
+    Returns:
+        list: Окна с перекрытием overlap; одно окно для короткого аудио
+    """
+    if duration <= 0:
+        return [(0.0, 0.0)]
+    limit = max(1, int(duration // MIN_WINDOW_SECONDS))
+    count = max(workers, math.ceil(duration / max(window_seconds, MIN_WINDOW_SECONDS)))
+    if count % workers:
+        count += workers - count % workers
+    count = min(count, limit)
+    step = duration / count
+    return [
+        (round(i * step, 3), round(min(step + overlap, duration - i * step), 3))
+        for i in range(count)
+    ]
+
+
+def load_window(ffmpeg: str, path: str, start: float, length: float) -> Any:
+    """Окно аудио как float32 numpy-массив 16 кГц моно (как whisper.load_audio, но кусок)."""
+    import numpy as np
+
+    cmd = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-nostdin', '-ss', f'{start:.3f}', '-t', f'{length:.3f}',
+           '-i', path, '-vn', '-f', 's16le', '-ac', '1', '-ar', str(SAMPLE_RATE), '-']
+    out = subprocess.run(cmd, check=True, capture_output=True, timeout=600).stdout
+    return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
+
+
+# --- Код процессов пула ---
+
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(model_name: str, threads: int, loader: Optional[Callable[[str], Any]]) -> None:
+    # Ограничиваем потоки до импорта torch, иначе каждый процесс займёт все ядра
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    try:
+        if loader is not None:
+            _worker['model'] = loader(model_name)
+        else:
+            from whisper_models import get_model_cache
+            _worker['model'] = get_model_cache().get(model_name)[0]
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+    except Exception as e:
+        # Ошибку отдаём из задачи: исключение в initializer ломает весь пул
+        _worker['error'] = f'{type(e).__name__}: {e}'
+
+
+def _worker_model() -> Any:
+    if 'error' in _worker:
+        raise RuntimeError(_worker['error'])
+    return _worker['model']
+
+
+def _plain_segments(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Сегменты Whisper -> компактные dict для передачи между процессами."""
+    segments = []
+    for seg in result.get('segments') or []:
+        words = [{'start': w.get('start', 0.0), 'end': w.get('end', 0.0), 'word': w.get('word', '')}
+                 for w in seg.get('words') or []]
+        segments.append({'start': seg.get('start', 0.0), 'end': seg.get('end', 0.0),
+                         'text': seg.get('text', ''), 'words': words})
+    if not segments and result.get('text'):
+        segments = [{'start': 0.0, 'end': 0.0, 'text': result['text']}]
+    return segments
+
+
+def _transcribe_window(ffmpeg: str, path: str, start: float, length: float,
+                       options: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    model = _worker_model()
+    audio = load_window(ffmpeg, path, start, length)
+    result = model.transcribe(audio, **options)
+    return _plain_segments(result), result.get('language')
+
+
+def detect_language(model: Any, audio: Any) -> Optional[Tuple[str, float]]:
+    """(язык, вероятность) по первым 30 с массива audio моделью openai-whisper или None."""
+    if not hasattr(model, 'detect_language'):
+        return None
+    import whisper
+    audio = whisper.pad_or_trim(audio)
+    mel = whisper.log_mel_spectrogram(audio, model.dims.n_mels).to(model.device)
+    _, probs = model.detect_language(mel)
+    language = max(probs, key=probs.get)
+    return language, float(probs[language])
+
+
+def _detect_language(ffmpeg: str, path: str) -> Optional[str]:
+    """Язык по первым 30 с — чтобы все окна распознавались на одном языке."""
+    try:
+        detected = detect_language(_worker_model(), load_window(ffmpeg, path, 0.0, MIN_WINDOW_SECONDS))
+        return detected[0] if detected else None
+    except Exception as e:
+        print(f"[WARN] Whisper: не удалось определить язык заранее: {e}")
+        return None
+
+
+# --- Пул ---
+
+_pools: Dict[Tuple[Any, ...], ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(model: str, workers: int, threads: int,
+             loader: Optional[Callable[[str], Any]] = None) -> ProcessPoolExecutor:
+    """Пул процессов с загруженной моделью (один на модель/конфигурацию, живёт до выхода)."""
+    key = (model, workers, threads, loader)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            # spawn: форк процесса с потоками Flask/torch небезопасен, а на Windows другого нет
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_init_worker, initargs=(model, threads, loader))
+            _pools[key] = pool
+        return pool
+
+
+def _drop_pool(pool: ProcessPoolExecutor) -> None:
+    with _pools_lock:
+        for key, value in list(_pools.items()):
+            if value is pool:
+                del _pools[key]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@atexit.register
+def shutdown_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def transcribe_parallel(
+    path: str,
+    model: str = 'base',
+    language: Optional[str] = None,
+    duration: Optional[float] = None,
+    workers: Optional[int] = None,
+    threads: Optional[int] = None,
+    window_seconds: Optional[float] = None,
+    overlap: Optional[float] = None,
+    loader: Optional[Callable[[str], Any]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Распознать аудиофайл локальным Whisper в пуле процессов
+
+    Args:
+        path: Путь к аудио
+        model: Модель Whisper
+        language: Язык; None — определяется один раз по началу записи
+        duration: Длительность, если известна (иначе — из ffmpeg)
+        workers: Процессов (WHISPER_WORKERS)
+        threads: Потоков torch на процесс (WHISPER_THREADS_PER_WORKER, ядра / процессы)
+        window_seconds: Максимальная длина окна (WHISPER_WINDOW_SECONDS, 300)
+        overlap: Перекрытие окон в секундах (WHISPER_WINDOW_OVERLAP, 4)
+        loader: Функция загрузки модели в процессе (по умолчанию кэш whisper_models)
+
+    Returns:
+        dict: {segments, language, pool: {workers, threads, windows, ...}} или None —
+              тогда вызывающий код распознаёт файл последовательно
+    """
+    workers = workers or whisper_workers()
+    threads = threads or default_threads(workers)
+    window_seconds = window_seconds or env_float('WHISPER_WINDOW_SECONDS', 300.0)
+    overlap = env_float('WHISPER_WINDOW_OVERLAP', 4.0) if overlap is None else overlap
+    started = time.perf_counter()
+
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        print("[WARN] Whisper: ffmpeg не найден — окна вырезать нельзя, распознаём целиком")
+        return None
+    if not duration:
+        duration = probe_audio(path, ffmpeg)[0]
+    if not duration:
+        print("[WARN] Whisper: не удалось определить длительность аудио — распознаём целиком")
+        return None
+    windows = plan_windows(duration, workers, window_seconds, overlap)
+
+    pool = get_pool(model, workers, threads, loader)
+    try:
+        if language is None and len(windows) > 1:
+            language = pool.submit(_detect_language, ffmpeg, path).result()
+        options: Dict[str, Any] = {'word_timestamps': True}
+        if language:
+            options['language'] = language
+        print(f"[INFO] Whisper: окон {len(windows)}, процессов {workers} x {threads} потоков")
+        futures = [pool.submit(_transcribe_window, ffmpeg, path, start, length, options)
+                   for start, length in windows]
+        outcomes: List[Tuple[Optional[List[Dict[str, Any]]], Optional[str]]] = []
+        for i, future in enumerate(futures):
+            try:
+                outcomes.append(future.result())
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                print(f"[WARN] Whisper окно {i + 1}/{len(windows)}: {e}")
+                outcomes.append((None, None))
+    except BrokenProcessPool as e:
+        print(f"[ERR] Whisper: пул процессов упал ({e}) — распознаём целиком")
+        _drop_pool(pool)
+        return None
+
+    failed = [i for i, o in enumerate(outcomes) if o[0] is None]
+    if len(failed) == len(windows):
+        print("[ERR] Whisper: ни одно окно не распознано — распознаём целиком")
+        return None
+    if failed:
+        print(f"[WARN] Whisper: не распознаны окна {failed} — транскрипт неполный")
+    languages = [o[1] for o in outcomes if o[1]]
+    elapsed = time.perf_counter() - started
+    return {
+        'segments': stitch([o[0] for o in outcomes], windows, overlap),
+        'language': language or (languages[0] if languages else None),
+        'pool': {
+            'workers': workers,
+            'threads': threads,
+            'windows': len(windows),
+            'window_seconds': round(windows[0][1], 1),
+            'overlap': overlap,
+            'failed_windows': failed,
+            'audio_seconds': round(duration, 1),
+            'elapsed_ms': int(elapsed * 1000),
+            'rtf': round(elapsed / duration, 4),
+        },
+    }
@@ -0,0 +1,109 @@
+"""
+Общие помощники модулей воркера: настройки из окружения и SQLite-хранилища
+
+Кэши и замеры воркера лежат в python-workers/.cache/ в SQLite в режиме WAL:
+базу одновременно читают и пишут несколько процессов-воркеров, а внутри
+процесса соединение одно на хранилище (под его lock).
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, TypeVar
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+T = TypeVar('T')
+
+
+def env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def cache_path(filename: str) -> str:
+    """Путь файла в python-workers/.cache/."""
+    return os.path.join(CACHE_DIR, filename)
+
+
+def open_sqlite(path: str) -> sqlite3.Connection:
+    """
+    Соединение с базой хранилища (каталог создаётся)
+
+    WAL и busy_timeout — чтобы процессы не падали на занятой базе;
+    isolation_level=None — транзакции только явные (write_transaction).
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=30000')
+    return conn
+
+
+@contextmanager
+def write_transaction(db: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Чтение-изменение-запись без гонок между процессами: BEGIN IMMEDIATE, COMMIT или ROLLBACK."""
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        yield db
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    db.execute('COMMIT')
+
+
+def process_singleton(factory: Callable[[], T]) -> Callable[[], T]:
+    """Декоратор get_*(): экземпляр создаётся при первом вызове, дальше — тот же (потокобезопасно)."""
+    lock = threading.Lock()
+    instance: List[T] = []
+
+    @wraps(factory)
+    def get() -> T:
+        with lock:
+            if not instance:
+                instance.append(factory())
+            return instance[0]
+
+    return get
+
+
+class NullCache:
+    """Заглушка отключённого кэша (YTDLP_CACHE=0, ASR_CACHE=0): всегда промах, ничего не пишет."""
+
+    counters: Dict[str, int] = {}
+
+    def get(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+    def lookup(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+    def fetch(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+    def put(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+    def show(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+    def entries(self, *args: Any, **kwargs: Any) -> List[Dict[str, Any]]:
+        return []
+
+    def stats(self) -> Dict[str, Any]:
+        return {'disabled': True}
+
+    def purge(self, *args: Any, **kwargs: Any) -> int:
+        return 0
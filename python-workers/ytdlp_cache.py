@@ -0,0 +1,274 @@
+"""
+Персистентный TTL-кэш info-словарей yt-dlp (SQLite)
+
+Ключ — (video_id, player client, format selector). Стабильные метаданные
+(название, главы, теги, списки субтитров) живут долго (YTDLP_CACHE_META_TTL),
+а подписанные ссылки googlevideo/timedtext считаются свежими до минимального
+параметра `expire` из URL минус запас (YTDLP_CACHE_STREAM_MARGIN).
+
+База в режиме WAL, поэтому её могут одновременно использовать несколько
+процессов-воркеров. Размер ограничен YTDLP_CACHE_MAX_MB — при превышении
+удаляются записи, к которым дольше всего не обращались.
+"""
+
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from worker_common import NullCache, cache_path, env_int, open_sqlite, process_singleton
+
+DEFAULT_CACHE_PATH = cache_path('ytdlp_info.sqlite3')
+
+# expire=1700000000 в query или /expire/1700000000/ в пути (HLS/DASH манифесты)
+_EXPIRE_RE = re.compile(r'[?&/]expire[=/](\d{9,11})')
+
+
+def _iter_urls(info: Dict[str, Any]) -> Iterable[str]:
+    """Все подписанные ссылки из info: форматы, requested_formats, субтитры."""
+    if info.get('url'):
+        yield info['url']
+    for key in ('formats', 'requested_formats'):
+        for f in info.get(key) or []:
+            if isinstance(f, dict):
+                for k in ('url', 'manifest_url', 'fragment_base_url'):
+                    if f.get(k):
+                        yield f[k]
+    for key in ('subtitles', 'automatic_captions'):
+        for tracks in (info.get(key) or {}).values():
+            for t in tracks or []:
+                if isinstance(t, dict) and t.get('url'):
+                    yield t['url']
+
+
+def streams_expire_at(info: Dict[str, Any], default: float) -> float:
+    """Минимальный `expire` среди ссылок info (unix time) или default, если ссылок с expire нет."""
+    expires = []
+    for url in _iter_urls(info):
+        m = _EXPIRE_RE.search(url)
+        if m:
+            expires.append(int(m.group(1)))
+    return float(min(expires)) if expires else default
+
+
+class InfoCache:
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        meta_ttl: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        stream_margin: Optional[int] = None,
+    ):
+        """
+        Инициализация кэша
+
+        Args:
+            path: Путь к SQLite файлу (по умолчанию YTDLP_CACHE_PATH или python-workers/.cache/)
+            meta_ttl: TTL метаданных в секундах (YTDLP_CACHE_META_TTL, по умолчанию 7 дней)
+            max_bytes: Лимит размера данных (YTDLP_CACHE_MAX_MB, по умолчанию 256 МБ)
+            stream_margin: Запас до `expire` ссылок в секундах (YTDLP_CACHE_STREAM_MARGIN)
+        """
+        self.path = path or os.environ.get('YTDLP_CACHE_PATH') or DEFAULT_CACHE_PATH
+        self.meta_ttl = meta_ttl if meta_ttl is not None else env_int('YTDLP_CACHE_META_TTL', 7 * 24 * 3600)
+        self.max_bytes = max_bytes if max_bytes is not None else env_int('YTDLP_CACHE_MAX_MB', 256) * 1024 * 1024
+        self.stream_margin = stream_margin if stream_margin is not None else env_int('YTDLP_CACHE_STREAM_MARGIN', 300)
+        # Счётчики текущего процесса; общие (по всем процессам) лежат в таблице counters
+        self.counters: Dict[str, int] = {'hits': 0, 'misses': 0, 'stale_streams': 0, 'puts': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = open_sqlite(self.path)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS info_cache (
+                    video_id TEXT NOT NULL,
+                    client TEXT NOT NULL,
+                    fmt TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    meta_expires_at REAL NOT NULL,
+                    streams_expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (video_id, client, fmt)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_info_cache_access ON info_cache(last_access)')
+            conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            self._conn = conn
+        return self._conn
+
+    def _count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+        self._db().execute(
+            'INSERT INTO counters(name, value) VALUES(?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+            (name, n),
+        )
+
+    def lookup(self, video_id: str, client: str = 'default', fmt: str = '') -> Optional[Tuple[Dict[str, Any], bool]]:
+        """
+        Найти info в кэше без учёта счётчиков
+
+        Returns:
+            (info, streams_fresh) или None, если записи нет или метаданные устарели
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db().execute(
+                'SELECT data, meta_expires_at, streams_expires_at FROM info_cache '
+                'WHERE video_id = ? AND client = ? AND fmt = ?',
+                (video_id, client, fmt),
+            ).fetchone()
+            if not row:
+                return None
+            data, meta_expires_at, streams_expires_at = row
+            if meta_expires_at <= now:
+                return None
+            self._db().execute(
+                'UPDATE info_cache SET last_access = ? WHERE video_id = ? AND client = ? AND fmt = ?',
+                (now, video_id, client, fmt),
+            )
+        try:
+            info = json.loads(zlib.decompress(data).decode('utf-8'))
+        except Exception:
+            return None
+        return info, streams_expires_at > now
+
+    def fetch(self, video_id: str, client: str = 'default', fmt: str = '',
+              need_streams: bool = True) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """
+        Получить info из кэша с учётом счётчиков hit/miss
+
+        Args:
+            need_streams: True — нужны рабочие ссылки на потоки/субтитры;
+                          False — достаточно метаданных (ссылки могут быть просрочены)
+
+        Returns:
+            (info, streams_fresh) или None при промахе
+        """
+        try:
+            found = self.lookup(video_id, client, fmt)
+            with self._lock:
+                if found is None:
+                    self._count('misses')
+                    return None
+                if need_streams and not found[1]:
+                    self._count('stale_streams')
+                    self._count('misses')
+                    return None
+                self._count('hits')
+            return found
+        except Exception as e:
+            print(f"[WARN] yt-dlp cache read failed: {e}")
+            return None
+
+    def get(self, video_id: str, client: str = 'default', fmt: str = '', need_streams: bool = True) -> Optional[Dict[str, Any]]:
+        """То же, что fetch(), но возвращает только info."""
+        found = self.fetch(video_id, client, fmt, need_streams)
+        return found[0] if found else None
+
+    def put(self, video_id: str, client: str, fmt: str, info: Dict[str, Any]) -> None:
+        """Сохранить info (должен быть JSON-совместимым, см. YoutubeDL.sanitize_info)."""
+        try:
+            now = time.time()
+            meta_expires_at = now + self.meta_ttl
+            streams_expires_at = min(streams_expire_at(info, meta_expires_at + self.stream_margin) - self.stream_margin,
+                                     meta_expires_at)
+            data = zlib.compress(json.dumps(info, ensure_ascii=False, default=str).encode('utf-8'), 6)
+            with self._lock:
+                db = self._db()
+                db.execute(
+                    'INSERT OR REPLACE INTO info_cache '
+                    '(video_id, client, fmt, data, size, created_at, meta_expires_at, streams_expires_at, last_access) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (video_id, client, fmt, data, len(data), now, meta_expires_at, streams_expires_at, now),
+                )
+                self._count('puts')
+                self._evict(db)
+        except Exception as e:
+            print(f"[WARN] yt-dlp cache write failed: {e}")
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        """Удалить просроченные записи и самые давно использованные сверх лимита размера."""
+        db.execute('DELETE FROM info_cache WHERE meta_expires_at <= ?', (time.time(),))
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM info_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        rows = db.execute('SELECT video_id, client, fmt, size FROM info_cache ORDER BY last_access ASC').fetchall()
+        for video_id, client, fmt, size in rows:
+            if total <= self.max_bytes:
+                break
+            db.execute('DELETE FROM info_cache WHERE video_id = ? AND client = ? AND fmt = ?', (video_id, client, fmt))
+            total -= size
+            evicted += 1
+        if evicted:
+            self._count('evictions', evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики процесса и общие счётчики/размер базы."""
+        try:
+            with self._lock:
+                db = self._db()
+                entries, total = db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM info_cache').fetchone()
+                shared = dict(db.execute('SELECT name, value FROM counters').fetchall())
+            return {
+                'path': self.path,
+                'entries': entries,
+                'bytes': total,
+                'max_bytes': self.max_bytes,
+                'process': dict(self.counters),
+                'total': shared,
+            }
+        except Exception as e:
+            return {'path': self.path, 'error': str(e)}
+
+    def purge(self, video_id: Optional[str] = None) -> int:
+        """Удалить все записи (или только для video_id). Возвращает число удалённых."""
+        with self._lock:
+            db = self._db()
+            if video_id:
+                cur = db.execute('DELETE FROM info_cache WHERE video_id = ?', (video_id,))
+            else:
+                cur = db.execute('DELETE FROM info_cache')
+            return cur.rowcount or 0
+
+
+@process_singleton
+def get_info_cache() -> Any:
+    """Общий для процесса экземпляр кэша (или заглушка, если кэш отключён)."""
+    if str(os.environ.get('YTDLP_CACHE', '1')).lower() in ('0', 'false', 'no'):
+        return NullCache()
+    return InfoCache()
+
+
+def client_key(clients: Optional[Iterable[str]]) -> str:
+    """Строковый ключ для списка player_client (None -> 'default')."""
+    return ','.join(clients) if clients else 'default'
+
+
+def main():
+    """Просмотр и очистка кэша"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='yt-dlp info cache')
+    parser.add_argument('--stats', action='store_true', help='Print cache stats JSON')
+    parser.add_argument('--purge', action='store_true', help='Delete all entries (or only --video-id)')
+    parser.add_argument('--video-id', help='Limit --purge to one video')
+    args = parser.parse_args()
+
+    cache = InfoCache()
+    if args.purge:
+        print(json.dumps({'success': True, 'deleted': cache.purge(args.video_id)}))
+    else:
+        print(json.dumps(cache.stats(), ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()